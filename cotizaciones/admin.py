@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cliente, Cotizacion, ItemCotizacion, SeguimientoCotizacion
+from .models import Cliente, Cotizacion, ItemCotizacion, SeguimientoCotizacion, SecuenciaFolio
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
@@ -51,3 +51,7 @@ class SeguimientoCotizacionAdmin(admin.ModelAdmin):
     list_filter = ['tipo', 'fecha']
     search_fields = ['cotizacion__numero', 'descripcion']
     readonly_fields = ['fecha']
+
+@admin.register(SecuenciaFolio)
+class SecuenciaFolioAdmin(admin.ModelAdmin):
+    list_display = ['anio', 'ultimo']
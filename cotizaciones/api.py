@@ -0,0 +1,187 @@
+"""
+API JSON de cotizaciones: items y búsqueda de clientes.
+
+item_api_crear recibe todas las líneas en un solo POST: los productos se
+buscan en una consulta, los totales de línea se calculan en una pasada, los
+items se insertan con bulk_create y los totales de la cotización se
+actualizan una vez con la suma de las líneas (bulk_create no envía las
+señales que los mantienen item por item, ni la que actualiza el documento
+de búsqueda).
+"""
+import json
+
+from django import forms
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from erp_system.rut import normalizar_rut
+from productos.models import Producto
+
+from . import busqueda, clientes, estados, totales
+from .models import Cotizacion, ItemCotizacion, calcular_total_item
+
+MAXIMO_ITEMS = 1000
+TAMANO_LOTE = 500
+
+# Mayor total que cabe en ItemCotizacion.total y en los totales de la cotización (12 dígitos, 2 decimales)
+TOPE_TOTAL = 10 ** 10
+
+# Campos de cada línea; se reutilizan las instancias para no armar un Form por línea
+CAMPOS_LINEA = {
+    'codigo': forms.CharField(max_length=Producto._meta.get_field('codigo').max_length),
+    'cantidad': forms.IntegerField(min_value=1, max_value=2147483647),
+    'precio_unitario': forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False),
+    'descuento': forms.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100, required=False),
+    'descripcion': forms.CharField(required=False),
+}
+
+
+def _entero(valor, defecto, maximo):
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _error(mensaje, status=400, errores=None):
+    datos = {'error': mensaje}
+    if errores:
+        datos['errores'] = errores
+    return JsonResponse(datos, status=status)
+
+
+def _limpiar_lineas(lineas):
+    """Valida las líneas; devuelve (líneas limpias, errores por número de línea)."""
+    limpias = []
+    errores = []
+    for numero, linea in enumerate(lineas, 1):
+        if not isinstance(linea, dict):
+            errores.append({'linea': numero, 'errores': {'__all__': ['La línea debe ser un objeto.']}})
+            continue
+        limpia = {}
+        errores_linea = {}
+        for nombre, campo in CAMPOS_LINEA.items():
+            try:
+                limpia[nombre] = campo.clean(linea.get(nombre))
+            except ValidationError as error:
+                errores_linea[nombre] = error.messages
+        if errores_linea:
+            errores.append({'linea': numero, 'errores': errores_linea})
+        else:
+            limpias.append(limpia)
+    return limpias, errores
+
+
+@login_required
+@require_POST
+def item_api_crear(request, pk):
+    """
+    Agrega items a una cotización.
+
+    Cuerpo: {"items": [{"codigo", "cantidad", "precio_unitario",
+    "descuento", "descripcion"}, ...]}. Sin precio se usa el precio de venta
+    del producto; sin descuento, 0. Si alguna línea tiene errores, o los
+    totales de la cotización no caben en sus columnas, no se guarda ninguna
+    y se responde 400 (con los errores por número de línea, si los hay);
+    si la cotización ya no está en borrador ni enviada, 409.
+    """
+    cotizacion_id = get_object_or_404(Cotizacion.objects.values_list('pk', flat=True), pk=pk)
+    try:
+        datos = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return _error('El cuerpo debe ser JSON.')
+    lineas = datos.get('items') if isinstance(datos, dict) else None
+    if not isinstance(lineas, list) or not lineas:
+        return _error('Se espera una lista "items" con al menos una línea.')
+    if len(lineas) > MAXIMO_ITEMS:
+        return _error(f'Se permiten hasta {MAXIMO_ITEMS} líneas por solicitud.')
+
+    lineas, errores = _limpiar_lineas(lineas)
+    if errores:
+        return _error('Hay líneas con errores.', errores=errores)
+
+    productos = {
+        codigo: (producto_id, precio_venta)
+        for codigo, producto_id, precio_venta in Producto.objects.filter(
+            codigo__in={linea['codigo'] for linea in lineas}, activo=True,
+        ).values_list('codigo', 'pk', 'precio_venta')
+    }
+
+    items = []
+    for numero, linea in enumerate(lineas, 1):
+        producto = productos.get(linea['codigo'])
+        if producto is None:
+            errores.append({'linea': numero, 'errores': {'codigo': ['No existe un producto activo con ese código.']}})
+            continue
+        precio = producto[1] if linea['precio_unitario'] is None else linea['precio_unitario']
+        descuento = linea['descuento'] or 0
+        total = calcular_total_item(linea['cantidad'], precio, descuento)
+        if total >= TOPE_TOTAL:
+            errores.append({'linea': numero, 'errores': {'__all__': ['El total de la línea es demasiado grande.']}})
+            continue
+        items.append(ItemCotizacion(
+            cotizacion_id=cotizacion_id,
+            producto_id=producto[0],
+            descripcion=linea['descripcion'],
+            cantidad=linea['cantidad'],
+            precio_unitario=precio,
+            descuento_item=descuento,
+            total=total,
+        ))
+    if errores:
+        return _error('Hay líneas con errores.', errores=errores)
+
+    diferencia = sum(item.total for item in items)
+    with transaction.atomic():
+        # El bloqueo ordena las altas concurrentes y evita que la cotización cambie de estado entretanto
+        estado, subtotal, descuento = (
+            Cotizacion.objects.select_for_update().filter(pk=cotizacion_id)
+            .values_list('estado', 'subtotal', 'descuento').get()
+        )
+        if estado not in estados.ESTADOS_VIGENTES:
+            return _error('Solo se pueden agregar items a cotizaciones en borrador o enviadas.', status=409)
+        resultado = totales.calcular(subtotal + diferencia, descuento)
+        if any(valor >= TOPE_TOTAL for valor in resultado.values()):
+            return _error('Los totales de la cotización superarían el máximo permitido.')
+
+        orden = ItemCotizacion.objects.filter(cotizacion_id=cotizacion_id).aggregate(m=Max('orden'))['m']
+        orden = -1 if orden is None else orden
+        for item in items:
+            orden += 1
+            item.orden = orden
+        ItemCotizacion.objects.bulk_create(items, batch_size=TAMANO_LOTE)
+        valores = totales.aplicar_diferencia(cotizacion_id, diferencia)
+        if any(item.descripcion for item in items):
+            busqueda.programar(cotizacion_id)
+    if valores is None:
+        valores = dict(
+            Cotizacion.objects.filter(pk=cotizacion_id).values('subtotal', 'impuestos', 'total').get()
+        )
+
+    return JsonResponse({'cotizacion': cotizacion_id, 'creados': len(items), **valores}, status=201)
+
+
+@login_required
+@require_GET
+def cliente_api_autocompletar(request):
+    """Clientes activos por prefijo de RUT o nombre (?q=, ?limite=)."""
+    limite = _entero(request.GET.get('limite'), clientes.SUGERENCIAS_LIMITE, 50)
+    return JsonResponse({'resultados': clientes.sugerir_clientes(request.GET.get('q', ''), limite)})
+
+
+@login_required
+@require_GET
+def cliente_api_rut(request):
+    """Cliente con el RUT indicado (?rut=), escrito con o sin puntos."""
+    rut = request.GET.get('rut', '')
+    if normalizar_rut(rut) is None:
+        return _error('El RUT no es válido.')
+    datos = clientes.cliente_por_rut(rut)
+    if datos is None:
+        return _error('No existe un cliente con ese RUT.', status=404)
+    return JsonResponse(datos)
@@ -0,0 +1,131 @@
+"""
+Búsqueda de cotizaciones por texto.
+
+Cada cotización tiene un DocumentoBusqueda con su folio, el RUT, nombre y
+contacto del cliente, las observaciones y las descripciones de los items,
+en minúsculas y sin tildes. Buscar es filtrar esa única tabla con un índice
+de texto: FULLTEXT con el parser ngram en MySQL y trigramas (pg_trgm) en
+PostgreSQL, que sirven para buscar subcadenas como el icontains de antes
+pero sin recorrer la tabla ni hacer joins. En SQLite se usa LIKE.
+
+El índice FULLTEXT se crea sin stopwords (innodb_ft_enable_stopword = OFF
+en la sesión de la migración 0003): con la lista por defecto de InnoDB el
+parser ngram descarta todo token que contenga "a", "de", "la", "en"...,
+y las búsquedas en español no encontrarían muchas cotizaciones. Si se
+reconstruye el índice a mano hay que hacerlo con la misma opción.
+
+Las señales de Cotizacion, Cliente e ItemCotizacion llaman a programar(),
+que actualiza los documentos al confirmarse la transacción, una sola vez por
+cotización aunque se hayan guardado muchos items.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from productos.busqueda import normalizar
+
+from .models import Cotizacion, DocumentoBusqueda, ItemCotizacion
+
+TAMANO_LOTE = 1000
+
+# Largo mínimo de un término para el índice ngram de MySQL (ngram_token_size)
+LARGO_NGRAM = 2
+
+_TEXTO_COMPLETO_MYSQL = 'MATCH(texto) AGAINST (%s IN BOOLEAN MODE)'
+
+
+def texto_documento(numero, rut, nombre, contacto, observaciones, descripciones=()):
+    """Texto normalizado del documento; el RUT va también sin puntos ni guion."""
+    rut = rut or ''
+    compacto = rut.replace('.', '').replace('-', '')
+    partes = [numero, rut, compacto, nombre, contacto, observaciones, *descripciones]
+    return normalizar(' '.join(parte for parte in partes if parte))
+
+
+def actualizar_documentos(cotizacion_ids, tamano_lote=TAMANO_LOTE):
+    """Reconstruye los documentos de las cotizaciones indicadas que existan."""
+    cotizacion_ids = list(cotizacion_ids)
+    for inicio in range(0, len(cotizacion_ids), tamano_lote):
+        lote = cotizacion_ids[inicio:inicio + tamano_lote]
+        descripciones = defaultdict(list)
+        for cotizacion_id, descripcion in (
+            ItemCotizacion.objects.filter(cotizacion_id__in=lote).exclude(descripcion='')
+            .order_by('cotizacion_id', 'orden', 'id').values_list('cotizacion_id', 'descripcion')
+        ):
+            descripciones[cotizacion_id].append(descripcion)
+        documentos = [
+            DocumentoBusqueda(
+                cotizacion_id=pk,
+                texto=texto_documento(numero, rut, nombre, contacto, observaciones, descripciones[pk]),
+            )
+            for pk, numero, rut, nombre, contacto, observaciones in Cotizacion.objects.filter(pk__in=lote)
+            .values_list('pk', 'numero', 'cliente__rut', 'cliente__nombre',
+                         'cliente__contacto_principal', 'observaciones')
+        ]
+        DocumentoBusqueda.objects.bulk_create(
+            documentos, update_conflicts=True, unique_fields=['cotizacion'], update_fields=['texto'],
+        )
+
+
+class _Pendientes(threading.local):
+    def __init__(self):
+        self.cotizaciones = set()
+        self.clientes = set()
+
+
+_pendientes = _Pendientes()
+
+
+def _procesar_pendientes():
+    cotizaciones, _pendientes.cotizaciones = _pendientes.cotizaciones, set()
+    clientes, _pendientes.clientes = _pendientes.clientes, set()
+    if clientes:
+        cotizaciones.update(Cotizacion.objects.filter(cliente_id__in=clientes).values_list('pk', flat=True))
+    if cotizaciones:
+        actualizar_documentos(sorted(cotizaciones))
+
+
+def programar(*cotizacion_ids):
+    """Actualiza los documentos de estas cotizaciones al confirmarse la transacción."""
+    _pendientes.cotizaciones.update(pk for pk in cotizacion_ids if pk is not None)
+    # Cada llamada registra el callback; el primero que corre procesa todo y los demás no hacen nada
+    transaction.on_commit(_procesar_pendientes)
+
+
+def programar_cliente(cliente_id):
+    """Actualiza los documentos de todas las cotizaciones del cliente."""
+    _pendientes.clientes.add(cliente_id)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def terminos(consulta):
+    """Términos normalizados de la consulta, sin comillas (MySQL las interpreta)."""
+    return normalizar(consulta).replace('"', ' ').split()
+
+
+def documentos_que_coinciden(consulta):
+    """Queryset de DocumentoBusqueda que contienen todos los términos de `consulta`."""
+    documentos = DocumentoBusqueda.objects.all()
+    lista = terminos(consulta)
+    if connection.vendor == 'mysql':
+        largos = [termino for termino in lista if len(termino) >= LARGO_NGRAM]
+        if largos:
+            booleana = ' '.join(f'+"{termino}"' for termino in largos)
+            documentos = documentos.filter(
+                RawSQL(_TEXTO_COMPLETO_MYSQL, [booleana], output_field=BooleanField())
+            )
+        lista = [termino for termino in lista if len(termino) < LARGO_NGRAM]
+    # En PostgreSQL el índice de trigramas sirve para LIKE '%termino%'
+    for termino in lista:
+        documentos = documentos.filter(texto__contains=termino)
+    return documentos
+
+
+def filtrar_por_texto(cotizaciones, consulta):
+    """Restringe un queryset de Cotizacion a las que coinciden con `consulta`."""
+    if not terminos(consulta):
+        return cotizaciones
+    return cotizaciones.filter(pk__in=documentos_que_coinciden(consulta).values('cotizacion_id'))
@@ -0,0 +1,157 @@
+"""
+Búsqueda de clientes por RUT para la emisión de cotizaciones.
+
+Los clientes se identifican por el RUT canónico (erp_system.rut), así que
+'12.345.678-9' y '12345678-9' son el mismo cliente. La búsqueda exacta por
+RUT queda en caché, también cuando el cliente no existe; las señales de
+Cliente la invalidan. El autocompletado busca por prefijo del RUT canónico
+o del nombre, con índices sobre ambas columnas.
+
+fusionar_duplicados() une los clientes creados antes de la normalización
+con el mismo RUT escrito de distintas formas.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from erp_system.rut import formatear_rut, normalizar_rut, prefijo_rut
+
+from . import busqueda
+from .models import Cliente, Cotizacion
+
+CLAVE_CLIENTE = 'cotizaciones:cliente:rut:%s'
+DURACION_CLIENTE = 60 * 60
+
+SUGERENCIAS_LIMITE = 10
+
+CAMPOS_CLIENTE = ('id', 'rut', 'nombre', 'contacto_principal', 'email', 'telefono')
+
+
+def cliente_por_rut(rut):
+    """Dict con CAMPOS_CLIENTE del cliente con ese RUT, o None."""
+    canonico = normalizar_rut(rut)
+    if canonico is None:
+        return None
+    clave = CLAVE_CLIENTE % canonico
+    datos = cache.get(clave)
+    if datos is None:
+        # {} recuerda que no existe, para no consultar de nuevo
+        datos = Cliente.objects.filter(rut_normalizado=canonico).values(*CAMPOS_CLIENTE).first() or {}
+        cache.set(clave, datos, DURACION_CLIENTE)
+    return datos or None
+
+
+def invalidar_cliente(*canonicos):
+    claves = [CLAVE_CLIENTE % canonico for canonico in canonicos if canonico]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def obtener_o_crear_cliente(rut, defaults):
+    """
+    Cliente con el RUT indicado (válido), creándolo con `defaults` si no
+    existe. Devuelve (dict con CAMPOS_CLIENTE, creado).
+    """
+    datos = cliente_por_rut(rut)
+    if datos is not None:
+        return datos, False
+    canonico = normalizar_rut(rut)
+    try:
+        with transaction.atomic():
+            cliente = Cliente.objects.create(rut=formatear_rut(canonico), **defaults)
+    except IntegrityError:
+        # Otro proceso lo creó al mismo tiempo
+        datos = Cliente.objects.filter(rut_normalizado=canonico).values(*CAMPOS_CLIENTE).first()
+        if datos is None:
+            raise
+        return datos, False
+    return {campo: getattr(cliente, campo) for campo in CAMPOS_CLIENTE}, True
+
+
+def sugerir_clientes(consulta, limite=SUGERENCIAS_LIMITE):
+    """Clientes activos cuyo RUT o nombre empieza con `consulta`."""
+    consulta = (consulta or '').strip()
+    if not consulta:
+        return []
+    clientes = Cliente.objects.filter(activo=True)
+    prefijo = prefijo_rut(consulta)
+    if prefijo is not None:
+        clientes = clientes.filter(rut_normalizado__startswith=prefijo).order_by('rut_normalizado')
+    else:
+        clientes = clientes.filter(nombre__istartswith=consulta).order_by('nombre', 'id')
+    return list(clientes.values(*CAMPOS_CLIENTE)[:limite])
+
+
+# Campos que el cliente que queda toma de sus duplicados si los tiene vacíos
+CAMPOS_COMPLETAR = ('email', 'telefono', 'direccion', 'contacto_principal', 'giro')
+
+
+def grupos_duplicados():
+    """
+    Clientes con el mismo RUT canónico: {canónico: [ids]}, con primero el
+    que se conserva (el que ya tiene rut_normalizado o, si no, el de menor
+    id). También devuelve los ids de clientes con RUT inválido.
+    """
+    grupos = {}
+    invalidos = []
+    filas = Cliente.objects.order_by('pk').values_list('pk', 'rut', 'rut_normalizado')
+    for pk, rut, rut_normalizado in filas.iterator(chunk_size=5000):
+        canonico = normalizar_rut(rut)
+        if canonico is None:
+            invalidos.append(pk)
+            continue
+        ids = grupos.setdefault(canonico, [])
+        if rut_normalizado == canonico:
+            ids.insert(0, pk)
+        else:
+            ids.append(pk)
+    return {canonico: ids for canonico, ids in grupos.items() if len(ids) > 1}, invalidos
+
+
+def fusionar_duplicados(grupos, tamano_lote=500):
+    """
+    Une cada grupo de grupos_duplicados() en su primer cliente: reasigna las
+    cotizaciones con un UPDATE por lote, completa los datos vacíos y elimina
+    los duplicados. Devuelve (clientes eliminados, cotizaciones reasignadas).
+    """
+    destino = {duplicado: ids[0] for ids in grupos.values() for duplicado in ids[1:]}
+    if not destino:
+        return 0, 0
+    duplicados = sorted(destino)
+    reasignadas = 0
+    cotizaciones = []
+    with transaction.atomic():
+        for inicio in range(0, len(duplicados), tamano_lote):
+            lote = duplicados[inicio:inicio + tamano_lote]
+            cotizaciones.extend(
+                Cotizacion.objects.filter(cliente_id__in=lote).values_list('pk', flat=True)
+            )
+            reasignadas += Cotizacion.objects.filter(cliente_id__in=lote).update(
+                cliente_id=Case(
+                    *[When(cliente_id=duplicado, then=Value(destino[duplicado])) for duplicado in lote],
+                    output_field=IntegerField(),
+                )
+            )
+
+        datos = Cliente.objects.in_bulk([pk for ids in grupos.values() for pk in ids])
+        conservados = []
+        for canonico, ids in grupos.items():
+            cliente = datos[ids[0]]
+            for campo in CAMPOS_COMPLETAR:
+                if not getattr(cliente, campo):
+                    valor = next((getattr(datos[pk], campo) for pk in ids[1:] if getattr(datos[pk], campo)), '')
+                    setattr(cliente, campo, valor)
+            cliente.activo = any(datos[pk].activo for pk in ids)
+            cliente.rut = formatear_rut(canonico)
+            cliente.rut_normalizado = canonico
+            conservados.append(cliente)
+
+        # Primero se eliminan los duplicados: alguno puede tener el RUT formateado del que queda
+        for inicio in range(0, len(duplicados), tamano_lote):
+            Cliente.objects.filter(pk__in=duplicados[inicio:inicio + tamano_lote]).delete()
+        Cliente.objects.bulk_update(
+            conservados, ['rut', 'rut_normalizado', 'activo', *CAMPOS_COMPLETAR], batch_size=tamano_lote,
+        )
+        invalidar_cliente(*grupos)
+        busqueda.programar(*cotizaciones)
+    return len(duplicados), reasignadas
@@ -0,0 +1,77 @@
+"""
+Transiciones de estado de las cotizaciones.
+
+Cada acción (aprobar, rechazar, vencer) tiene un estado de destino y los
+estados desde los que se permite. transicionar() la aplica con un UPDATE
+condicionado al estado de origen y registra los seguimientos en la misma
+transacción, así que dos clics, una pestaña desactualizada o dos acciones
+masivas que se cruzan no se pisan: la segunda no encuentra la cotización en
+un estado de origen y no hace nada.
+
+Con una sola cotización basta el número de filas del UPDATE para saber si
+cambió. Con varias, primero se bloquean (en orden de id) las que siguen en
+un estado de origen, para saber a cuáles registrarles el seguimiento, y
+luego se actualizan todas en un UPDATE.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .models import Cotizacion, SeguimientoCotizacion
+
+TAMANO_LOTE = 1000
+
+# Estados en que una cotización sigue esperando respuesta del cliente
+ESTADOS_VIGENTES = ('borrador', 'enviada')
+
+Transicion = namedtuple('Transicion', 'destino origenes tipo_seguimiento descripcion')
+
+TRANSICIONES = {
+    'aprobar': Transicion('aprobada', ESTADOS_VIGENTES, 'aprobacion', 'Cotización aprobada.'),
+    'rechazar': Transicion('rechazada', ESTADOS_VIGENTES, 'rechazo', 'Cotización rechazada.'),
+    'vencer': Transicion('vencida', ESTADOS_VIGENTES, 'vencimiento', 'Cotización vencida por fecha de vencimiento.'),
+}
+
+
+def acciones_permitidas(estado):
+    """Acciones que se pueden aplicar a una cotización en `estado`."""
+    return [accion for accion, transicion in TRANSICIONES.items() if estado in transicion.origenes]
+
+
+def transicionar(cotizaciones, accion, usuario=None, descripcion=None, saltar_bloqueadas=False):
+    """
+    Aplica `accion` a las cotizaciones (ids o queryset) que estén en un
+    estado de origen permitido; las demás quedan igual. Devuelve los ids de
+    las que cambiaron. Con `saltar_bloqueadas` se omiten las filas que otra
+    transacción tiene bloqueadas en vez de esperarlas.
+    """
+    transicion = TRANSICIONES[accion]
+    ids = None
+    if not isinstance(cotizaciones, QuerySet):
+        ids = list(cotizaciones)
+        cotizaciones = Cotizacion.objects.filter(pk__in=ids)
+    candidatas = cotizaciones.filter(estado__in=transicion.origenes)
+
+    with transaction.atomic():
+        if ids is not None and len(ids) == 1:
+            cambiadas = ids if candidatas.update(estado=transicion.destino) else []
+        else:
+            cambiadas = list(
+                candidatas.select_for_update(skip_locked=saltar_bloqueadas)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            if cambiadas:
+                Cotizacion.objects.filter(pk__in=cambiadas, estado__in=transicion.origenes).update(
+                    estado=transicion.destino,
+                )
+        SeguimientoCotizacion.objects.bulk_create([
+            SeguimientoCotizacion(
+                cotizacion_id=pk,
+                tipo=transicion.tipo_seguimiento,
+                descripcion=descripcion or transicion.descripcion,
+                usuario=usuario,
+            )
+            for pk in cambiadas
+        ], batch_size=TAMANO_LOTE)
+    return cambiadas
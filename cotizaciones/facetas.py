@@ -0,0 +1,59 @@
+"""
+Opciones de los filtros del listado de cotizaciones (años y vendedores).
+
+Se calculan con dos consultas agregadas y quedan en caché hasta que se crea
+o elimina una cotización que las cambie, así el listado no las recalcula en
+cada página.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cotizacion
+
+CLAVE_FACETAS = 'cotizaciones:listado:facetas'
+DURACION_FACETAS = 60 * 60
+
+
+def facetas_listado():
+    """
+    Dict con 'anios' (descendente), 'vendedores' (usernames ordenados) y
+    'vendedor_ids' (sus ids, para comparar sin leer el usuario).
+    """
+    facetas = cache.get(CLAVE_FACETAS)
+    if facetas is None:
+        vendedores = list(
+            Cotizacion.objects.filter(creado_por__isnull=False)
+            .order_by('creado_por__username')
+            .values_list('creado_por_id', 'creado_por__username')
+            .distinct()
+        )
+        facetas = {
+            'anios': [
+                fecha.year
+                for fecha in Cotizacion.objects.order_by().dates('fecha_creacion', 'year', order='DESC')
+            ],
+            'vendedores': [username for _, username in vendedores],
+            'vendedor_ids': {pk for pk, _ in vendedores},
+        }
+        cache.set(CLAVE_FACETAS, facetas, DURACION_FACETAS)
+    return facetas
+
+
+def invalidar_facetas():
+    """Descarta las facetas cuando la transacción actual se confirme."""
+    transaction.on_commit(lambda: cache.delete(CLAVE_FACETAS))
+
+
+def cotizacion_guardada(cotizacion):
+    """Invalida solo si la cotización agrega un año o un vendedor nuevo."""
+    facetas = cache.get(CLAVE_FACETAS)
+    if facetas is None:
+        return
+    vendedor_id = cotizacion.creado_por_id
+    anio = timezone.localtime(cotizacion.fecha_creacion).year if cotizacion.fecha_creacion else None
+    # Facetas guardadas antes de que existiera 'vendedor_ids': se invalidan
+    if anio not in facetas['anios'] or (
+        vendedor_id is not None and vendedor_id not in facetas.get('vendedor_ids', ())
+    ):
+        invalidar_facetas()
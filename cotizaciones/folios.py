@@ -0,0 +1,183 @@
+"""
+Folios correlativos de cotización por año.
+
+Cada año tiene una fila en SecuenciaFolio con el último correlativo
+entregado. asignar_folio() lo incrementa con un solo UPDATE atómico que
+devuelve el valor nuevo (RETURNING en PostgreSQL y SQLite, LAST_INSERT_ID en
+MySQL), así que dos procesos nunca reciben el mismo número.
+
+Con COTIZACION_FOLIO_BLOQUE = 1 la fila queda bloqueada hasta que termina la
+transacción que crea la cotización: si se revierte, el número también, y no
+quedan huecos. Con un bloque mayor cada proceso reserva N números en una
+consulta y los entrega desde memoria; los que no alcanza a usar quedan como
+huecos; esas reservas van por una conexión propia en autocommit (el alias
+ALIAS_RESERVAS, a la misma base que 'default'), que Django cierra al
+terminar cada request como a las demás. El texto del folio sale de
+COTIZACION_FOLIO_FORMATO ({anio} y {numero}).
+"""
+import copy
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .models import Cotizacion, SecuenciaFolio
+
+FORMATO_DEFECTO = '{anio}{numero:04d}'
+
+ALIAS_RESERVAS = 'folios'
+
+
+def formato_folio():
+    return getattr(settings, 'COTIZACION_FOLIO_FORMATO', FORMATO_DEFECTO)
+
+
+def formatear_folio(anio, numero):
+    return formato_folio().format(anio=anio, numero=numero)
+
+
+def _partes_formato(anio):
+    """Texto fijo antes y después de {numero} en los folios del año."""
+    formato = formato_folio()
+    partes = re.split(r'\{numero[^}]*\}', formato, maxsplit=1)
+    if len(partes) != 2:
+        raise ValueError(f'El formato de folio debe incluir {{numero}}: {formato!r}')
+    return tuple(parte.format(anio=anio) for parte in partes)
+
+
+def correlativo_de(folio, anio):
+    """Correlativo de `folio` si tiene el formato automático del año; si no, None."""
+    prefijo, sufijo = _partes_formato(anio)
+    coincidencia = re.fullmatch(f'{re.escape(prefijo)}(\\d+){re.escape(sufijo)}', folio)
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def _correlativo_inicial(anio, alias=DEFAULT_DB_ALIAS):
+    """Mayor correlativo ya usado en el año (folios creados antes de la secuencia)."""
+    prefijo, _ = _partes_formato(anio)
+    numeros = (
+        Cotizacion.objects.using(alias).filter(numero__startswith=prefijo).values_list('numero', flat=True)
+    )
+    correlativos = (correlativo_de(numero, anio) for numero in numeros.iterator())
+    return max((correlativo for correlativo in correlativos if correlativo is not None), default=0)
+
+
+def _incrementar(conexion, anio, cantidad):
+    """UPDATE atómico de la secuencia; devuelve el nuevo último o None si no hay fila."""
+    tabla = conexion.ops.quote_name(SecuenciaFolio._meta.db_table)
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            cursor.execute(
+                f'UPDATE {tabla} SET ultimo = LAST_INSERT_ID(ultimo + %s) WHERE anio = %s',
+                [cantidad, anio],
+            )
+            return cursor.lastrowid if cursor.rowcount else None
+        if conexion.vendor == 'postgresql' or (
+            conexion.vendor == 'sqlite' and conexion.Database.sqlite_version_info >= (3, 35)
+        ):
+            cursor.execute(
+                f'UPDATE {tabla} SET ultimo = ultimo + %s WHERE anio = %s RETURNING ultimo',
+                [cantidad, anio],
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila else None
+        # SQLite sin RETURNING: el UPDATE toma el bloqueo de escritura de la base
+        cursor.execute(f'UPDATE {tabla} SET ultimo = ultimo + %s WHERE anio = %s', [cantidad, anio])
+        if not cursor.rowcount:
+            return None
+        cursor.execute(f'SELECT ultimo FROM {tabla} WHERE anio = %s', [anio])
+        return cursor.fetchone()[0]
+
+
+def reservar(anio, cantidad=1, conexion=None):
+    """Reserva `cantidad` correlativos del año; devuelve el último de ellos."""
+    conexion = conexion or connections[DEFAULT_DB_ALIAS]
+    # En autocommit (conexión de reservas) abre una transacción para el UPDATE y su lectura
+    with transaction.atomic(using=conexion.alias, savepoint=False):
+        ultimo = _incrementar(conexion, anio, cantidad)
+    if ultimo is not None:
+        return ultimo
+    # Primer folio del año: la fila arranca desde los folios ya existentes
+    tabla = conexion.ops.quote_name(SecuenciaFolio._meta.db_table)
+    try:
+        with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabla} (anio, ultimo) VALUES (%s, %s)',
+                [anio, _correlativo_inicial(anio, conexion.alias)],
+            )
+    except IntegrityError:
+        # Otro proceso la creó al mismo tiempo
+        pass
+    with transaction.atomic(using=conexion.alias, savepoint=False):
+        return _incrementar(conexion, anio, cantidad)
+
+
+def conexion_reservas():
+    """
+    Conexión con la que se reservan los bloques: la misma base que
+    'default' con otro alias, así no participa de la transacción de quien
+    pide el folio. Es por hilo y la cierra close_old_connections de Django.
+    """
+    if ALIAS_RESERVAS not in connections.settings:
+        connections.settings[ALIAS_RESERVAS] = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+    return connections[ALIAS_RESERVAS]
+
+
+class _Bloques(threading.local):
+    """Correlativos reservados por este hilo (anio -> [siguiente, último])."""
+
+    def __init__(self):
+        self.por_anio = {}
+
+
+_bloques = _Bloques()
+
+
+def _despues_de_fork():
+    # El hijo no debe entregar los números del padre ni usar su socket
+    _bloques.por_anio = {}
+    try:
+        del connections[ALIAS_RESERVAS]
+    except AttributeError:
+        pass
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
+
+
+def asignar_folio(anio=None):
+    """
+    Entrega el próximo folio del año (por defecto, el actual).
+
+    Con bloque 1 debe llamarse dentro de la transacción que guarda la
+    cotización para que un rollback no deje huecos.
+    """
+    anio = anio or timezone.localdate().year
+    bloque = max(1, getattr(settings, 'COTIZACION_FOLIO_BLOQUE', 1))
+    if bloque == 1:
+        return formatear_folio(anio, reservar(anio))
+
+    reservado = _bloques.por_anio.get(anio)
+    if reservado is None or reservado[0] > reservado[1]:
+        ultimo = reservar(anio, bloque, conexion_reservas())
+        reservado = _bloques.por_anio[anio] = [ultimo - bloque + 1, ultimo]
+    numero = reservado[0]
+    reservado[0] += 1
+    return formatear_folio(anio, numero)
+
+
+def proximo_folio(anio=None):
+    """Folio que probablemente se asigne después, solo para mostrar (no reserva nada)."""
+    anio = anio or timezone.localdate().year
+    ultimo = SecuenciaFolio.objects.filter(anio=anio).values_list('ultimo', flat=True).first()
+    if ultimo is None:
+        ultimo = _correlativo_inicial(anio)
+    return formatear_folio(anio, ultimo + 1)
+
+
+def es_folio_automatico(folio, anio=None):
+    """True si `folio` tiene el formato de la numeración automática del año."""
+    return correlativo_de(folio, anio or timezone.localdate().year) is not None
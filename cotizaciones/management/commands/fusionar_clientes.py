@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from cotizaciones import clientes
+
+
+class Command(BaseCommand):
+    help = ('Une los clientes cuyo RUT es el mismo escrito de otra forma (con o sin puntos, '
+            'k minúscula, ceros a la izquierda) y reasigna sus cotizaciones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Realiza la fusión; sin esta opción solo se informa')
+        parser.add_argument('--mostrar', type=int, default=20,
+                            help='Grupos a listar (por defecto %(default)s)')
+
+    def handle(self, *args, **options):
+        grupos, invalidos = clientes.grupos_duplicados()
+        self.stdout.write(
+            f'{len(grupos)} RUT con clientes duplicados '
+            f'({sum(len(ids) - 1 for ids in grupos.values())} clientes de más).'
+        )
+        for canonico, ids in list(grupos.items())[:options['mostrar']]:
+            self.stdout.write(f'  {canonico}: se conserva {ids[0]}, se unen {", ".join(map(str, ids[1:]))}')
+        if len(grupos) > options['mostrar']:
+            self.stdout.write(f'  ... y {len(grupos) - options["mostrar"]} más.')
+        if invalidos:
+            self.stdout.write(self.style.WARNING(
+                f'{len(invalidos)} clientes con RUT inválido quedan sin cambios.'
+            ))
+
+        if not grupos:
+            self.stdout.write(self.style.SUCCESS('Sin duplicados.'))
+        elif options['aplicar']:
+            eliminados, reasignadas = clientes.fusionar_duplicados(grupos)
+            self.stdout.write(self.style.SUCCESS(
+                f'{eliminados} clientes unidos; {reasignadas} cotizaciones reasignadas.'
+            ))
+        else:
+            self.stdout.write('Use --aplicar para unirlos.')
@@ -0,0 +1,66 @@
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from cotizaciones import pdf
+from cotizaciones.models import Cotizacion
+
+
+class Command(BaseCommand):
+    help = ('Genera en un ZIP los PDF de las cotizaciones indicadas (por id o por fecha de '
+            'emisión), repartiendo el trabajo en varios procesos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Ruta del archivo ZIP a crear')
+        parser.add_argument('--ids', help='Ids de cotización separados por coma')
+        parser.add_argument('--desde', help='Fecha de emisión inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha de emisión final, inclusive (AAAA-MM-DD)')
+        parser.add_argument('--estado', choices=[estado for estado, _ in Cotizacion.ESTADO_CHOICES],
+                            help='Solo cotizaciones en este estado')
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos en paralelo (por defecto, uno por CPU)')
+        parser.add_argument('--sin-valores', action='store_true',
+                            help='Omite precios y totales')
+
+    def _fecha(self, valor, opcion):
+        fecha = parse_date(valor) if valor else None
+        if valor and fecha is None:
+            raise CommandError(f'Fecha inválida en --{opcion}: {valor}')
+        return fecha
+
+    def handle(self, *args, **options):
+        cotizaciones = Cotizacion.objects.all()
+        if options['ids']:
+            try:
+                ids = [int(pk) for pk in options['ids'].split(',') if pk.strip()]
+            except ValueError:
+                raise CommandError('--ids debe ser una lista de números separados por coma.')
+            cotizaciones = cotizaciones.filter(pk__in=ids)
+        desde = self._fecha(options['desde'], 'desde')
+        hasta = self._fecha(options['hasta'], 'hasta')
+        if desde:
+            cotizaciones = cotizaciones.filter(
+                fecha_creacion__gte=timezone.make_aware(datetime.combine(desde, dt_time.min)))
+        if hasta:
+            cotizaciones = cotizaciones.filter(
+                fecha_creacion__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), dt_time.min)))
+        if options['estado']:
+            cotizaciones = cotizaciones.filter(estado=options['estado'])
+        if not (options['ids'] or desde or hasta or options['estado']):
+            raise CommandError('Indique --ids, --desde/--hasta o --estado.')
+
+        ids = list(cotizaciones.order_by('fecha_creacion', 'id').values_list('pk', flat=True))
+        if not ids:
+            self.stdout.write('No hay cotizaciones que coincidan.')
+            return
+
+        inicio = time.monotonic()
+        incluidos = pdf.generar_zip(
+            ids, options['salida'], procesos=options['procesos'], sin_valores=options['sin_valores'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{incluidos} PDF en {options['salida']} ({time.monotonic() - inicio:.1f} s)."
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones import busqueda
+from cotizaciones.models import Cotizacion
+from productos.paginacion import iterar_keyset
+
+
+class Command(BaseCommand):
+    help = ('Reconstruye los documentos de búsqueda de las cotizaciones (por ejemplo, después '
+            'de cargar datos sin pasar por el ORM).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=busqueda.TAMANO_LOTE,
+                            help='Cotizaciones por lote (por defecto %(default)s)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        lote = []
+        total = 0
+        for (pk,) in iterar_keyset(Cotizacion.objects.all(), ('id',), ['id'], options['lote']):
+            lote.append(pk)
+            if len(lote) >= options['lote']:
+                busqueda.actualizar_documentos(lote, options['lote'])
+                total += len(lote)
+                lote = []
+        if lote:
+            busqueda.actualizar_documentos(lote, options['lote'])
+            total += len(lote)
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} documentos de búsqueda actualizados en {time.monotonic() - inicio:.1f} s.'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from cotizaciones.vencimiento import TAMANO_LOTE, pendientes_de_vencer, vencer_cotizaciones
+
+
+class Command(BaseCommand):
+    help = ('Marca como vencidas las cotizaciones en borrador o enviadas cuya fecha de '
+            'vencimiento ya pasó. Pensado para ejecutarse a diario desde cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha',
+                            help='Vence las anteriores a esta fecha AAAA-MM-DD (por defecto, hoy)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Cotizaciones por transacción (por defecto %(default)s)')
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo informa cuántas cotizaciones vencerían')
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                hoy = parse_date(options['fecha'])
+            except ValueError:
+                hoy = None
+            if hoy is None:
+                raise CommandError('--fecha debe tener el formato AAAA-MM-DD.')
+        else:
+            hoy = timezone.localdate()
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero.')
+
+        if options['simular']:
+            cantidad = pendientes_de_vencer(hoy).count()
+            self.stdout.write(f'{cantidad} cotizaciones vencerían (vencimiento anterior a {hoy}).')
+            return
+
+        vencidas = vencer_cotizaciones(hoy, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{vencidas} cotizaciones marcadas como vencidas (vencimiento anterior a {hoy}).'
+        ))
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:40
+
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# InnoDB asocia la lista de stopwords al índice al crearlo. La lista por
+# defecto incluye "a", "de", "la", "en", "es"..., y el parser ngram descarta
+# todo token que contenga una, lo que deja fuera buena parte del texto en
+# español; el índice se crea con las stopwords desactivadas en la sesión.
+MYSQL_CREAR = [
+    "SET @stopwords_anterior = @@SESSION.innodb_ft_enable_stopword",
+    "SET SESSION innodb_ft_enable_stopword = OFF",
+    "ALTER TABLE cotizaciones_documentobusqueda "
+    "ADD FULLTEXT INDEX cotizacion_busqueda_ft (texto) WITH PARSER ngram",
+    "SET SESSION innodb_ft_enable_stopword = @stopwords_anterior",
+]
+MYSQL_BORRAR = "ALTER TABLE cotizaciones_documentobusqueda DROP INDEX cotizacion_busqueda_ft"
+
+POSTGRES_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX cotizacion_busqueda_trgm ON cotizaciones_documentobusqueda "
+    "USING GIN (texto gin_trgm_ops)",
+]
+POSTGRES_BORRAR = ["DROP INDEX IF EXISTS cotizacion_busqueda_trgm"]
+
+TAMANO_LOTE = 1000
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        for sql in MYSQL_CREAR:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_CREAR:
+            schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(MYSQL_BORRAR)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_BORRAR:
+            schema_editor.execute(sql)
+
+
+# Copias de productos.busqueda.normalizar y cotizaciones.busqueda.texto_documento
+# al crear esta migración, para que cambios posteriores no la alteren
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def texto_documento(numero, rut, nombre, contacto, observaciones, descripciones=()):
+    rut = rut or ''
+    compacto = rut.replace('.', '').replace('-', '')
+    partes = [numero, rut, compacto, nombre, contacto, observaciones, *descripciones]
+    return normalizar(' '.join(parte for parte in partes if parte))
+
+
+def crear_documentos(apps, schema_editor):
+    Cotizacion = apps.get_model('cotizaciones', 'Cotizacion')
+    ItemCotizacion = apps.get_model('cotizaciones', 'ItemCotizacion')
+    DocumentoBusqueda = apps.get_model('cotizaciones', 'DocumentoBusqueda')
+    ids = list(Cotizacion.objects.order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        lote = ids[inicio:inicio + TAMANO_LOTE]
+        descripciones = defaultdict(list)
+        for cotizacion_id, descripcion in (
+            ItemCotizacion.objects.filter(cotizacion_id__in=lote).exclude(descripcion='')
+            .order_by('cotizacion_id', 'orden', 'id').values_list('cotizacion_id', 'descripcion')
+        ):
+            descripciones[cotizacion_id].append(descripcion)
+        DocumentoBusqueda.objects.bulk_create([
+            DocumentoBusqueda(
+                cotizacion_id=pk,
+                texto=texto_documento(numero, rut, nombre, contacto, observaciones, descripciones[pk]),
+            )
+            for pk, numero, rut, nombre, contacto, observaciones in Cotizacion.objects.filter(pk__in=lote)
+            .values_list('pk', 'numero', 'cliente__rut', 'cliente__nombre',
+                         'cliente__contacto_principal', 'observaciones')
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0002_secuenciafolio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('cotizacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='cotizaciones.cotizacion')),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indices, borrar_indices),
+        migrations.RunPython(crear_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:43
+
+from django.db import migrations, models
+
+POSTGRES_CREAR = (
+    "CREATE INDEX cliente_nombre_prefijo ON cotizaciones_cliente "
+    "(UPPER(nombre::text) text_pattern_ops)"
+)
+POSTGRES_BORRAR = "DROP INDEX IF EXISTS cliente_nombre_prefijo"
+
+
+def normalizar_ruts(apps, schema_editor):
+    """
+    Completa rut_normalizado. Si varios clientes tienen el mismo RUT escrito
+    distinto, solo el de menor id lo recibe; el comando fusionar_clientes
+    une los demás con él.
+    """
+    from erp_system.rut import normalizar_rut
+
+    Cliente = apps.get_model('cotizaciones', 'Cliente')
+    asignados = set()
+    clientes = []
+    for pk, rut in Cliente.objects.order_by('pk').values_list('pk', 'rut').iterator():
+        canonico = normalizar_rut(rut)
+        if canonico is not None and canonico not in asignados:
+            asignados.add(canonico)
+            clientes.append(Cliente(pk=pk, rut_normalizado=canonico))
+    Cliente.objects.bulk_update(clientes, ['rut_normalizado'], batch_size=1000)
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREAR)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0003_documentobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(normalizar_ruts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cliente',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre'], name='cliente_nombre_idx'),
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
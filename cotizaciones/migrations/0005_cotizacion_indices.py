@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0004_cliente_rut_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='cotizacion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['estado', 'fecha_creacion', 'id'], name='cotizacion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['creado_por', 'fecha_creacion', 'id'], name='cotizacion_vendedor_fecha_idx'),
+        ),
+    ]
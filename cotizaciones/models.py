@@ -1,6 +1,10 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
+from erp_system.rut import normalizar_rut
 from productos.models import Producto
 from tecnicos.models import Tecnico
 
@@ -16,6 +20,9 @@ class Cliente(models.Model):
         max_length=20, choices=TIPO_CLIENTE_CHOICES, default='persona')
     nombre = models.CharField(max_length=200)
     rut = models.CharField(max_length=20, unique=True)
+    # Forma canónica del RUT (erp_system.rut); None si el RUT no es válido
+    rut_normalizado = models.CharField(
+        max_length=12, unique=True, null=True, blank=True, editable=False)
     email = models.EmailField(blank=True)
     telefono = models.CharField(max_length=20, blank=True)
     direccion = models.TextField(blank=True)
@@ -36,10 +43,45 @@ class Cliente(models.Model):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['nombre']
+        indexes = [
+            # Autocompletado por prefijo del nombre
+            models.Index(fields=['nombre'], name='cliente_nombre_idx'),
+        ]
 
     def __str__(self):
         return f"{self.rut} - {self.nombre}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._rut_normalizado_original = instancia.__dict__.get('rut_normalizado')
+        return instancia
+
+    def clean(self):
+        super().clean()
+        canonico = normalizar_rut(self.rut)
+        if canonico is None:
+            raise ValidationError({'rut': 'El RUT no es válido.'})
+        if Cliente.objects.filter(rut_normalizado=canonico).exclude(pk=self.pk).exists():
+            raise ValidationError({'rut': 'Ya existe un cliente con este RUT.'})
+
+    def save(self, *args, **kwargs):
+        canonico = normalizar_rut(self.rut)
+        if (canonico is not None and canonico != self.rut_normalizado and not self._state.adding
+                and Cliente.objects.filter(rut_normalizado=canonico).exclude(pk=self.pk).exists()):
+            # Duplicado que la migración dejó sin RUT canónico: lo sigue sin
+            # tener hasta que fusionar_clientes lo una con el que lo tiene
+            canonico = None
+        self.rut_normalizado = canonico
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'rut' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'rut_normalizado'}
+        super().save(*args, **kwargs)
+
+
+# Columnas que calcula cotizaciones.totales
+CAMPOS_TOTALES = ('subtotal', 'impuestos', 'total')
+
 
 class Cotizacion(models.Model):
     ESTADO_CHOICES = [
@@ -84,6 +126,13 @@ class Cotizacion(models.Model):
         verbose_name = "Cotización"
         verbose_name_plural = "Cotizaciones"
         ordering = ['-fecha_creacion']
+        # El listado ordena por (fecha_creacion, id) descendente y filtra por
+        # año/día, estado y vendedor; el dashboard, por mes y estado
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id'], name='cotizacion_fecha_idx'),
+            models.Index(fields=['estado', 'fecha_creacion', 'id'], name='cotizacion_estado_fecha_idx'),
+            models.Index(fields=['creado_por', 'fecha_creacion', 'id'], name='cotizacion_vendedor_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"COT-{self.numero} - {self.cliente.nombre}"
@@ -91,15 +140,40 @@ class Cotizacion(models.Model):
     def get_absolute_url(self):
         return reverse('cotizaciones:detail', kwargs={'pk': self.pk})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._descuento_original = instancia.__dict__.get('descuento')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        # Los totales los mantienen los items (cotizaciones.totales): un save()
+        # completo de una cotización existente no los pisa
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in CAMPOS_TOTALES
+            ]
+            super().save(*args, **kwargs)
+            if self.descuento != getattr(self, '_descuento_original', None):
+                from .totales import recalcular_impuestos
+                recalcular_impuestos(self)
+                self._descuento_original = self.descuento
+            return
+        super().save(*args, **kwargs)
+
     def calcular_totales(self):
-        """Calcula los totales de la cotización basado en los items"""
-        items = self.items.all()
-        self.subtotal = sum(item.total for item in items)
-        descuento_monto = self.subtotal * (self.descuento / 100)
-        subtotal_con_descuento = self.subtotal - descuento_monto
-        self.impuestos = subtotal_con_descuento * 0.19  # IVA 19%
-        self.total = subtotal_con_descuento + self.impuestos
-        self.save()
+        """Recalcula los totales sumando los items en la base de datos"""
+        from .totales import recalcular
+        recalcular(self)
+
+
+def calcular_total_item(cantidad, precio_unitario, descuento_item):
+    """Total de una línea: cantidad por precio menos el descuento (%), en centavos."""
+    # str() para que un int o float del formulario no pierda exactitud
+    subtotal = cantidad * Decimal(str(precio_unitario))
+    descuento_monto = subtotal * Decimal(str(descuento_item)) / 100
+    return (subtotal - descuento_monto).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 
 class ItemCotizacion(models.Model):
@@ -123,11 +197,23 @@ class ItemCotizacion(models.Model):
         verbose_name_plural = "Items de Cotización"
         ordering = ['orden']
 
+    # Cotización y total con que se leyó de la base, para aplicar solo la diferencia
+    _totales_original = (None, Decimal('0'))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._totales_original = (instancia.cotizacion_id, instancia.__dict__.get('total'))
+        return instancia
+
+    def calcular_total(self):
+        return calcular_total_item(self.cantidad, self.precio_unitario, self.descuento_item)
+
     def save(self, *args, **kwargs):
         # Calcular total automáticamente
-        subtotal = self.cantidad * self.precio_unitario
-        descuento_monto = subtotal * (self.descuento_item / 100)
-        self.total = subtotal - descuento_monto
+        self.total = self.calcular_total()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'total'}
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -161,3 +247,36 @@ class SeguimientoCotizacion(models.Model):
 
     def __str__(self):
         return f"{self.cotizacion.numero} - {self.tipo} - {self.fecha.strftime('%d/%m/%Y')}"
+
+
+class SecuenciaFolio(models.Model):
+    """Último correlativo de folio entregado en cada año."""
+
+    anio = models.PositiveIntegerField(unique=True)
+    ultimo = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Secuencia de Folios"
+        verbose_name_plural = "Secuencias de Folios"
+
+    def __str__(self):
+        return f"{self.anio}: {self.ultimo}"
+
+
+class DocumentoBusqueda(models.Model):
+    """
+    Texto de búsqueda de una cotización: folio, datos del cliente,
+    observaciones y descripciones de los items, normalizado. Lo mantiene
+    cotizaciones.busqueda.
+    """
+
+    cotizacion = models.OneToOneField(
+        Cotizacion, on_delete=models.CASCADE, primary_key=True, related_name='documento_busqueda')
+    texto = models.TextField()
+
+    class Meta:
+        verbose_name = "Documento de Búsqueda"
+        verbose_name_plural = "Documentos de Búsqueda"
+
+    def __str__(self):
+        return f"Búsqueda {self.cotizacion_id}"
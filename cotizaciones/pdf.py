@@ -0,0 +1,309 @@
+"""
+PDF de cotizaciones.
+
+Todo lo que aparece en el PDF (cotización, cliente, items y datos de la
+empresa de ConfiguracionSistema) se lee con tres consultas de values(); el
+hash de esos datos es la versión del contenido. El PDF se guarda en
+MEDIA_ROOT/var/cotizaciones_pdf/ con la versión en el nombre, así que
+mientras la cotización no cambie las descargas siguientes leen el archivo
+sin volver a generarlo.
+
+generar_zip() arma un ZIP con muchas cotizaciones repartiendo la generación
+en un pool de procesos; lo usa el comando generar_pdf_cotizaciones, para que
+las corridas grandes no ocupen los procesos web.
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from configuracion.models import ConfiguracionSistema
+
+from .models import Cotizacion, ItemCotizacion
+from .totales import redondear
+
+# Cambiar si cambia el diseño del PDF, para descartar los archivos guardados
+VERSION_FORMATO = 1
+
+CAMPOS_COTIZACION = (
+    'id', 'numero', 'fecha_creacion', 'fecha_vencimiento', 'estado', 'subtotal', 'descuento',
+    'impuestos', 'total', 'observaciones', 'condiciones_comerciales',
+    'cliente__nombre', 'cliente__rut', 'cliente__direccion', 'cliente__email',
+    'cliente__telefono', 'cliente__contacto_principal', 'cliente__giro',
+    'creado_por__first_name', 'creado_por__last_name', 'creado_por__username',
+)
+CAMPOS_ITEM = (
+    'producto__codigo', 'producto__nombre', 'descripcion', 'cantidad', 'precio_unitario',
+    'descuento_item', 'total',
+)
+CAMPOS_EMPRESA = (
+    'nombre_empresa', 'rut_empresa', 'direccion_empresa', 'telefono_empresa', 'email_empresa',
+    'sitio_web', 'iva_porcentaje',
+)
+
+
+def directorio_pdf():
+    return os.path.join(settings.MEDIA_ROOT, 'var', 'cotizaciones_pdf')
+
+
+def datos_cotizacion(pk):
+    """Datos que se imprimen en el PDF; Cotizacion.DoesNotExist si no existe."""
+    cotizacion = Cotizacion.objects.filter(pk=pk).values(*CAMPOS_COTIZACION).get()
+    cotizacion['fecha_creacion'] = timezone.localtime(cotizacion['fecha_creacion'])
+    items = list(
+        ItemCotizacion.objects.filter(cotizacion_id=pk)
+        .order_by('orden', 'id').values_list(*CAMPOS_ITEM)
+    )
+    empresa = ConfiguracionSistema.objects.filter(pk=1).values(*CAMPOS_EMPRESA).first()
+    if empresa is None:
+        por_defecto = ConfiguracionSistema()
+        empresa = {campo: getattr(por_defecto, campo) for campo in CAMPOS_EMPRESA}
+    return {'cotizacion': cotizacion, 'items': items, 'empresa': empresa}
+
+
+def version_contenido(datos, sin_valores=False):
+    contenido = json.dumps([VERSION_FORMATO, sin_valores, datos], default=str, sort_keys=True)
+    return hashlib.sha1(contenido.encode()).hexdigest()[:20]
+
+
+def nombre_descarga(datos):
+    return f"COT-{datos['cotizacion']['numero']}.pdf"
+
+
+def _moneda(valor):
+    entero = Decimal(valor).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return '$' + f'{entero:,}'.replace(',', '.')
+
+
+def _porcentaje(valor):
+    return f'{Decimal(valor).normalize():f}%'
+
+
+def renderizar(datos, sin_valores=False):
+    """Bytes del PDF. Con sin_valores se omiten precios y totales."""
+    # reportlab se importa solo al generar PDFs
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    cotizacion = datos['cotizacion']
+    empresa = datos['empresa']
+    estilos = getSampleStyleSheet()
+    normal = ParagraphStyle('normal', parent=estilos['Normal'], fontSize=9, leading=11)
+    titulo = ParagraphStyle('titulo', parent=normal, fontName='Helvetica-Bold', fontSize=13, leading=16)
+    seccion = ParagraphStyle('seccion', parent=normal, fontName='Helvetica-Bold', spaceBefore=8, spaceAfter=3)
+
+    def marcado(texto):
+        return escape(str(texto)).replace('\n', '<br/>')
+
+    def parrafo(texto, estilo=normal):
+        return Paragraph(marcado(texto or ''), estilo)
+
+    def lineas(*textos):
+        return Paragraph('<br/>'.join(marcado(texto) for texto in textos if texto), normal)
+
+    salida = BytesIO()
+    documento = SimpleDocTemplate(
+        salida, pagesize=letter, leftMargin=15 * mm, rightMargin=15 * mm,
+        topMargin=15 * mm, bottomMargin=18 * mm,
+        title=f"Cotización {cotizacion['numero']}", author=empresa['nombre_empresa'],
+    )
+    ancho = documento.width
+    contenido = []
+
+    encabezado = Table(
+        [[
+            [
+                parrafo(empresa['nombre_empresa'], titulo),
+                lineas(
+                    empresa['rut_empresa'] and f"RUT {empresa['rut_empresa']}",
+                    empresa['direccion_empresa'],
+                    ' · '.join(filter(None, [empresa['telefono_empresa'], empresa['email_empresa']])),
+                    empresa['sitio_web'],
+                ),
+            ],
+            [
+                parrafo(f"COTIZACIÓN N° {cotizacion['numero']}", titulo),
+                lineas(
+                    f"Fecha: {cotizacion['fecha_creacion']:%d/%m/%Y}",
+                    f"Válida hasta: {cotizacion['fecha_vencimiento']:%d/%m/%Y}",
+                ),
+            ],
+        ]],
+        colWidths=[ancho * 0.6, ancho * 0.4],
+    )
+    encabezado.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('BOX', (1, 0), (1, 0), 0.8, colors.black),
+        ('LEFTPADDING', (0, 0), (0, 0), 0),
+    ]))
+    contenido.append(encabezado)
+
+    vendedor = ' '.join(filter(None, [cotizacion['creado_por__first_name'], cotizacion['creado_por__last_name']]))
+    contenido.append(parrafo('Cliente', seccion))
+    contenido.append(lineas(
+        cotizacion['cliente__nombre'],
+        f"RUT {cotizacion['cliente__rut']}",
+        cotizacion['cliente__giro'] and f"Giro: {cotizacion['cliente__giro']}",
+        cotizacion['cliente__direccion'],
+        cotizacion['cliente__contacto_principal'] and f"Contacto: {cotizacion['cliente__contacto_principal']}",
+        ' · '.join(filter(None, [cotizacion['cliente__telefono'], cotizacion['cliente__email']])),
+        f"Vendedor: {vendedor or cotizacion['creado_por__username']}" if cotizacion['creado_por__username'] else '',
+    ))
+    contenido.append(Spacer(1, 4 * mm))
+
+    if sin_valores:
+        filas = [['Código', 'Descripción', 'Cant.']]
+        columnas = [0.18, 0.7, 0.12]
+    else:
+        filas = [['Código', 'Descripción', 'Cant.', 'Precio unit.', 'Desc.', 'Total']]
+        columnas = [0.14, 0.44, 0.08, 0.13, 0.08, 0.13]
+    for codigo, nombre, descripcion, cantidad, precio, descuento, total in datos['items']:
+        detalle = parrafo(f'{nombre}\n{descripcion}' if descripcion else nombre)
+        fila = [parrafo(codigo), detalle, cantidad]
+        if not sin_valores:
+            fila += [_moneda(precio), _porcentaje(descuento) if descuento else '', _moneda(total)]
+        filas.append(fila)
+    if len(filas) == 1:
+        filas.append(['', parrafo('Sin items'), ''] + ([] if sin_valores else ['', '', '']))
+
+    tabla = Table(filas, colWidths=[ancho * proporcion for proporcion in columnas], repeatRows=1)
+    tabla.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.HexColor('#adb5bd')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+    ]))
+    contenido.append(tabla)
+
+    if not sin_valores:
+        resumen = [['Subtotal', _moneda(cotizacion['subtotal'])]]
+        if cotizacion['descuento']:
+            monto = redondear(cotizacion['subtotal'] * cotizacion['descuento'] / 100)
+            resumen.append([f"Descuento ({_porcentaje(cotizacion['descuento'])})", '-' + _moneda(monto)])
+        resumen.append([f"IVA ({_porcentaje(empresa['iva_porcentaje'])})", _moneda(cotizacion['impuestos'])])
+        resumen.append(['TOTAL', _moneda(cotizacion['total'])])
+        totales = Table(resumen, colWidths=[ancho * 0.2, ancho * 0.15], hAlign='RIGHT')
+        totales.setStyle(TableStyle([
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.8, colors.black),
+        ]))
+        contenido.append(Spacer(1, 3 * mm))
+        contenido.append(totales)
+
+    for etiqueta, campo in (('Observaciones', 'observaciones'), ('Condiciones comerciales', 'condiciones_comerciales')):
+        if cotizacion[campo]:
+            contenido.append(parrafo(etiqueta, seccion))
+            contenido.append(parrafo(cotizacion[campo]))
+
+    def pie(lienzo, documento):
+        lienzo.saveState()
+        lienzo.setFont('Helvetica', 8)
+        lienzo.drawString(documento.leftMargin, 10 * mm, f"Cotización {cotizacion['numero']}")
+        lienzo.drawRightString(
+            documento.leftMargin + documento.width, 10 * mm, f'Página {lienzo.getPageNumber()}',
+        )
+        lienzo.restoreState()
+
+    documento.build(contenido, onFirstPage=pie, onLaterPages=pie)
+    return salida.getvalue()
+
+
+def _prefijo(pk, sin_valores):
+    return os.path.join(directorio_pdf(), f"{pk}-{'sv' if sin_valores else 'cv'}-")
+
+
+def obtener_pdf(pk, sin_valores=False):
+    """
+    Ruta del PDF de la versión actual de la cotización, generándolo si no
+    está guardado. Devuelve (ruta, nombre de descarga, versión).
+    """
+    datos = datos_cotizacion(pk)
+    version = version_contenido(datos, sin_valores)
+    prefijo = _prefijo(pk, sin_valores)
+    ruta = f'{prefijo}{version}.pdf'
+    if not os.path.exists(ruta):
+        contenido = renderizar(datos, sin_valores)
+        os.makedirs(directorio_pdf(), exist_ok=True)
+        # Se escribe aparte y se renombra: nadie lee un PDF a medio escribir
+        descriptor, temporal = tempfile.mkstemp(dir=directorio_pdf(), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+        for anterior in glob.glob(f'{glob.escape(prefijo)}*.pdf'):
+            if anterior != ruta:
+                try:
+                    os.remove(anterior)
+                except FileNotFoundError:
+                    pass
+    return ruta, nombre_descarga(datos), version
+
+
+def eliminar_pdfs(pk):
+    """Borra los PDF guardados de una cotización (al confirmarse la transacción)."""
+    def borrar():
+        for ruta in glob.glob(os.path.join(glob.escape(directorio_pdf()), f'{pk}-*.pdf')):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+    transaction.on_commit(borrar)
+
+
+def _pdf_para_zip(pk, sin_valores):
+    try:
+        ruta, nombre, _ = obtener_pdf(pk, sin_valores)
+    except Cotizacion.DoesNotExist:
+        return pk, None, None
+    return pk, nombre, ruta
+
+
+def generar_zip(ids, destino, procesos=None, sin_valores=False):
+    """
+    Escribe en `destino` (ruta o archivo) un ZIP con el PDF de cada
+    cotización de `ids`. Los PDF se generan en `procesos` procesos; los que
+    ya estaban guardados solo se copian. Devuelve cuántos PDF incluyó.
+    """
+    ids = list(dict.fromkeys(ids))
+    procesos = min(procesos or os.cpu_count() or 1, len(ids)) or 1
+
+    if procesos <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        resultados = (_pdf_para_zip(pk, sin_valores) for pk in ids)
+        pool = None
+    else:
+        # Cada hijo debe abrir su propia conexión, no heredar el socket del padre
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('fork'))
+        resultados = pool.map(
+            _pdf_para_zip, ids, [sin_valores] * len(ids), chunksize=max(1, len(ids) // (procesos * 4)),
+        )
+
+    incluidos = 0
+    try:
+        # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as archivo:
+            for _, nombre, ruta in resultados:
+                if ruta is not None:
+                    archivo.write(ruta, nombre)
+                    incluidos += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return incluidos
@@ -0,0 +1,62 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from configuracion.models import ConfiguracionSistema
+
+from . import busqueda, clientes, facetas, pdf, totales
+from .models import Cliente, Cotizacion, ItemCotizacion
+
+# Campos que entran en el documento de búsqueda
+CAMPOS_BUSQUEDA_COTIZACION = {'numero', 'observaciones', 'cliente'}
+CAMPOS_BUSQUEDA_CLIENTE = {'rut', 'nombre', 'contacto_principal'}
+
+
+@receiver(post_save, sender=Cotizacion)
+def cotizacion_guardada(sender, instance, update_fields=None, **kwargs):
+    facetas.cotizacion_guardada(instance)
+    if update_fields is None or CAMPOS_BUSQUEDA_COTIZACION & set(update_fields):
+        busqueda.programar(instance.pk)
+
+
+@receiver(post_delete, sender=Cotizacion)
+def cotizacion_eliminada(sender, instance, **kwargs):
+    facetas.invalidar_facetas()
+    pdf.eliminar_pdfs(instance.pk)
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_guardado(sender, instance, created=False, update_fields=None, **kwargs):
+    clientes.invalidar_cliente(instance.rut_normalizado, getattr(instance, '_rut_normalizado_original', None))
+    instance._rut_normalizado_original = instance.rut_normalizado
+    if created:
+        return
+    if update_fields is None or CAMPOS_BUSQUEDA_CLIENTE & set(update_fields):
+        busqueda.programar_cliente(instance.pk)
+
+
+@receiver(post_delete, sender=Cliente)
+def cliente_eliminado(sender, instance, **kwargs):
+    clientes.invalidar_cliente(instance.rut_normalizado)
+
+
+@receiver(post_save, sender=ItemCotizacion)
+def item_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cotizacion_anterior = instance._totales_original[0]
+    totales.item_guardado(instance)
+    busqueda.programar(instance.cotizacion_id, cotizacion_anterior)
+
+
+@receiver(post_delete, sender=ItemCotizacion)
+def item_eliminado(sender, instance, origin=None, **kwargs):
+    # Si se elimina la cotización completa no hay totales que actualizar
+    if isinstance(origin, Cotizacion) or getattr(origin, 'model', None) is Cotizacion:
+        return
+    totales.aplicar_diferencia(instance.cotizacion_id, -instance.total)
+    busqueda.programar(instance.cotizacion_id)
+
+
+@receiver(post_save, sender=ConfiguracionSistema)
+def configuracion_guardada(sender, instance, **kwargs):
+    totales.invalidar_iva()
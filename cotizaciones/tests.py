@@ -1,3 +1,238 @@
+"""
+Planes de consulta del listado de cotizaciones y del dashboard, y API de
+items.
+
+Cada prueba siembra unas miles de cotizaciones, captura el SQL que ejecuta
+la vista y revisa el EXPLAIN de las consultas sobre las cotizaciones:
+ninguna debe recorrer completa la tabla de cotizaciones ni la de clientes
+(con la que se une), y las que ordenan deben leer un índice en orden en vez
+de ordenar las filas. Si un cambio en los filtros o en
+Cotizacion.Meta.indexes vuelve a un recorrido completo, estas pruebas
+fallan.
+
+ItemApiTests revisa que la API de items no agregue líneas a cotizaciones
+cerradas ni deje totales que no caben en sus columnas.
+"""
+import json
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from productos.models import Producto
+
+from .clientes import grupos_duplicados
+from .facetas import facetas_listado
+from .models import Cliente, Cotizacion, ItemCotizacion
+
+# Tablas que no deben recorrerse completas en las consultas de cotizaciones
+TABLAS = ('cotizaciones_cotizacion', 'cotizaciones_cliente')
+
+_CONSULTA_COTIZACIONES = re.compile(r'\bFROM\W+cotizaciones_cotizacion\b')
+
+# Actualizar estadísticas dentro de la transacción de la prueba (en MySQL
+# ANALYZE TABLE confirmaría la transacción; InnoDB las recalcula solo)
+ANALIZAR = {
+    'sqlite': 'ANALYZE',
+    'postgresql': 'ANALYZE cotizaciones_cotizacion, cotizaciones_cliente',
+}
+
+
+def plan_consulta(sql):
+    """
+    EXPLAIN de `sql`: devuelve (tablas recorridas completas, ordena filas).
+    """
+    completas = set()
+    ordena = False
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            for *_, detalle in cursor.fetchall():
+                recorrido = re.fullmatch(r'SCAN (\w+)', detalle)
+                if recorrido:
+                    completas.add(recorrido.group(1))
+                ordena = ordena or detalle.startswith('USE TEMP B-TREE FOR')
+        elif connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columnas = [columna[0].lower() for columna in cursor.description]
+            for fila in cursor.fetchall():
+                fila = dict(zip(columnas, fila))
+                if fila['type'] == 'ALL':
+                    completas.add(fila['table'])
+                ordena = ordena or 'Using filesort' in (fila['extra'] or '')
+        else:
+            # Desalentar las alternativas sin índice: si aun así aparecen, no hay índice que sirva
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + sql)
+            for (linea,) in cursor.fetchall():
+                recorrido = re.search(r'Seq Scan on (\w+)', linea)
+                if recorrido:
+                    completas.add(recorrido.group(1))
+                ordena = ordena or re.match(r'\s*(->\s*)?(Incremental )?Sort\b', linea) is not None
+    return completas & set(TABLAS), ordena
+
+
+class PlanesConsultaTests(TestCase):
+    COTIZACIONES = 3000
+    CLIENTES = 300
+    VENDEDORES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedores = [
+            User.objects.create_user(f'vendedor{numero}', password='clave')
+            for numero in range(cls.VENDEDORES)
+        ]
+        clientes = Cliente.objects.bulk_create(
+            Cliente(nombre=f'Cliente {numero}', rut=f'{numero}-X') for numero in range(cls.CLIENTES)
+        )
+        estados = [estado for estado, _ in Cotizacion.ESTADO_CHOICES]
+        cotizaciones = Cotizacion.objects.bulk_create(
+            (
+                Cotizacion(
+                    numero=f'P{numero:06d}',
+                    cliente=clientes[numero % cls.CLIENTES],
+                    creado_por=cls.vendedores[numero % cls.VENDEDORES],
+                    estado=estados[numero % len(estados)],
+                    fecha_vencimiento=date.today(),
+                )
+                for numero in range(cls.COTIZACIONES)
+            ),
+            batch_size=1000,
+        )
+        # fecha_creacion es auto_now_add: se reparte en dos años después de insertar
+        ahora = timezone.now()
+        for numero, cotizacion in enumerate(cotizaciones):
+            cotizacion.fecha_creacion = ahora - timedelta(days=numero % 730, minutes=numero)
+        Cotizacion.objects.bulk_update(cotizaciones, ['fecha_creacion'], batch_size=1000)
+
+        if connection.vendor in ANALIZAR:
+            with connection.cursor() as cursor:
+                cursor.execute(ANALIZAR[connection.vendor])
+
+    def setUp(self):
+        # Las facetas del listado salen de caché; se calculan antes de capturar
+        cache.clear()
+        facetas_listado()
+        self.client.force_login(self.vendedores[0])
+
+    def consultas(self, url, **parametros):
+        """SQL de las consultas de la vista sobre las cotizaciones."""
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        sql = [consulta['sql'] for consulta in capturadas.captured_queries]
+        sql = [consulta for consulta in sql if _CONSULTA_COTIZACIONES.search(consulta)]
+        self.assertTrue(sql, 'La vista no consultó las cotizaciones.')
+        return respuesta, sql
+
+    def assertUsaIndices(self, url, **parametros):
+        respuesta, sql = self.consultas(url, **parametros)
+        for consulta in sql:
+            completas, ordena = plan_consulta(consulta)
+            with self.subTest(sql=consulta):
+                self.assertFalse(completas, f'Recorrido completo de {", ".join(sorted(completas))}')
+                if 'ORDER BY' in consulta:
+                    self.assertFalse(ordena, 'Ordena las filas en vez de leer un índice en orden')
+        return respuesta
+
+    def test_listado_sin_filtros(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'))
+
+    def test_listado_pagina_siguiente(self):
+        respuesta = self.assertUsaIndices(reverse('cotizaciones:list'))
+        cursor = respuesta.context['pagina'].cursor_siguiente
+        self.assertIsNotNone(cursor)
+        self.assertUsaIndices(reverse('cotizaciones:list'), despues=cursor)
+
+    def test_listado_por_estado(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'), estado='enviada')
+
+    def test_listado_por_anio(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'), **{'año': timezone.localdate().year})
+
+    def test_listado_por_fecha_emision(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'), fecha_emision=timezone.localdate().isoformat())
+
+    def test_listado_por_vendedor(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'), vendedor='vendedor1')
+
+    def test_listado_por_estado_y_vendedor(self):
+        self.assertUsaIndices(reverse('cotizaciones:list'), estado='aprobada', vendedor='vendedor1')
+
+    def test_listado_por_anio_y_estado(self):
+        self.assertUsaIndices(
+            reverse('cotizaciones:list'), estado='borrador', **{'año': timezone.localdate().year}
+        )
+
+    def test_dashboard(self):
+        self.assertUsaIndices(reverse('dashboard:index'))
+
+
+class ItemApiTests(TestCase):
+
+    def setUp(self):
+        usuario = User.objects.create_user('vendedor', password='clave')
+        self.client.force_login(usuario)
+        Producto.objects.create(codigo='P-1', nombre='Cable', precio_compra=100, precio_venta=150)
+        self.cotizacion = Cotizacion.objects.create(
+            numero='T000001', cliente=Cliente.objects.create(nombre='Cliente', rut='1-9'),
+            creado_por=usuario, fecha_vencimiento=date.today(),
+        )
+
+    def agregar(self, *lineas):
+        return self.client.post(
+            reverse('cotizaciones:api_items', args=[self.cotizacion.pk]),
+            json.dumps({'items': list(lineas)}), content_type='application/json',
+        )
+
+    def test_agrega_items(self):
+        respuesta = self.agregar({'codigo': 'P-1', 'cantidad': 2})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Decimal(respuesta.json()['subtotal']), Decimal('300'))
+
+    def test_rechaza_cotizacion_cerrada(self):
+        Cotizacion.objects.filter(pk=self.cotizacion.pk).update(estado='aprobada')
+        respuesta = self.agregar({'codigo': 'P-1', 'cantidad': 2})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertFalse(ItemCotizacion.objects.exists())
+
+    def test_rechaza_totales_demasiado_grandes(self):
+        # Cada línea cabe en su columna, pero la suma con IVA no cabe en la cotización
+        linea = {'codigo': 'P-1', 'cantidad': 1_000_000, 'precio_unitario': '9000'}
+        respuesta = self.agregar(linea, linea)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(ItemCotizacion.objects.exists())
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.total, 0)
+
+
+class ClienteDuplicadoTests(TestCase):
+    """Un duplicado pendiente de fusionar se puede seguir guardando."""
+
+    def setUp(self):
+        self.original = Cliente.objects.create(nombre='Original', rut='12.345.678-5')
+        # Como lo deja la migración 0004: mismo RUT escrito distinto, sin canónico
+        self.duplicado = Cliente.objects.create(nombre='Duplicado', rut='99.999.999-9')
+        Cliente.objects.filter(pk=self.duplicado.pk).update(rut='12345678-5', rut_normalizado=None)
+        self.duplicado.refresh_from_db()
+
+    def test_guardar_duplicado_no_falla(self):
+        self.duplicado.nombre = 'Duplicado editado'
+        self.duplicado.save()
+        self.duplicado.refresh_from_db()
+        self.assertIsNone(self.duplicado.rut_normalizado)
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.rut_normalizado, '12345678-5')
 
-# Create your tests here.
+    def test_duplicado_sigue_pendiente_de_fusion(self):
+        self.duplicado.save()
+        self.assertEqual(grupos_duplicados()[0], {'12345678-5': [self.original.pk, self.duplicado.pk]})
@@ -0,0 +1,135 @@
+"""
+Totales de cotización (subtotal, impuestos y total).
+
+Cuando se guarda o elimina un item, la señal aplica a la cotización solo la
+diferencia del total del item: se bloquea la fila de la cotización, se
+recalculan impuestos y total desde el subtotal nuevo y se actualizan esas
+tres columnas, sin leer los demás items. recalcular() suma los items con un
+SUM en la base para los casos en que no hay diferencia conocida.
+
+Todo el cálculo es con Decimal y redondeo a centavos (mitad hacia arriba).
+El porcentaje de IVA sale de ConfiguracionSistema y queda en caché hasta que
+se modifica la configuración.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from configuracion.models import ConfiguracionSistema
+
+from .models import Cotizacion, ItemCotizacion
+
+CENTAVOS = Decimal('0.01')
+IVA_DEFECTO = Decimal('19.00')
+CLAVE_IVA = 'configuracion:iva_porcentaje'
+
+
+def redondear(valor):
+    return Decimal(valor).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def porcentaje_iva():
+    iva = cache.get(CLAVE_IVA)
+    if iva is None:
+        iva = ConfiguracionSistema.objects.filter(pk=1).values_list('iva_porcentaje', flat=True).first()
+        if iva is None:
+            iva = IVA_DEFECTO
+        cache.set(CLAVE_IVA, iva, None)
+    return iva
+
+
+def invalidar_iva():
+    transaction.on_commit(lambda: cache.delete(CLAVE_IVA))
+
+
+def calcular(subtotal, descuento, iva=None):
+    """Dict con subtotal, impuestos y total para un subtotal y un descuento (%)."""
+    iva = porcentaje_iva() if iva is None else iva
+    subtotal = redondear(subtotal)
+    neto = subtotal - redondear(subtotal * descuento / 100)
+    impuestos = redondear(neto * iva / 100)
+    return {'subtotal': subtotal, 'impuestos': impuestos, 'total': neto + impuestos}
+
+
+def _guardar(cotizacion_id, subtotal, descuento, cotizacion=None, con_descuento=False):
+    valores = calcular(subtotal, descuento)
+    if con_descuento:
+        Cotizacion.objects.filter(pk=cotizacion_id).update(descuento=descuento, **valores)
+    else:
+        Cotizacion.objects.filter(pk=cotizacion_id).update(**valores)
+    if cotizacion is not None:
+        for campo, valor in valores.items():
+            setattr(cotizacion, campo, valor)
+    return valores
+
+
+def aplicar_diferencia(cotizacion_id, diferencia):
+    """
+    Suma `diferencia` al subtotal de la cotización y recalcula impuestos y
+    total. Devuelve los valores guardados, o None si no hubo cambios.
+    """
+    if not diferencia:
+        return None
+    with transaction.atomic():
+        fila = (
+            Cotizacion.objects.select_for_update()
+            .filter(pk=cotizacion_id)
+            .values_list('subtotal', 'descuento')
+            .first()
+        )
+        if fila is not None:
+            subtotal, descuento = fila
+            return _guardar(cotizacion_id, subtotal + diferencia, descuento)
+    return None
+
+
+def recalcular(cotizacion):
+    """
+    Recalcula los totales sumando los items en la base y guarda también el
+    descuento de la instancia. Actualiza los atributos de `cotizacion`.
+    """
+    with transaction.atomic():
+        # Bloquea la cotización para que ninguna diferencia se aplique entre el SUM y el UPDATE
+        list(Cotizacion.objects.select_for_update().filter(pk=cotizacion.pk).values_list('pk'))
+        subtotal = (
+            ItemCotizacion.objects.filter(cotizacion_id=cotizacion.pk)
+            .aggregate(suma=Sum('total'))['suma']
+            or Decimal('0')
+        )
+        return _guardar(cotizacion.pk, subtotal, cotizacion.descuento, cotizacion, con_descuento=True)
+
+
+def recalcular_impuestos(cotizacion):
+    """Impuestos y total tras cambiar el descuento, con el subtotal guardado."""
+    with transaction.atomic():
+        subtotal = (
+            Cotizacion.objects.select_for_update()
+            .filter(pk=cotizacion.pk)
+            .values_list('subtotal', flat=True)
+            .first()
+        )
+        if subtotal is not None:
+            return _guardar(cotizacion.pk, subtotal, cotizacion.descuento, cotizacion)
+
+
+def item_guardado(item):
+    """Aplica el cambio de total de un item recién guardado."""
+    cotizacion_anterior, total_anterior = item._totales_original
+    if total_anterior is None:
+        # No se conocía el total anterior (campo diferido): se suma todo de nuevo
+        recalcular(Cotizacion(pk=item.cotizacion_id, descuento=_descuento(item.cotizacion_id)))
+        if cotizacion_anterior not in (None, item.cotizacion_id):
+            recalcular(Cotizacion(pk=cotizacion_anterior, descuento=_descuento(cotizacion_anterior)))
+    elif cotizacion_anterior not in (None, item.cotizacion_id):
+        # El item cambió de cotización
+        aplicar_diferencia(cotizacion_anterior, -total_anterior)
+        aplicar_diferencia(item.cotizacion_id, item.total)
+    else:
+        aplicar_diferencia(item.cotizacion_id, item.total - total_anterior)
+    item._totales_original = (item.cotizacion_id, item.total)
+
+
+def _descuento(cotizacion_id):
+    return Cotizacion.objects.filter(pk=cotizacion_id).values_list('descuento', flat=True).first() or 0
@@ -1,14 +1,20 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 app_name = 'cotizaciones'
 
 urlpatterns = [
     path('', views.cotizacion_list, name='list'),
     path('emitir/', views.cotizacion_create, name='create'),
+    path('exportar/', views.cotizacion_exportar, name='exportar'),
+    path('acciones/', views.cotizacion_accion_masiva, name='accion_masiva'),
+    path('api/clientes/', api.cliente_api_autocompletar, name='api_clientes'),
+    path('api/clientes/rut/', api.cliente_api_rut, name='api_cliente_rut'),
     path('<int:pk>/', views.cotizacion_detail, name='detail'),
+    path('<int:pk>/pdf/', views.cotizacion_pdf, name='pdf'),
     path('<int:pk>/editar/', views.cotizacion_edit, name='edit'),
     path('<int:pk>/eliminar/', views.cotizacion_delete, name='delete'),
     path('<int:pk>/aprobar/', views.cotizacion_aprobar, name='aprobar'),
     path('<int:pk>/rechazar/', views.cotizacion_rechazar, name='rechazar'),
+    path('<int:pk>/api/items/', api.item_api_crear, name='api_items'),
 ]
@@ -0,0 +1,40 @@
+"""
+Vencimiento de cotizaciones.
+
+vencer_cotizaciones() aplica la transición 'vencer' (cotizaciones.estados)
+a las cotizaciones en borrador o enviadas cuya fecha de vencimiento ya
+pasó. Recorre las pendientes por lotes de id, y cada lote es una
+transacción corta del motor de estados: bloquea las filas que siguen
+pendientes (saltando las que otra transacción tiene tomadas, que quedan
+para la próxima pasada), las actualiza con un UPDATE y crea los
+seguimientos con bulk_create. Volver a ejecutarlo no repite nada, porque
+las vencidas ya no cumplen el filtro. Lo ejecuta el comando
+vencer_cotizaciones, una vez al día desde cron.
+"""
+from django.utils import timezone
+
+from .estados import ESTADOS_VIGENTES, transicionar
+from .models import Cotizacion
+
+TAMANO_LOTE = 2000
+
+
+def pendientes_de_vencer(hoy=None):
+    """Cotizaciones vigentes con la fecha de vencimiento anterior a `hoy`."""
+    return Cotizacion.objects.filter(
+        estado__in=ESTADOS_VIGENTES, fecha_vencimiento__lt=hoy or timezone.localdate(),
+    )
+
+
+def vencer_cotizaciones(hoy=None, tamano_lote=TAMANO_LOTE):
+    """Marca como vencidas las cotizaciones pendientes; devuelve cuántas."""
+    pendientes = pendientes_de_vencer(hoy).order_by('pk')
+    vencidas = 0
+    ultimo = 0
+    while True:
+        ids = list(pendientes.filter(pk__gt=ultimo).values_list('pk', flat=True)[:tamano_lote])
+        if not ids:
+            return vencidas
+        ultimo = ids[-1]
+        # Se vuelve a aplicar el filtro: entre la lectura y el bloqueo pudieron aprobarse
+        vencidas += len(transicionar(pendientes.filter(pk__in=ids), 'vencer', saltar_bloqueadas=True))
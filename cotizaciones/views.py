@@ -1,121 +1,140 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-from django.http import JsonResponse
-from datetime import datetime, timedelta, date
+from django.http import FileResponse, Http404, JsonResponse
+from datetime import datetime, timedelta, date, time
 from django.db import transaction
-from .models import Cotizacion, Cliente, ItemCotizacion
-
-def generar_numero_cotizacion():
-    """Genera un número único para la cotización"""
-    import random
-    
-    # Obtener el año actual
-    year = date.today().year
-    
-    # Intentar generar un número único
-    for _ in range(100):  # Máximo 100 intentos
-        # Generar número aleatorio de 4 dígitos
-        numero_aleatorio = random.randint(1000, 9999)
-        numero = f"{year}{numero_aleatorio}"
-        
-        # Verificar si ya existe
-        if not Cotizacion.objects.filter(numero=numero).exists():
-            return numero
-    
-    # Si no se pudo generar después de 100 intentos, usar timestamp
-    import time
-    timestamp = int(time.time())
-    return f"{year}{timestamp % 10000}"
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+from erp_system.exportacion import respuesta_exportacion
+from erp_system.rut import normalizar_rut
+from productos.paginacion import iterar_keyset, paginar_keyset, total_aproximado
+from .models import Cotizacion, ItemCotizacion
+from .facetas import facetas_listado
+from . import busqueda, clientes, estados, folios, pdf
 
-@login_required
-def cotizacion_list(request):
-    # Filtros de búsqueda
-    folio = request.GET.get('folio', '')
-    rut = request.GET.get('rut', '')
-    razon_social = request.GET.get('razon_social', '')
-    contacto = request.GET.get('contacto', '')
-    detalle = request.GET.get('detalle', '')
-    año = request.GET.get('año', 'todos')
-    fecha_emision = request.GET.get('fecha_emision', '')
-    estado = request.GET.get('estado', 'todas')
-    tipo = request.GET.get('tipo', 'todas')
-    vendedor = request.GET.get('vendedor', 'todos')
-    
-    cotizaciones = Cotizacion.objects.select_related('cliente').all()
-    
-    # Debug: mostrar total de cotizaciones
-    print(f"=== DEBUG LISTA COTIZACIONES ===")
-    print(f"Total cotizaciones en BD: {Cotizacion.objects.count()}")
-    print(f"Estado filtro: {estado}")
-    
-    # Aplicar filtros
+COTIZACIONES_POR_PAGINA = 50
+OPCIONES_POR_PAGINA = (25, 50, 100)
+
+# Columnas que muestra cotizaciones/list.html
+CAMPOS_LISTADO = (
+    'numero', 'fecha_creacion', 'fecha_vencimiento', 'estado', 'subtotal', 'impuestos',
+    'observaciones', 'cliente__rut', 'cliente__nombre', 'cliente__contacto_principal',
+    'creado_por__username', 'creado_por__first_name', 'creado_por__last_name',
+)
+
+def _filtrar_cotizaciones(cotizaciones, parametros):
+    """Aplica los filtros del listado de cotizaciones (parámetros GET)."""
+    folio = parametros.get('folio', '')
+    rut = parametros.get('rut', '')
+    razon_social = parametros.get('razon_social', '')
+    contacto = parametros.get('contacto', '')
+    detalle = parametros.get('detalle', '')
+    año = parametros.get('año', 'todos')
+    fecha_emision = parametros.get('fecha_emision', '')
+    estado = parametros.get('estado', 'todas')
+    vendedor = parametros.get('vendedor', 'todos')
+    
+    # El índice de búsqueda acota las candidatas; el icontains conserva el filtro por campo
     if folio:
-        cotizaciones = cotizaciones.filter(numero__icontains=folio)
+        cotizaciones = busqueda.filtrar_por_texto(cotizaciones, folio).filter(numero__icontains=folio)
     
     if rut:
-        cotizaciones = cotizaciones.filter(cliente__rut__icontains=rut)
+        cotizaciones = busqueda.filtrar_por_texto(cotizaciones, rut).filter(cliente__rut__icontains=rut)
     
     if razon_social:
-        cotizaciones = cotizaciones.filter(cliente__nombre__icontains=razon_social)
+        cotizaciones = busqueda.filtrar_por_texto(cotizaciones, razon_social).filter(
+            cliente__nombre__icontains=razon_social)
     
     if contacto:
-        cotizaciones = cotizaciones.filter(cliente__contacto_principal__icontains=contacto)
+        cotizaciones = busqueda.filtrar_por_texto(cotizaciones, contacto).filter(
+            cliente__contacto_principal__icontains=contacto)
     
+    # Texto libre: observaciones, descripciones de los items y datos del cliente
     if detalle:
-        cotizaciones = cotizaciones.filter(observaciones__icontains=detalle)
+        cotizaciones = busqueda.filtrar_por_texto(cotizaciones, detalle)
     
-    if año != 'todos':
+    if año.isdigit():
         cotizaciones = cotizaciones.filter(fecha_creacion__year=año)
     
-    if fecha_emision:
-        cotizaciones = cotizaciones.filter(fecha_creacion=fecha_emision)
-    
-    # Filtros de estado corregidos
-    if estado == 'borrador':
-        cotizaciones = cotizaciones.filter(estado='borrador')
-    elif estado == 'enviada':
-        cotizaciones = cotizaciones.filter(estado='enviada')
-    elif estado == 'aprobada':
-        cotizaciones = cotizaciones.filter(estado='aprobada')
-    elif estado == 'rechazada':
-        cotizaciones = cotizaciones.filter(estado='rechazada')
-    # Si es 'todas', no aplicar filtro de estado
-    
-    if tipo == 'afecta':
-        cotizaciones = cotizaciones.filter(tipo='afecta')
-    elif tipo == 'exenta':
-        cotizaciones = cotizaciones.filter(tipo='exenta')
+    try:
+        dia = parse_date(fecha_emision)
+    except ValueError:
+        dia = None
+    if dia:
+        # Rango del día local, para que use el índice de fecha_creacion
+        inicio = timezone.make_aware(datetime.combine(dia, time.min))
+        cotizaciones = cotizaciones.filter(
+            fecha_creacion__gte=inicio, fecha_creacion__lt=inicio + timedelta(days=1)
+        )
+    
+    if estado in dict(Cotizacion.ESTADO_CHOICES):
+        cotizaciones = cotizaciones.filter(estado=estado)
     
     if vendedor != 'todos':
         cotizaciones = cotizaciones.filter(creado_por__username=vendedor)
     
-    cotizaciones = cotizaciones.order_by('-fecha_creacion')
+    return cotizaciones
+
+@login_required
+def cotizacion_list(request):
+    # Filtros de búsqueda
+    filtros = {
+        'folio': request.GET.get('folio', ''),
+        'rut': request.GET.get('rut', ''),
+        'razon_social': request.GET.get('razon_social', ''),
+        'contacto': request.GET.get('contacto', ''),
+        'detalle': request.GET.get('detalle', ''),
+        'año': request.GET.get('año', 'todos'),
+        'fecha_emision': request.GET.get('fecha_emision', ''),
+        'estado': request.GET.get('estado', 'todas'),
+        'vendedor': request.GET.get('vendedor', 'todos'),
+    }
+    try:
+        por_pagina = int(request.GET.get('por_pagina', COTIZACIONES_POR_PAGINA))
+    except ValueError:
+        por_pagina = COTIZACIONES_POR_PAGINA
+    if por_pagina not in OPCIONES_POR_PAGINA:
+        por_pagina = COTIZACIONES_POR_PAGINA
+    
+    cotizaciones = _filtrar_cotizaciones(
+        Cotizacion.objects.select_related('cliente', 'creado_por').only(*CAMPOS_LISTADO),
+        request.GET,
+    )
     
-    # Debug final
-    print(f"Cotizaciones después de filtros: {cotizaciones.count()}")
-    for cot in cotizaciones[:3]:  # Mostrar las primeras 3
-        print(f"  - {cot.numero} | {cot.cliente.nombre if cot.cliente else 'Sin cliente'} | {cot.estado}")
+    # Paginación por cursor sobre (fecha_creacion, id), más reciente primero
+    pagina = paginar_keyset(
+        cotizaciones,
+        orden=('-fecha_creacion', '-id'),
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        por_pagina=por_pagina,
+    )
     
-    # Opciones para los filtros
-    años_disponibles = Cotizacion.objects.dates('fecha_creacion', 'year', order='DESC')
-    vendedores = Cotizacion.objects.values_list('creado_por__username', flat=True).distinct()
+    # Filtros activos para conservarlos en los enlaces de paginación
+    filtros_query = urlencode({
+        clave: valor for clave, valor in [*filtros.items(), ('por_pagina', por_pagina)]
+        if valor and valor not in ('todos', 'todas') and valor != COTIZACIONES_POR_PAGINA
+    })
+    
+    # Opciones para los filtros, desde caché
+    opciones = facetas_listado()
     
     context = {
-        'cotizaciones': cotizaciones,
-        'folio': folio,
-        'rut': rut,
-        'razon_social': razon_social,
-        'contacto': contacto,
-        'detalle': detalle,
-        'año': año,
-        'fecha_emision': fecha_emision,
-        'estado': estado,
-        'tipo': tipo,
-        'vendedor': vendedor,
-        'años_disponibles': años_disponibles,
-        'vendedores': vendedores,
+        'cotizaciones': pagina.objetos,
+        'pagina': pagina,
+        'total_cotizaciones': total_aproximado(cotizaciones),
+        'filtros_query': filtros_query,
+        'por_pagina': por_pagina,
+        'opciones_por_pagina': OPCIONES_POR_PAGINA,
+        'años_disponibles': opciones['anios'],
+        'vendedores': opciones['vendedores'],
+        **filtros,
     }
     
     return render(request, 'cotizaciones/list.html', context)
@@ -128,6 +147,7 @@ def cotizacion_detail(request, pk):
     context = {
         'cotizacion': cotizacion,
         'items': items,
+        'acciones': estados.acciones_permitidas(cotizacion.estado),
     }
     return render(request, 'cotizaciones/detail.html', context)
 
@@ -155,23 +175,28 @@ def cotizacion_create(request):
                 # Validar campos requeridos
                 if not rut_cliente:
                     messages.error(request, 'El RUT del cliente es requerido.')
-                    return render(request, 'cotizaciones/emitir.html', {'numero_sugerido': generar_numero_cotizacion()})
+                    return render(request, 'cotizaciones/emitir.html', {'proximo_folio': folios.proximo_folio()})
+                
+                if normalizar_rut(rut_cliente) is None:
+                    messages.error(request, f'El RUT {rut_cliente} no es válido.')
+                    return render(request, 'cotizaciones/emitir.html', {'proximo_folio': folios.proximo_folio()})
                 
                 if not razon_social:
                     messages.error(request, 'La razón social del cliente es requerida.')
-                    return render(request, 'cotizaciones/emitir.html', {'numero_sugerido': generar_numero_cotizacion()})
+                    return render(request, 'cotizaciones/emitir.html', {'proximo_folio': folios.proximo_folio()})
                 
-                # Generar número de cotización único
-                if folio_manual and not Cotizacion.objects.filter(numero=folio_manual).exists():
+                # Folio manual, salvo que exista o choque con la numeración automática
+                if (folio_manual and not folios.es_folio_automatico(folio_manual)
+                        and not Cotizacion.objects.filter(numero=folio_manual).exists()):
                     numero_cotizacion = folio_manual
                 else:
-                    numero_cotizacion = generar_numero_cotizacion()
+                    numero_cotizacion = folios.asignar_folio()
                     if folio_manual:
-                        messages.warning(request, f'El folio {folio_manual} ya existe. Se generó automáticamente: {numero_cotizacion}')
+                        messages.warning(request, f'El folio {folio_manual} ya existe o corresponde a la numeración automática. Se asignó: {numero_cotizacion}')
                 
-                # Crear cliente si no existe
-                cliente, created = Cliente.objects.get_or_create(
-                    rut=rut_cliente,
+                # Crear cliente si no existe (por RUT canónico, con o sin puntos)
+                cliente, created = clientes.obtener_o_crear_cliente(
+                    rut_cliente,
                     defaults={
                         'nombre': razon_social,
                         'contacto_principal': request.POST.get('nombre_contacto', ''),
@@ -185,7 +210,7 @@ def cotizacion_create(request):
                 fecha_vencimiento = date.today() + timedelta(days=30)  # 30 días por defecto
                 
                 cotizacion = Cotizacion.objects.create(
-                    cliente=cliente,
+                    cliente_id=cliente['id'],
                     numero=numero_cotizacion,
                     fecha_vencimiento=fecha_vencimiento,
                     observaciones=glosa_adicional,
@@ -194,43 +219,106 @@ def cotizacion_create(request):
                 )
                 
                 print(f"✅ Cotización creada: ID={cotizacion.id}, Número={cotizacion.numero}")
-                messages.success(request, f'¡Cotización {cotizacion.numero} creada exitosamente! Cliente: {cliente.nombre}')
+                messages.success(request, f'¡Cotización {cotizacion.numero} creada exitosamente! Cliente: {cliente["nombre"]}')
                 return redirect('cotizaciones:detail', pk=cotizacion.pk)
                 
         except Exception as e:
             messages.error(request, f'Error al crear la cotización: {str(e)}')
-            return render(request, 'cotizaciones/emitir.html')
+            return render(request, 'cotizaciones/emitir.html', {'proximo_folio': folios.proximo_folio()})
     
-    # GET request - mostrar formulario con número sugerido
-    numero_sugerido = generar_numero_cotizacion()
+    # GET request - solo muestra el próximo folio; se asigna al guardar
     context = {
-        'numero_sugerido': numero_sugerido
+        'proximo_folio': folios.proximo_folio()
     }
     return render(request, 'cotizaciones/emitir.html', context)
 
+@login_required
+def cotizacion_pdf(request, pk):
+    """PDF de la cotización (?sin_valores=1 omite precios; ?descargar=1 lo descarga)."""
+    sin_valores = request.GET.get('sin_valores') == '1'
+    try:
+        ruta, nombre, version = pdf.obtener_pdf(pk, sin_valores)
+    except Cotizacion.DoesNotExist:
+        raise Http404('La cotización no existe.')
+
+    etag = f'"{version}"'
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        respuesta = FileResponse(
+            open(ruta, 'rb'), as_attachment=request.GET.get('descargar') == '1',
+            filename=nombre, content_type='application/pdf',
+        )
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
 @login_required
 def cotizacion_edit(request, pk):
     cotizacion = get_object_or_404(Cotizacion, pk=pk)
     messages.info(request, f'Formulario de edición para {cotizacion.folio} en desarrollo.')
     return redirect('cotizaciones:detail', pk=cotizacion.pk)
 
+# Textos de los mensajes de cada acción: (participio, infinitivo)
+TEXTOS_ACCION = {
+    'aprobar': ('aprobada', 'aprobar'),
+    'rechazar': ('rechazada', 'rechazar'),
+}
+
+# Máximo de cotizaciones por acción masiva
+MAXIMO_SELECCION = 1000
+
+def _transicionar_cotizacion(request, pk, accion):
+    numero = get_object_or_404(Cotizacion.objects.values_list('numero', flat=True), pk=pk)
+    participio, infinitivo = TEXTOS_ACCION[accion]
+    if estados.transicionar([pk], accion, usuario=request.user):
+        messages.success(request, f'Cotización {numero} {participio} exitosamente.')
+    else:
+        estado = Cotizacion.objects.get(pk=pk).get_estado_display()
+        messages.warning(request, f'No se puede {infinitivo} la cotización {numero}: está {estado.lower()}.')
+    return redirect('cotizaciones:detail', pk=pk)
+
 @login_required
+@require_POST
 def cotizacion_aprobar(request, pk):
-    cotizacion = get_object_or_404(Cotizacion, pk=pk)
-    cotizacion.estado = 'aprobada'
-    cotizacion.save()
-    
-    messages.success(request, f'Cotización {cotizacion.numero} aprobada exitosamente.')
-    return redirect('cotizaciones:detail', pk=cotizacion.pk)
+    return _transicionar_cotizacion(request, pk, 'aprobar')
 
 @login_required
+@require_POST
 def cotizacion_rechazar(request, pk):
-    cotizacion = get_object_or_404(Cotizacion, pk=pk)
-    cotizacion.estado = 'rechazada'
-    cotizacion.save()
-    
-    messages.success(request, f'Cotización {cotizacion.numero} rechazada.')
-    return redirect('cotizaciones:detail', pk=cotizacion.pk)
+    return _transicionar_cotizacion(request, pk, 'rechazar')
+
+@login_required
+@require_POST
+def cotizacion_accion_masiva(request):
+    """Aprueba o rechaza las cotizaciones seleccionadas en el listado."""
+    url_listado = reverse('cotizaciones:list')
+    filtros = request.POST.get('filtros', '')
+    if filtros:
+        url_listado = f'{url_listado}?{filtros}'
+
+    accion = request.POST.get('accion')
+    ids = {int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()}
+    if accion not in TEXTOS_ACCION:
+        messages.error(request, 'Acción no válida.')
+        return redirect(url_listado)
+    if not ids:
+        messages.warning(request, 'No se seleccionaron cotizaciones.')
+        return redirect(url_listado)
+    if len(ids) > MAXIMO_SELECCION:
+        messages.error(request, f'Se pueden seleccionar hasta {MAXIMO_SELECCION} cotizaciones.')
+        return redirect(url_listado)
+
+    participio, infinitivo = TEXTOS_ACCION[accion]
+    cambiadas = estados.transicionar(ids, accion, usuario=request.user)
+    if cambiadas:
+        messages.success(request, f'{len(cambiadas)} cotizaciones {participio}s.')
+    if len(cambiadas) < len(ids):
+        messages.warning(
+            request,
+            f'{len(ids) - len(cambiadas)} cotizaciones no se pudieron {infinitivo}: '
+            'ya no están en borrador ni enviadas.'
+        )
+    return redirect(url_listado)
 
 @login_required
 def cotizacion_delete(request, pk):
@@ -247,3 +335,23 @@ def cotizacion_delete(request, pk):
     }
 
     return render(request, 'cotizaciones/delete_confirm.html', context)
+
+COLUMNAS_EXPORTACION = [
+    ('numero', 'Folio'), ('fecha_creacion', 'Fecha emisión'), ('cliente__rut', 'RUT'),
+    ('cliente__nombre', 'Razón social'), ('cliente__contacto_principal', 'Contacto'),
+    ('estado', 'Estado'), ('fecha_vencimiento', 'Vencimiento'), ('subtotal', 'Subtotal'),
+    ('descuento', 'Descuento %'), ('impuestos', 'Impuestos'), ('total', 'Total'),
+    ('creado_por__username', 'Vendedor'),
+]
+
+@login_required
+def cotizacion_exportar(request):
+    """Exporta las cotizaciones con los filtros del listado (?formato=csv|xlsx)."""
+    cotizaciones = _filtrar_cotizaciones(Cotizacion.objects.all(), request.GET)
+    filas = iterar_keyset(
+        cotizaciones, ('-fecha_creacion', '-id'), [columna for columna, _ in COLUMNAS_EXPORTACION]
+    )
+    return respuesta_exportacion(
+        request.GET.get('formato'), 'cotizaciones',
+        [encabezado for _, encabezado in COLUMNAS_EXPORTACION], filas, hoja='Cotizaciones',
+    )
@@ -4,6 +4,8 @@ from django.db.models import Count, Sum, Q, F
 from django.utils import timezone
 from tecnicos.models import Tecnico, VacacionesTecnico
 from productos.models import Producto, MovimientoInventario
+from productos.alertas import total_bajo_stock
+from productos.valoracion import valor_total
 from cotizaciones.models import Cotizacion, Cliente
 
 @login_required
@@ -17,10 +19,8 @@ def dashboard_index(request):
     
     # Métricas de productos
     total_productos = Producto.objects.filter(activo=True).count()
-    productos_bajo_stock = Producto.objects.filter(
-        activo=True,
-        stock_actual__lte=F('stock_minimo')
-    ).count()
+    productos_bajo_stock = total_bajo_stock()
+    valor_inventario = valor_total()
     
     # Métricas de cotizaciones (último mes)
     fecha_inicio_mes = timezone.now().replace(day=1)
@@ -45,7 +45,7 @@ def dashboard_index(request):
     # Productos con bajo stock
     productos_restock = Producto.objects.filter(
         activo=True,
-        stock_actual__lte=F('stock_minimo')
+        bajo_stock=True
     ).order_by('stock_actual')[:5]
     
     # Vacaciones pendientes
@@ -60,6 +60,7 @@ def dashboard_index(request):
         'tecnicos_vacaciones': tecnicos_vacaciones,
         'total_productos': total_productos,
         'productos_bajo_stock': productos_bajo_stock,
+        'valor_inventario': valor_inventario,
         'total_cotizaciones_mes': total_cotizaciones_mes,
         'cotizaciones_aprobadas': cotizaciones_aprobadas,
         'valor_cotizaciones_mes': valor_cotizaciones_mes,
@@ -0,0 +1,234 @@
+"""
+Exportación de listados a CSV y XLSX como respuestas en streaming.
+
+Las filas llegan de un generador y se escriben a medida que se envían al
+cliente: ni el archivo ni el resultado de la consulta se arman completos en
+memoria. El XLSX se escribe directamente como ZIP con la hoja en XML fila
+por fila (en streaming, sin archivo temporal), con el mismo esquema que el
+modo write-only de openpyxl: celdas inline, sin tabla de textos compartidos.
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FORMATOS = ('csv', 'xlsx')
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Filas que se juntan antes de entregar un bloque al servidor
+FILAS_POR_BLOQUE = 500
+
+# Caracteres que Excel interpreta como inicio de fórmula en un CSV
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+# Caracteres de control que no se permiten en XML 1.0
+_CONTROL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve lo escrito en lugar de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'si' if valor else 'no'
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(encabezados, filas):
+    """Genera el CSV (UTF-8 con BOM, separado por ';') en bloques de texto."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow(encabezados)
+    bloque = []
+    for fila in filas:
+        bloque.append(escritor.writerow([_valor_csv(valor) for valor in fila]))
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name=%s sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilos: 0 normal, 1 fecha, 2 fecha y hora, 3 encabezado en negrita
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+_FIN_HOJA = '</sheetData></worksheet>'
+
+
+def _texto_xml(valor, estilo=''):
+    return f'<c t="inlineStr"{estilo}><is><t xml:space="preserve">{escape(_CONTROL_XML.sub("", valor))}</t></is></c>'
+
+
+def _celda_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.make_naive(valor)
+        dias = (valor - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c s="2"><v>{dias:.8f}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="1"><v>{(valor - _EPOCA_EXCEL.date()).days}</v></c>'
+    return _texto_xml(str(valor))
+
+
+class _Tubo:
+    """Destino de ZipFile sin seek: acumula lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def generar_xlsx(encabezados, filas, hoja='Datos'):
+    """Genera los bytes de un XLSX con una hoja; la primera fila queda fija."""
+    tubo = _Tubo()
+    with zipfile.ZipFile(tubo, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+        archivo.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archivo.writestr('_rels/.rels', _RELS)
+        archivo.writestr('xl/workbook.xml', _WORKBOOK % quoteattr(hoja[:31]))
+        archivo.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archivo.writestr('xl/styles.xml', _STYLES)
+
+        # El tamaño de la hoja no se conoce de antemano: ZIP64 evita el tope de 4 GB
+        with archivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write(_INICIO_HOJA.encode())
+            hoja_xml.write(('<row>%s</row>' % ''.join(
+                _texto_xml(str(encabezado), ' s="3"') for encabezado in encabezados
+            )).encode())
+            bloque = []
+            for fila in filas:
+                bloque.append('<row>%s</row>' % ''.join(_celda_xlsx(valor) for valor in fila))
+                if len(bloque) >= FILAS_POR_BLOQUE:
+                    hoja_xml.write(''.join(bloque).encode())
+                    bloque = []
+                    datos = tubo.retirar()
+                    if datos:
+                        yield datos
+            hoja_xml.write((''.join(bloque) + _FIN_HOJA).encode())
+    yield tubo.retirar()
+
+
+def respuesta_exportacion(formato, nombre, encabezados, filas, hoja='Datos'):
+    """
+    StreamingHttpResponse con el archivo `nombre_AAAAMMDD.<formato>`.
+
+    `filas` es un iterable de tuplas en el orden de `encabezados`; se
+    consume recién cuando el servidor envía la respuesta.
+    """
+    if formato not in FORMATOS:
+        formato = 'csv'
+    if formato == 'xlsx':
+        contenido = generar_xlsx(encabezados, filas, hoja)
+    else:
+        contenido = generar_csv(encabezados, filas)
+
+    respuesta = StreamingHttpResponse(contenido, content_type=TIPOS_CONTENIDO[formato])
+    archivo = f'{nombre}_{timezone.localdate():%Y%m%d}.{formato}'
+    respuesta['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    # Que ningún proxy acumule la respuesta antes de enviarla
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
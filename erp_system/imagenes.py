@@ -0,0 +1,167 @@
+"""
+Derivados de imágenes subidas (miniaturas JPEG y WebP).
+
+Después de guardar un Producto o un Técnico con imagen se encola su
+procesamiento en un hilo en segundo plano: se calcula el hash del contenido
+y, si faltan, se generan las miniaturas junto al original con nombres
+`<hash>_<ancho>.<formato>`. El hash queda en el modelo para que las
+plantillas armen las URLs sin abrir ni decodificar el original.
+
+Al reemplazar o quitar la imagen el hash se borra en el mismo guardado: las
+plantillas muestran el original hasta que existan los nuevos derivados (y
+para siempre si el procesamiento falla), nunca los de la imagen anterior.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Ancho máximo en píxeles de cada tamaño
+TAMANOS = {
+    'xs': 64,
+    'sm': 160,
+    'md': 400,
+    'lg': 1024,
+}
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+LARGO_HASH = 16
+
+# (modelo, campo de imagen, campo donde se guarda el hash)
+MODELOS_CON_IMAGEN = [
+    ('productos.Producto', 'imagen', 'imagen_hash'),
+    ('tecnicos.Tecnico', 'foto', 'foto_hash'),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _obtener_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagenes')
+    return _executor
+
+
+def ruta_derivado(nombre_original, hash_contenido, tamano, formato):
+    """Nombre en el storage del derivado de una imagen."""
+    carpeta = os.path.dirname(nombre_original)
+    return os.path.join(carpeta, f"{hash_contenido}_{TAMANOS[tamano]}.{formato}")
+
+
+def calcular_hash(nombre, storage=default_storage):
+    """Hash del contenido del archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with storage.open(nombre, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+            digest.update(bloque)
+    return digest.hexdigest()[:LARGO_HASH]
+
+
+def _derivados_faltantes(nombre, hash_contenido, storage):
+    return [
+        (tamano, formato)
+        for tamano in TAMANOS
+        for formato in FORMATOS
+        if not storage.exists(ruta_derivado(nombre, hash_contenido, tamano, formato))
+    ]
+
+
+def generar_derivados(nombre, storage=default_storage):
+    """
+    Genera los derivados que falten para la imagen `nombre` y devuelve su hash.
+
+    El original se decodifica una sola vez y cada tamaño se reduce a partir
+    del anterior, de mayor a menor.
+    """
+    from PIL import Image, ImageOps
+
+    hash_contenido = calcular_hash(nombre, storage)
+    faltantes = _derivados_faltantes(nombre, hash_contenido, storage)
+    if not faltantes:
+        return hash_contenido
+
+    with storage.open(nombre, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.load()
+
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB')
+
+    for tamano, ancho in sorted(TAMANOS.items(), key=lambda par: -par[1]):
+        if imagen.width > ancho:
+            imagen.thumbnail((ancho, ancho * 4), Image.LANCZOS)
+        for formato, (formato_pil, opciones) in FORMATOS.items():
+            if (tamano, formato) not in faltantes:
+                continue
+            salida = imagen
+            if formato_pil == 'JPEG' and salida.mode != 'RGB':
+                fondo = Image.new('RGB', salida.size, (255, 255, 255))
+                fondo.paste(salida, mask=salida.getchannel('A'))
+                salida = fondo
+            buffer = io.BytesIO()
+            salida.save(buffer, formato_pil, **opciones)
+            ruta = ruta_derivado(nombre, hash_contenido, tamano, formato)
+            if not storage.exists(ruta):
+                storage.save(ruta, ContentFile(buffer.getvalue()))
+
+    return hash_contenido
+
+
+def procesar_imagen(modelo, pk, campo, campo_hash):
+    """Genera los derivados de la imagen de un objeto y guarda su hash."""
+    close_old_connections()
+    try:
+        Modelo = apps.get_model(modelo)
+        fila = Modelo.objects.filter(pk=pk).values(campo, campo_hash).first()
+        if fila is None:
+            return
+        nombre = fila[campo]
+        hash_contenido = generar_derivados(nombre) if nombre else ''
+        if hash_contenido != fila[campo_hash]:
+            # update() no dispara post_save, así que no se vuelve a encolar
+            Modelo.objects.filter(pk=pk, **{campo: nombre}).update(**{campo_hash: hash_contenido})
+    except Exception:
+        logger.exception('No se pudieron generar los derivados de %s %s', modelo, pk)
+    finally:
+        close_old_connections()
+
+
+def invalidar_hash(instancia, campo, campo_hash):
+    """
+    Para pre_save: si la imagen se reemplazó o se quitó, borra el hash, que
+    correspondía a la anterior. Un archivo recién subido todavía no está
+    confirmado en el storage (FileField lo guarda después de pre_save).
+    """
+    archivo = getattr(instancia, campo)
+    if getattr(instancia, campo_hash) and (not archivo or not archivo._committed):
+        setattr(instancia, campo_hash, '')
+        instancia._hash_invalidado = True
+
+
+def encolar(instancia, campo, campo_hash):
+    """Programa procesar_imagen() para cuando confirme la transacción actual."""
+    modelo = instancia._meta.label
+    pk = instancia.pk
+    if instancia.__dict__.pop('_hash_invalidado', False):
+        # Con update_fields el hash vacío pudo no guardarse
+        type(instancia)._base_manager.filter(pk=pk).update(**{campo_hash: ''})
+    if not getattr(instancia, campo) and not getattr(instancia, campo_hash):
+        return
+    transaction.on_commit(
+        lambda: _obtener_executor().submit(procesar_imagen, modelo, pk, campo, campo_hash)
+    )
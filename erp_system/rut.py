@@ -0,0 +1,61 @@
+"""
+RUT chileno: normalización, dígito verificador y formato.
+
+La forma canónica es el cuerpo sin puntos ni ceros a la izquierda, un guion
+y el dígito verificador en mayúscula: '12.345.678-k' -> '12345678-K'. Es la
+que se guarda en las columnas *_normalizado para comparar y buscar.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+
+_RUT = re.compile(r'0*(\d{1,9})-?([\dK])')
+_SEPARADORES = re.compile(r'[\s.]')
+
+
+def digito_verificador(cuerpo):
+    """Dígito verificador (módulo 11) del cuerpo del RUT."""
+    suma = 0
+    factor = 2
+    for digito in reversed(str(cuerpo)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def normalizar_rut(valor):
+    """Forma canónica del RUT, o None si no tiene formato de RUT o el dígito no corresponde."""
+    coincidencia = _RUT.fullmatch(_SEPARADORES.sub('', valor or '').upper())
+    if coincidencia is None:
+        return None
+    cuerpo, digito = coincidencia.groups()
+    if digito_verificador(cuerpo) != digito:
+        return None
+    return f'{cuerpo}-{digito}'
+
+
+def formatear_rut(valor):
+    """RUT con puntos y guion ('12.345.678-9'); si no es válido se devuelve tal cual."""
+    canonico = normalizar_rut(valor)
+    if canonico is None:
+        return valor
+    cuerpo, digito = canonico.split('-')
+    return f'{int(cuerpo):,}'.replace(',', '.') + f'-{digito}'
+
+
+def prefijo_rut(texto):
+    """
+    Prefijo canónico para buscar RUTs que empiezan con `texto`, o None si el
+    texto no puede ser el comienzo de un RUT.
+    """
+    limpio = _SEPARADORES.sub('', texto or '').upper()
+    if not re.fullmatch(r'\d+(-[\dK]?)?', limpio):
+        return None
+    return limpio.lstrip('0') or None
+
+
+def validar_rut(valor):
+    """Validador de Django para campos de RUT."""
+    if normalizar_rut(valor) is None:
+        raise ValidationError('El RUT %(valor)s no es válido.', code='rut_invalido', params={'valor': valor})
@@ -126,6 +126,28 @@ else:
     }
 
 
+# Caché
+# Compartida por todos los procesos del servidor (gunicorn levanta varios
+# workers): lo que un proceso invalida deja de verse en los demás. Con
+# REDIS_URL se usa Redis (requiere el paquete redis); si no, una tabla de la
+# base de datos, que se crea con `python manage.py createcachetable`.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'erp_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -182,3 +204,9 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 
 # Logout configuration
 LOGOUT_URL = '/auth/logout/'
+
+# Folios de cotización: formato con {anio} y {numero}. Con un bloque mayor a 1
+# cada proceso reserva varios folios por consulta (menos contención, pero los
+# no usados quedan como huecos)
+COTIZACION_FOLIO_FORMATO = config('COTIZACION_FOLIO_FORMATO', default='{anio}{numero:04d}')
+COTIZACION_FOLIO_BLOQUE = config('COTIZACION_FOLIO_BLOQUE', default=1, cast=int)
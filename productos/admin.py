@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Categoria, Proveedor, Producto, MovimientoInventario
+from .models import Categoria, Proveedor, Producto, MovimientoInventario, HistorialPrecio
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -54,3 +54,10 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_filter = ['tipo', 'fecha', 'usuario']
     search_fields = ['producto__codigo', 'producto__nombre', 'motivo']
     readonly_fields = ['fecha']
+
+@admin.register(HistorialPrecio)
+class HistorialPrecioAdmin(admin.ModelAdmin):
+    list_display = ['producto', 'precio_compra_anterior', 'precio_compra_nuevo', 'precio_venta_anterior', 'precio_venta_nuevo', 'motivo', 'fecha', 'usuario']
+    list_filter = ['fecha', 'usuario']
+    search_fields = ['producto__codigo', 'producto__nombre', 'motivo']
+    readonly_fields = ['fecha']
@@ -0,0 +1,42 @@
+"""
+Conteos de productos con stock bajo.
+
+Se leen de la columna Producto.bajo_stock (índice producto_bajo_stock_idx)
+y el conteo por categoría queda en caché hasta que cambie el stock o el
+mínimo de algún producto.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Producto
+
+CLAVE_CONTEOS = 'productos:bajo_stock:conteos'
+DURACION_CONTEOS = 60 * 60
+
+
+def conteos_por_categoria():
+    """Dict categoria_id -> productos activos con stock bajo (None = sin categoría)."""
+    conteos = cache.get(CLAVE_CONTEOS)
+    if conteos is None:
+        filas = (
+            Producto.objects.filter(activo=True, bajo_stock=True)
+            .values_list('categoria_id')
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        conteos = dict(filas)
+        cache.set(CLAVE_CONTEOS, conteos, DURACION_CONTEOS)
+    return conteos
+
+
+def total_bajo_stock(categoria_id=None):
+    conteos = conteos_por_categoria()
+    if categoria_id is None:
+        return sum(conteos.values())
+    return conteos.get(int(categoria_id), 0)
+
+
+def invalidar_conteos():
+    """Descarta los conteos en caché cuando confirme la transacción actual."""
+    transaction.on_commit(lambda: cache.delete(CLAVE_CONTEOS))
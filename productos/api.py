@@ -0,0 +1,181 @@
+"""
+API JSON de solo lectura del catálogo (productos, categorías y proveedores).
+
+Cada respuesta lleva un ETag fuerte y Last-Modified calculados con una
+consulta liviana (ids y updated_at). Si el cliente ya tiene esa versión se
+responde 304 sin leer ni serializar las filas completas.
+"""
+import hashlib
+from calendar import timegm
+
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .autocompletar import sugerir_productos, SUGERENCIAS_LIMITE
+from .models import Producto, Categoria, Proveedor
+from .paginacion import paginar_keyset
+
+# Cambiar si cambia el formato de las respuestas, para invalidar los ETag
+VERSION_API = 1
+
+POR_PAGINA_API = 100
+POR_PAGINA_API_MAXIMO = 500
+
+CAMPOS_PRODUCTO = (
+    'id', 'codigo', 'nombre', 'descripcion', 'tipo', 'categoria', 'proveedor',
+    'codigo_proveedor', 'precio_compra', 'precio_venta', 'margen_ganancia',
+    'stock_actual', 'stock_minimo', 'stock_maximo', 'bajo_stock', 'imagen',
+    'activo', 'created_at', 'updated_at',
+)
+# Campo de la API -> columna en values()
+COLUMNAS_PRODUCTO = {'categoria': 'categoria_id', 'proveedor': 'proveedor_id'}
+
+CAMPOS_CATEGORIA = ('id', 'nombre', 'descripcion', 'activa', 'updated_at')
+CAMPOS_PROVEEDOR = (
+    'id', 'nombre', 'rut', 'telefono', 'email', 'direccion', 'contacto', 'activo', 'updated_at',
+)
+
+
+def _campos_pedidos(request, permitidos):
+    """Campos de ?fields=a,b,c que existen; todos si no se indica ninguno."""
+    pedidos = [campo.strip() for campo in request.GET.get('fields', '').split(',') if campo.strip()]
+    campos = [campo for campo in permitidos if campo in pedidos]
+    return campos or list(permitidos)
+
+
+def _entero(valor, defecto, maximo):
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _respuesta_condicional(request, partes_etag, ultima_modificacion, construir):
+    """
+    Responde 304 si el cliente tiene la versión actual; si no, llama a
+    construir() para armar el cuerpo. En ambos casos agrega ETag y
+    Last-Modified.
+    """
+    partes = [VERSION_API, request.get_full_path(), *partes_etag]
+    etag = '"%s"' % hashlib.sha1('|'.join(map(str, partes)).encode()).hexdigest()
+    last_modified = timegm(ultima_modificacion.utctimetuple()) if ultima_modificacion else None
+
+    respuesta = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if respuesta is None:
+        respuesta = JsonResponse(construir())
+    respuesta['ETag'] = etag
+    if last_modified is not None:
+        respuesta['Last-Modified'] = http_date(last_modified)
+    # El cliente puede guardar la respuesta pero debe revalidarla siempre
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def _serializar_producto(fila):
+    if 'imagen' in fila:
+        fila['imagen'] = default_storage.url(fila['imagen']) if fila['imagen'] else None
+    return fila
+
+
+@login_required
+@require_GET
+def producto_api_list(request):
+    """
+    Productos paginados por id.
+
+    Parámetros: fields, limite, despues/antes (cursores), categoria,
+    proveedor, activo (1/0) y bajo_stock (1).
+    """
+    campos = _campos_pedidos(request, CAMPOS_PRODUCTO)
+    por_pagina = _entero(request.GET.get('limite'), POR_PAGINA_API, POR_PAGINA_API_MAXIMO)
+
+    productos = Producto.objects.all()
+    if request.GET.get('categoria', '').isdigit():
+        productos = productos.filter(categoria_id=request.GET['categoria'])
+    if request.GET.get('proveedor', '').isdigit():
+        productos = productos.filter(proveedor_id=request.GET['proveedor'])
+    if request.GET.get('activo') in ('0', '1'):
+        productos = productos.filter(activo=request.GET['activo'] == '1')
+    if request.GET.get('bajo_stock') == '1':
+        productos = productos.filter(bajo_stock=True)
+
+    # Consulta liviana: solo id y updated_at de la página
+    pagina = paginar_keyset(
+        productos.only('id', 'updated_at'),
+        orden=('id',),
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        por_pagina=por_pagina,
+    )
+    versiones = [(producto.pk, producto.updated_at.timestamp()) for producto in pagina]
+    ultima_modificacion = max((producto.updated_at for producto in pagina), default=None)
+
+    def construir():
+        columnas = [COLUMNAS_PRODUCTO.get(campo, campo) for campo in campos]
+        filas = {
+            fila['id']: fila
+            for fila in Producto.objects.filter(pk__in=[pk for pk, _ in versiones])
+            .values(*dict.fromkeys(['id', *columnas]))
+        }
+        resultados = []
+        for pk, _ in versiones:
+            fila = filas.get(pk)
+            if fila is None:
+                continue
+            fila = {campo: fila[columna] for campo, columna in zip(campos, columnas)}
+            resultados.append(_serializar_producto(fila))
+        return {
+            'resultados': resultados,
+            'cursor_siguiente': pagina.cursor_siguiente,
+            'cursor_anterior': pagina.cursor_anterior,
+        }
+
+    return _respuesta_condicional(
+        request, [pagina.cursor_siguiente, pagina.cursor_anterior, *versiones],
+        ultima_modificacion, construir,
+    )
+
+
+@login_required
+@require_GET
+def producto_autocompletar(request):
+    """Sugerencias por prefijo de código o nombre (?q=, ?limite=), desde memoria."""
+    limite = _entero(request.GET.get('limite'), SUGERENCIAS_LIMITE, 50)
+    return JsonResponse({'resultados': sugerir_productos(request.GET.get('q', ''), limite)})
+
+
+def _catalogo_api(request, queryset, permitidos):
+    """Listado completo de una tabla chica, con ETag por cantidad y última modificación."""
+    campos = _campos_pedidos(request, permitidos)
+    resumen = queryset.aggregate(cantidad=Count('pk'), ultima=Max('updated_at'))
+
+    def construir():
+        return {'resultados': list(queryset.order_by('nombre', 'id').values(*campos))}
+
+    return _respuesta_condicional(
+        request, [resumen['cantidad'], resumen['ultima'] and resumen['ultima'].timestamp()],
+        resumen['ultima'], construir,
+    )
+
+
+@login_required
+@require_GET
+def categoria_api_list(request):
+    categorias = Categoria.objects.all()
+    if request.GET.get('activa') in ('0', '1'):
+        categorias = categorias.filter(activa=request.GET['activa'] == '1')
+    return _catalogo_api(request, categorias, CAMPOS_CATEGORIA)
+
+
+@login_required
+@require_GET
+def proveedor_api_list(request):
+    proveedores = Proveedor.objects.all()
+    if request.GET.get('activo') in ('0', '1'):
+        proveedores = proveedores.filter(activo=request.GET['activo'] == '1')
+    return _catalogo_api(request, proveedores, CAMPOS_PROVEEDOR)
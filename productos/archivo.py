@@ -0,0 +1,273 @@
+"""
+Archivo histórico de movimientos de inventario.
+
+archivar_movimientos() saca de la tabla los movimientos anteriores a una
+fecha de corte y los guarda en MEDIA_ROOT/var/movimientos/AAAA-MM/, en
+segmentos columnares:
+
+- columnas numéricas (id, producto_id, fecha, cantidad, stock_anterior,
+  stock_nuevo, usuario_id, tipo) como arreglos de enteros crudos, para
+  leerlas con mmap sin descomprimir ni cargar el archivo completo;
+- columnas de texto (motivo, observaciones, documento_referencia)
+  comprimidas con zlib;
+- meta.json con la cantidad de filas y los rangos de id y fecha.
+
+Solo se archivan movimientos ya consolidados en SaldoInventario, así que
+stock_en_fecha() sigue respondiendo con los saldos. escanear_movimientos()
+recorre los segmentos filtrando por producto y fechas.
+"""
+import json
+import mmap
+import os
+import shutil
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MovimientoInventario
+from .saldos import ultima_marca
+
+TAMANO_LOTE = 50000
+
+COLUMNAS_NUMERICAS = (
+    'id', 'producto_id', 'fecha', 'cantidad', 'stock_anterior', 'stock_nuevo', 'usuario_id', 'tipo',
+)
+COLUMNAS_TEXTO = ('motivo', 'observaciones', 'documento_referencia')
+
+TIPOS = [tipo for tipo, _ in MovimientoInventario.TIPO_MOVIMIENTO_CHOICES]
+SIN_USUARIO = -1
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def directorio_archivo():
+    return os.path.join(settings.MEDIA_ROOT, 'var', 'movimientos')
+
+
+def _a_microsegundos(fecha):
+    return (fecha - _EPOCA) // timedelta(microseconds=1)
+
+
+def _desde_microsegundos(valor):
+    return _EPOCA + timedelta(microseconds=valor)
+
+
+def _escribir_json(ruta, datos):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w') as archivo:
+        json.dump(datos, archivo)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def _escribir_segmento(mes, filas):
+    """Escribe un segmento completo en un directorio temporal y lo publica con rename."""
+    carpeta_mes = os.path.join(directorio_archivo(), mes)
+    os.makedirs(carpeta_mes, exist_ok=True)
+    nombre = f"{filas[0]['id']:012d}-{filas[-1]['id']:012d}"
+    final = os.path.join(carpeta_mes, nombre)
+    temporal = os.path.join(carpeta_mes, f'.{nombre}.tmp')
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    for columna in COLUMNAS_NUMERICAS:
+        with open(os.path.join(temporal, f'{columna}.q'), 'wb') as archivo:
+            array('q', (fila[columna] for fila in filas)).tofile(archivo)
+    for columna in COLUMNAS_TEXTO:
+        datos = json.dumps([fila[columna] for fila in filas], ensure_ascii=False).encode()
+        with open(os.path.join(temporal, f'{columna}.json.z'), 'wb') as archivo:
+            archivo.write(zlib.compress(datos, 6))
+
+    fechas = [fila['fecha'] for fila in filas]
+    _escribir_json(os.path.join(temporal, 'meta.json'), {
+        'filas': len(filas),
+        'orden_bytes': sys.byteorder,
+        'id_min': filas[0]['id'],
+        'id_max': filas[-1]['id'],
+        'fecha_min': min(fechas),
+        'fecha_max': max(fechas),
+        # Se marca True cuando las filas ya se borraron de la tabla
+        'confirmado': False,
+    })
+    os.rename(temporal, final)
+    return final
+
+
+def _leer_meta(segmento):
+    with open(os.path.join(segmento, 'meta.json')) as archivo:
+        return json.load(archivo)
+
+
+def _segmentos(desde=None, hasta=None):
+    """Segmentos publicados, en orden, que pueden tener filas entre `desde` y `hasta`."""
+    raiz = directorio_archivo()
+    if not os.path.isdir(raiz):
+        return
+    mes_desde = timezone.localtime(desde).strftime('%Y-%m') if desde else None
+    mes_hasta = timezone.localtime(hasta).strftime('%Y-%m') if hasta else None
+    for mes in sorted(os.listdir(raiz)):
+        if (mes_desde and mes < mes_desde) or (mes_hasta and mes > mes_hasta):
+            continue
+        carpeta_mes = os.path.join(raiz, mes)
+        for nombre in sorted(os.listdir(carpeta_mes)):
+            if nombre.startswith('.'):
+                continue
+            yield os.path.join(carpeta_mes, nombre)
+
+
+def _confirmar(segmento, meta, ids):
+    """Borra de la tabla las filas del segmento y lo marca como confirmado."""
+    with transaction.atomic():
+        for inicio in range(0, len(ids), 1000):
+            MovimientoInventario.objects.filter(pk__in=ids[inicio:inicio + 1000]).delete()
+    meta['confirmado'] = True
+    _escribir_json(os.path.join(segmento, 'meta.json'), meta)
+
+
+def _completar_pendientes():
+    """Termina segmentos escritos por una corrida que se interrumpió antes de borrar."""
+    for segmento in _segmentos():
+        meta = _leer_meta(segmento)
+        if not meta['confirmado']:
+            with _Columnas(segmento, meta) as columnas:
+                ids = list(columnas['id'])
+            _confirmar(segmento, meta, ids)
+
+
+def archivar_movimientos(antes_de, tamano_lote=TAMANO_LOTE):
+    """
+    Archiva los movimientos con fecha anterior a `antes_de` (datetime) que ya
+    estén consolidados en saldos. Devuelve cuántos movimientos archivó.
+    """
+    _completar_pendientes()
+    marca = ultima_marca()
+    archivados = 0
+    ultimo_id = 0
+
+    while True:
+        lote = list(
+            MovimientoInventario.objects.filter(pk__gt=ultimo_id, pk__lte=marca, fecha__lt=antes_de)
+            .order_by('pk')
+            .values(
+                'id', 'producto_id', 'tipo', 'cantidad', 'stock_anterior', 'stock_nuevo',
+                'motivo', 'observaciones', 'documento_referencia', 'usuario_id', 'fecha',
+            )[:tamano_lote]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1]['id']
+
+        por_mes = {}
+        for fila in lote:
+            mes = timezone.localtime(fila['fecha']).strftime('%Y-%m')
+            fila['fecha'] = _a_microsegundos(fila['fecha'])
+            fila['tipo'] = TIPOS.index(fila['tipo']) if fila['tipo'] in TIPOS else -1
+            if fila['usuario_id'] is None:
+                fila['usuario_id'] = SIN_USUARIO
+            por_mes.setdefault(mes, []).append(fila)
+
+        for mes, filas in por_mes.items():
+            segmento = _escribir_segmento(mes, filas)
+            _confirmar(segmento, _leer_meta(segmento), [fila['id'] for fila in filas])
+            archivados += len(filas)
+
+    return archivados
+
+
+class _Columnas:
+    """Columnas numéricas de un segmento mapeadas en memoria (solo lectura)."""
+
+    def __init__(self, segmento, meta):
+        self.segmento = segmento
+        self.meta = meta
+        self._abiertos = []
+        self._vistas = {}
+
+    def __enter__(self):
+        return self
+
+    def __getitem__(self, columna):
+        if columna not in self._vistas:
+            ruta = os.path.join(self.segmento, f'{columna}.q')
+            if self.meta['orden_bytes'] != sys.byteorder:
+                # Segmento escrito en otra arquitectura: se lee y se invierte
+                valores = array('q')
+                with open(ruta, 'rb') as archivo:
+                    valores.frombytes(archivo.read())
+                valores.byteswap()
+                self._vistas[columna] = valores
+            elif self.meta['filas'] == 0:
+                self._vistas[columna] = array('q')
+            else:
+                with open(ruta, 'rb') as archivo:
+                    mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+                vista = memoryview(mapa).cast('q')
+                self._abiertos.append((mapa, vista))
+                self._vistas[columna] = vista
+        return self._vistas[columna]
+
+    def texto(self, columna):
+        with open(os.path.join(self.segmento, f'{columna}.json.z'), 'rb') as archivo:
+            return json.loads(zlib.decompress(archivo.read()))
+
+    def __exit__(self, *exc):
+        self._vistas.clear()
+        for mapa, vista in self._abiertos:
+            vista.release()
+            mapa.close()
+        self._abiertos.clear()
+
+
+def escanear_movimientos(producto_id=None, desde=None, hasta=None, con_texto=True):
+    """
+    Genera dicts con los movimientos archivados, en orden de id.
+
+    `desde` y `hasta` son datetimes (inclusive/exclusivo). Con
+    con_texto=False no se descomprimen motivo, observaciones ni
+    documento_referencia.
+    """
+    minimo = _a_microsegundos(desde) if desde else None
+    maximo = _a_microsegundos(hasta) if hasta else None
+
+    for segmento in _segmentos(desde, hasta):
+        meta = _leer_meta(segmento)
+        if (minimo is not None and meta['fecha_max'] < minimo) or (maximo is not None and meta['fecha_min'] >= maximo):
+            continue
+
+        with _Columnas(segmento, meta) as columnas:
+            fechas = columnas['fecha']
+            posiciones = range(meta['filas'])
+            if producto_id is not None:
+                productos = columnas['producto_id']
+                posiciones = [i for i in posiciones if productos[i] == producto_id]
+            if minimo is not None or maximo is not None:
+                posiciones = [
+                    i for i in posiciones
+                    if (minimo is None or fechas[i] >= minimo) and (maximo is None or fechas[i] < maximo)
+                ]
+            if not posiciones:
+                continue
+
+            textos = {columna: columnas.texto(columna) for columna in COLUMNAS_TEXTO} if con_texto else {}
+            for i in posiciones:
+                usuario_id = columnas['usuario_id'][i]
+                tipo = columnas['tipo'][i]
+                fila = {
+                    'id': columnas['id'][i],
+                    'producto_id': columnas['producto_id'][i],
+                    'tipo': TIPOS[tipo] if 0 <= tipo < len(TIPOS) else None,
+                    'cantidad': columnas['cantidad'][i],
+                    'stock_anterior': columnas['stock_anterior'][i],
+                    'stock_nuevo': columnas['stock_nuevo'][i],
+                    'usuario_id': None if usuario_id == SIN_USUARIO else usuario_id,
+                    'fecha': _desde_microsegundos(fechas[i]),
+                }
+                for columna, valores in textos.items():
+                    fila[columna] = valores[i]
+                yield fila
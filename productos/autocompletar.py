@@ -0,0 +1,140 @@
+"""
+Autocompletado de productos por prefijo de código o nombre.
+
+Cada proceso mantiene en memoria listas ordenadas de (clave, id) y busca
+con bisect, sin consultar la base de datos en cada tecla. El índice se
+carga la primera vez que se usa y se actualiza con las señales de Producto;
+los cambios de otros procesos se aplican cada pocos segundos, fuera de las
+consultas (productos.indices).
+"""
+from bisect import bisect_left, insort
+
+from .busqueda import normalizar, tokenizar
+from .indices import IndiceCompartido
+from .models import Producto
+
+SUGERENCIAS_LIMITE = 10
+
+CLAVE_VERSION = 'productos:autocompletar:version'
+
+# Campos de Producto que usa el índice
+CAMPOS_INDICE = {'codigo', 'nombre', 'precio_venta', 'activo'}
+
+
+class IndicePrefijos:
+    """Listas ordenadas de códigos y palabras del nombre de productos activos."""
+
+    def __init__(self):
+        self.codigos = []
+        self.nombres = []
+        self.productos = {}
+
+    @staticmethod
+    def _claves_nombre(nombre):
+        # El nombre completo y cada palabra, para encontrar "utp" en "Cable UTP"
+        completo = normalizar(nombre).strip()
+        return {completo, *tokenizar(nombre)} - {''}
+
+    def cargar(self, filas):
+        """Carga masiva: arma las listas y las ordena una sola vez."""
+        for pk, codigo, nombre, precio_venta in filas:
+            self.productos[pk] = (codigo, nombre, precio_venta)
+            self.codigos.append((normalizar(codigo), pk))
+            self.nombres.extend((clave, pk) for clave in self._claves_nombre(nombre))
+        self.codigos.sort()
+        self.nombres.sort()
+
+    def agregar(self, pk, codigo, nombre, precio_venta):
+        self.quitar(pk)
+        self.productos[pk] = (codigo, nombre, precio_venta)
+        insort(self.codigos, (normalizar(codigo), pk))
+        for clave in self._claves_nombre(nombre):
+            insort(self.nombres, (clave, pk))
+
+    @staticmethod
+    def _eliminar(lista, elemento):
+        posicion = bisect_left(lista, elemento)
+        if posicion < len(lista) and lista[posicion] == elemento:
+            del lista[posicion]
+
+    def quitar(self, pk):
+        producto = self.productos.pop(pk, None)
+        if producto is None:
+            return
+        codigo, nombre, _ = producto
+        self._eliminar(self.codigos, (normalizar(codigo), pk))
+        for clave in self._claves_nombre(nombre):
+            self._eliminar(self.nombres, (clave, pk))
+
+    @staticmethod
+    def _con_prefijo(lista, prefijo):
+        inicio = bisect_left(lista, (prefijo,))
+        for posicion in range(inicio, len(lista)):
+            clave, pk = lista[posicion]
+            if not clave.startswith(prefijo):
+                break
+            yield pk
+
+    def sugerir(self, prefijo, limite=SUGERENCIAS_LIMITE):
+        """Ids que empiezan con `prefijo`: primero por código, luego por nombre."""
+        prefijo = normalizar(prefijo).strip()
+        if not prefijo:
+            return []
+        encontrados = {}
+        for lista in (self.codigos, self.nombres):
+            for pk in self._con_prefijo(lista, prefijo):
+                encontrados.setdefault(pk, None)
+                if len(encontrados) >= limite:
+                    return list(encontrados)
+        return list(encontrados)
+
+
+def _construir_indice():
+    indice = IndicePrefijos()
+    filas = Producto.objects.filter(activo=True).values_list('pk', 'codigo', 'nombre', 'precio_venta')
+    indice.cargar(filas.iterator(chunk_size=5000))
+    return indice
+
+
+def _actualizar_indice(indice, ids):
+    """Vuelve a leer los productos `ids`: los activos se agregan y el resto se quita."""
+    activos = set()
+    filas = Producto.objects.filter(pk__in=ids, activo=True).values_list(
+        'pk', 'codigo', 'nombre', 'precio_venta'
+    )
+    for fila in filas:
+        indice.agregar(*fila)
+        activos.add(fila[0])
+    for pk in ids - activos:
+        indice.quitar(pk)
+
+
+_indice = IndiceCompartido(CLAVE_VERSION, _construir_indice, _actualizar_indice)
+
+
+def invalidar_indice():
+    """Descarta el índice; se recarga en la próxima consulta."""
+    _indice.invalidar()
+
+
+def actualizar_producto(producto):
+    """Aplica el alta, modificación o desactivación de un producto."""
+    _indice.registrar([producto.pk])
+
+
+def quitar_producto(pk):
+    _indice.registrar([pk])
+
+
+def sugerir_productos(consulta, limite=SUGERENCIAS_LIMITE):
+    """Lista de dicts {'id', 'codigo', 'nombre', 'precio_venta'}."""
+    indice = _indice.obtener()
+    resultados = []
+    for pk in indice.sugerir(consulta, limite):
+        producto = indice.productos.get(pk)
+        if producto is None:
+            # Se quitó mientras se buscaba
+            continue
+        codigo, nombre, precio_venta = producto
+        resultados.append({'id': pk, 'codigo': codigo, 'nombre': nombre, 'precio_venta': precio_venta})
+    return resultados
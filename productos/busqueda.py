@@ -0,0 +1,236 @@
+"""
+Búsqueda de productos por texto.
+
+Usa el índice de texto completo del motor cuando existe (FULLTEXT en MySQL,
+tsvector en PostgreSQL) y, en otros motores, un índice invertido en memoria
+que se mantiene al día con las señales de Producto. En todos los casos el
+código admite coincidencia por prefijo y se ordena primero.
+"""
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .indices import IndiceCompartido
+from .models import Producto
+
+BUSQUEDA_LIMITE = 1000
+
+# Largo mínimo para expandir un término como prefijo
+PREFIJO_MINIMO = 2
+
+PESO_CODIGO = 3
+PESO_NOMBRE = 2
+PESO_DESCRIPCION = 1
+BONO_CODIGO_EXACTO = 100
+BONO_CODIGO_PREFIJO = 50
+
+CLAVE_VERSION = 'productos:busqueda:version'
+
+# Campos de Producto que usa el índice en memoria
+CAMPOS_INDICE = {'codigo', 'nombre', 'descripcion'}
+
+_TEXTO_COMPLETO_MYSQL = (
+    "MATCH(productos_producto.nombre, productos_producto.codigo, productos_producto.descripcion) "
+    "AGAINST (%s IN BOOLEAN MODE)"
+)
+_TSVECTOR_POSTGRES = (
+    "to_tsvector('spanish', coalesce(productos_producto.nombre, '') || ' ' || "
+    "coalesce(productos_producto.codigo, '') || ' ' || coalesce(productos_producto.descripcion, ''))"
+)
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para comparar 'Cámara' con 'camara'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+class IndiceInvertido:
+    """Índice término -> productos, con términos ordenados para prefijos."""
+
+    def __init__(self):
+        self.postings = {}
+        self.documentos = {}
+        self.codigos = []
+        self._terminos = None
+
+    def agregar(self, pk, codigo, nombre, descripcion):
+        self.quitar(pk)
+        pesos = {}
+        for peso, texto in ((PESO_DESCRIPCION, descripcion), (PESO_NOMBRE, nombre), (PESO_CODIGO, codigo)):
+            for termino in tokenizar(texto):
+                pesos[termino] = max(pesos.get(termino, 0), peso)
+        for termino, peso in pesos.items():
+            if termino not in self.postings:
+                self.postings[termino] = {}
+                self._terminos = None
+            self.postings[termino][pk] = peso
+
+        codigo_normalizado = normalizar(codigo)
+        self.documentos[pk] = (codigo_normalizado, list(pesos))
+        insort(self.codigos, (codigo_normalizado, pk))
+
+    def quitar(self, pk):
+        documento = self.documentos.pop(pk, None)
+        if documento is None:
+            return
+        codigo_normalizado, terminos = documento
+        for termino in terminos:
+            posting = self.postings.get(termino)
+            if posting is not None:
+                posting.pop(pk, None)
+                if not posting:
+                    del self.postings[termino]
+                    self._terminos = None
+        posicion = bisect_left(self.codigos, (codigo_normalizado, pk))
+        if posicion < len(self.codigos) and self.codigos[posicion] == (codigo_normalizado, pk):
+            del self.codigos[posicion]
+
+    def _expandir(self, termino):
+        """Términos del índice que empiezan con `termino`."""
+        if len(termino) < PREFIJO_MINIMO:
+            return [termino] if termino in self.postings else []
+        if self._terminos is None:
+            self._terminos = sorted(self.postings)
+        inicio = bisect_left(self._terminos, termino)
+        encontrados = []
+        for candidato in self._terminos[inicio:]:
+            if not candidato.startswith(termino):
+                break
+            encontrados.append(candidato)
+        return encontrados
+
+    def buscar(self, consulta, limite=BUSQUEDA_LIMITE):
+        puntajes = None
+        for termino in tokenizar(consulta):
+            parcial = {}
+            for expansion in self._expandir(termino):
+                for pk, peso in self.postings[expansion].items():
+                    if peso > parcial.get(pk, 0):
+                        parcial[pk] = peso
+            if puntajes is None:
+                puntajes = parcial
+            else:
+                puntajes = {pk: puntajes[pk] + peso for pk, peso in parcial.items() if pk in puntajes}
+        puntajes = puntajes or {}
+
+        prefijo = normalizar(consulta).strip()
+        if prefijo:
+            inicio = bisect_left(self.codigos, (prefijo,))
+            for codigo, pk in self.codigos[inicio:]:
+                if not codigo.startswith(prefijo):
+                    break
+                bono = BONO_CODIGO_EXACTO if codigo == prefijo else BONO_CODIGO_PREFIJO
+                puntajes[pk] = puntajes.get(pk, 0) + bono
+
+        ordenados = sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))
+        return [pk for pk, _ in ordenados[:limite]]
+
+
+def _construir_indice():
+    indice = IndiceInvertido()
+    filas = Producto.objects.values_list('pk', 'codigo', 'nombre', 'descripcion')
+    for fila in filas.iterator(chunk_size=2000):
+        indice.agregar(*fila)
+    return indice
+
+
+def _actualizar_indice(indice, ids):
+    """Vuelve a leer los productos `ids`; los que ya no existen se quitan."""
+    existentes = set()
+    for fila in Producto.objects.filter(pk__in=ids).values_list('pk', 'codigo', 'nombre', 'descripcion'):
+        indice.agregar(*fila)
+        existentes.add(fila[0])
+    for pk in ids - existentes:
+        indice.quitar(pk)
+
+
+_indice = IndiceCompartido(CLAVE_VERSION, _construir_indice, _actualizar_indice)
+
+
+def invalidar_indice():
+    """Descarta el índice en memoria; se reconstruye en la próxima búsqueda."""
+    _indice.invalidar()
+
+
+def actualizar_producto(producto):
+    """Aplica el alta o modificación de un producto al índice en memoria."""
+    if connection.vendor in ('mysql', 'postgresql'):
+        return
+    _indice.registrar([producto.pk])
+
+
+def quitar_producto(pk):
+    """Aplica la eliminación de un producto al índice en memoria."""
+    if connection.vendor in ('mysql', 'postgresql'):
+        return
+    _indice.registrar([pk])
+
+
+def _consulta_booleana_mysql(consulta):
+    terminos = re.findall(r'\w+', consulta)
+    return ' '.join(f'+{termino}*' for termino in terminos)
+
+
+def _consulta_tsquery(consulta):
+    terminos = tokenizar(consulta)
+    return ' & '.join(f'{termino}:*' for termino in terminos)
+
+
+def _ids_por_codigo(consulta, limite):
+    """Productos cuyo código empieza con la consulta (usa el índice único)."""
+    return list(
+        Producto.objects.filter(codigo__istartswith=consulta.strip())
+        .order_by('codigo')
+        .values_list('pk', flat=True)[:limite]
+    )
+
+
+def buscar_productos(consulta, limite=BUSQUEDA_LIMITE):
+    """
+    Devuelve los ids de los productos que coinciden con `consulta`,
+    ordenados por relevancia y acotados a `limite`.
+    """
+    consulta = (consulta or '').strip()
+    if not consulta:
+        return []
+
+    if connection.vendor == 'mysql':
+        booleana = _consulta_booleana_mysql(consulta)
+        texto = []
+        if booleana:
+            texto = list(
+                Producto.objects.annotate(relevancia=RawSQL(_TEXTO_COMPLETO_MYSQL, [booleana]))
+                .filter(relevancia__gt=0)
+                .order_by('-relevancia', 'pk')
+                .values_list('pk', flat=True)[:limite]
+            )
+    elif connection.vendor == 'postgresql':
+        tsquery = _consulta_tsquery(consulta)
+        texto = []
+        if tsquery:
+            texto = list(
+                Producto.objects.filter(RawSQL(
+                    f"{_TSVECTOR_POSTGRES} @@ to_tsquery('spanish', %s)", [tsquery],
+                    output_field=BooleanField()))
+                .annotate(relevancia=RawSQL(
+                    f"ts_rank({_TSVECTOR_POSTGRES}, to_tsquery('spanish', %s))", [tsquery]))
+                .order_by('-relevancia', 'pk')
+                .values_list('pk', flat=True)[:limite]
+            )
+    else:
+        return _indice.obtener().buscar(consulta, limite)
+
+    # Coincidencias por código primero, luego el resto por relevancia
+    ids = _ids_por_codigo(consulta, limite)
+    vistos = set(ids)
+    ids.extend(pk for pk in texto if pk not in vistos)
+    return ids[:limite]
@@ -0,0 +1,239 @@
+"""
+Conciliación de la cadena de movimientos de inventario.
+
+Cada movimiento guarda stock_anterior y stock_nuevo: en una cadena sana el
+stock_anterior de un movimiento es el stock_nuevo del anterior del mismo
+producto (por id) y el último stock_nuevo es Producto.stock_actual.
+conciliar() recorre los productos por rangos de id en un pool de procesos y
+reporta:
+
+- saltos: el stock_anterior no coincide con el stock_nuevo previo (o con el
+  punto de partida: 0, o el último saldo de movimientos ya archivados);
+- descuadres: el final de la cadena no coincide con stock_actual.
+
+corregir_descuadres() agrega un movimiento de ajuste por producto
+descuadrado que lleva la cadena al stock actual, sin cambiar el stock.
+"""
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from .models import Producto, MovimientoInventario, SaldoInventario
+from .paginacion import iterar_keyset
+
+PRODUCTOS_POR_RANGO = 2000
+TAMANO_LOTE = 5000
+MOTIVO_AJUSTE = 'Conciliación de inventario'
+
+SALTO = 'salto'
+DESCUADRE = 'descuadre'
+
+
+class Incidencia(namedtuple('Incidencia', 'tipo producto_id codigo movimiento_id esperado encontrado')):
+    """Diferencia en la cadena; movimiento_id es None en los descuadres."""
+
+    __slots__ = ()
+
+    @property
+    def diferencia(self):
+        return self.encontrado - self.esperado
+
+
+class ResultadoConciliacion:
+    def __init__(self):
+        self.productos = 0
+        self.movimientos = 0
+        self.incidencias = []
+
+    def agregar(self, productos, movimientos, incidencias):
+        self.productos += productos
+        self.movimientos += movimientos
+        self.incidencias.extend(incidencias)
+
+    def de_tipo(self, tipo):
+        return [incidencia for incidencia in self.incidencias if incidencia.tipo == tipo]
+
+    @property
+    def saltos(self):
+        return self.de_tipo(SALTO)
+
+    @property
+    def descuadres(self):
+        return self.de_tipo(DESCUADRE)
+
+
+def _stock_archivado(producto_ids, primer_movimiento_id):
+    """
+    Stock tras el último movimiento archivado de cada producto: el saldo con
+    el mayor ultimo_movimiento_id que ya no está en la tabla.
+    """
+    if not producto_ids:
+        return {}
+    saldos = SaldoInventario.objects.filter(producto_id__in=producto_ids)
+    if primer_movimiento_id is not None:
+        saldos = saldos.filter(ultimo_movimiento_id__lt=primer_movimiento_id)
+    ultimos = (
+        saldos.order_by().values('producto_id')
+        .annotate(ultimo=Max('ultimo_movimiento_id'))
+        .values_list('ultimo', flat=True)
+    )
+    return dict(
+        SaldoInventario.objects.filter(producto_id__in=producto_ids, ultimo_movimiento_id__in=ultimos)
+        .values_list('producto_id', 'stock')
+    )
+
+
+def conciliar_rango(desde, hasta, primer_movimiento_id, tamano_lote=TAMANO_LOTE):
+    """
+    Revisa los productos con id entre `desde` y `hasta` (inclusive).
+
+    Devuelve (productos, movimientos, incidencias). `primer_movimiento_id`
+    es el menor id de la tabla de movimientos: los saldos anteriores a él
+    son de movimientos archivados.
+    """
+    productos = dict(
+        Producto.objects.filter(pk__gte=desde, pk__lte=hasta)
+        .values_list('pk', 'stock_actual')
+    )
+    incidencias = []
+    # producto -> (id del primer movimiento, stock_anterior) o None si no tiene
+    inicios = {pk: None for pk in productos}
+    finales = {}
+    cantidad = 0
+
+    filas = iterar_keyset(
+        MovimientoInventario.objects.filter(producto_id__gte=desde, producto_id__lte=hasta),
+        ('producto_id', 'id'),
+        ['producto_id', 'id', 'stock_anterior', 'stock_nuevo'],
+        tamano_lote,
+    )
+    actual = None
+    previo = None
+    for producto_id, movimiento_id, stock_anterior, stock_nuevo in filas:
+        cantidad += 1
+        if producto_id != actual:
+            actual = producto_id
+            inicios[producto_id] = (movimiento_id, stock_anterior)
+        elif stock_anterior != previo:
+            incidencias.append(Incidencia(SALTO, producto_id, None, movimiento_id, previo, stock_anterior))
+        previo = stock_nuevo
+        finales[producto_id] = stock_nuevo
+
+    # El punto de partida es 0 salvo que haya movimientos archivados antes
+    sin_cero = [
+        pk for pk, inicio in inicios.items()
+        if (inicio is not None and inicio[1] != 0) or (inicio is None and productos.get(pk))
+    ]
+    archivados = _stock_archivado(sin_cero, primer_movimiento_id)
+    for pk in sin_cero:
+        partida = archivados.get(pk, 0)
+        if inicios[pk] is None:
+            finales[pk] = partida
+        elif inicios[pk][1] != partida:
+            incidencias.append(Incidencia(SALTO, pk, None, inicios[pk][0], partida, inicios[pk][1]))
+
+    for pk, stock_actual in productos.items():
+        final = finales.get(pk, 0)
+        if final != stock_actual:
+            incidencias.append(Incidencia(DESCUADRE, pk, None, None, final, stock_actual))
+
+    if incidencias:
+        codigos = dict(
+            Producto.objects.filter(pk__in={incidencia.producto_id for incidencia in incidencias})
+            .values_list('pk', 'codigo')
+        )
+        incidencias = [
+            incidencia._replace(codigo=codigos.get(incidencia.producto_id)) for incidencia in incidencias
+        ]
+        incidencias.sort(key=lambda incidencia: (incidencia.producto_id, incidencia.movimiento_id or 0))
+    return len(productos), cantidad, incidencias
+
+
+def _rangos(productos_por_rango):
+    """Rangos (desde, hasta) de ids de producto con a lo sumo N productos cada uno."""
+    ids = list(Producto.objects.order_by('pk').values_list('pk', flat=True))
+    return [
+        (ids[inicio], ids[min(inicio + productos_por_rango, len(ids)) - 1])
+        for inicio in range(0, len(ids), productos_por_rango)
+    ]
+
+
+def conciliar(procesos=None, productos_por_rango=PRODUCTOS_POR_RANGO, tamano_lote=TAMANO_LOTE):
+    """Concilia todos los productos; devuelve un ResultadoConciliacion."""
+    resultado = ResultadoConciliacion()
+    rangos = _rangos(productos_por_rango)
+    primer_movimiento_id = MovimientoInventario.objects.order_by('pk').values_list('pk', flat=True).first()
+    procesos = min(procesos or os.cpu_count() or 1, len(rangos))
+
+    # Los procesos hijos se crean con fork: sin fork (Windows, macOS) se trabaja en este proceso
+    if procesos <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for desde, hasta in rangos:
+            resultado.agregar(*conciliar_rango(desde, hasta, primer_movimiento_id, tamano_lote))
+        return resultado
+
+    # Cada hijo debe abrir su propia conexión, no heredar el socket del padre
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('fork')) as pool:
+        futuros = [
+            pool.submit(conciliar_rango, desde, hasta, primer_movimiento_id, tamano_lote)
+            for desde, hasta in rangos
+        ]
+        # En el orden de los rangos: las incidencias quedan ordenadas por producto
+        for futuro in futuros:
+            resultado.agregar(*futuro.result())
+    return resultado
+
+
+def corregir_descuadres(producto_ids, usuario=None, tamano_lote=1000):
+    """
+    Registra un ajuste por producto cuya cadena no termina en stock_actual.
+
+    Se vuelve a comparar con las filas bloqueadas, así que un movimiento
+    registrado después de la revisión no genera un ajuste de más. Devuelve
+    cuántos ajustes creó.
+    """
+    producto_ids = sorted(set(producto_ids))
+    ultimo_stock = Subquery(
+        MovimientoInventario.objects.filter(producto=OuterRef('pk'))
+        .order_by('-pk').values('stock_nuevo')[:1]
+    )
+    creados = 0
+    for inicio in range(0, len(producto_ids), tamano_lote):
+        lote = producto_ids[inicio:inicio + tamano_lote]
+        with transaction.atomic():
+            list(
+                Producto.objects.select_for_update().filter(pk__in=lote)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            filas = (
+                Producto.objects.filter(pk__in=lote)
+                .annotate(final_cadena=ultimo_stock)
+                .values_list('pk', 'stock_actual', 'final_cadena')
+            )
+            sin_movimientos = [pk for pk, _, final in filas if final is None]
+            archivados = _stock_archivado(
+                sin_movimientos,
+                MovimientoInventario.objects.order_by('pk').values_list('pk', flat=True).first(),
+            )
+            ajustes = []
+            for pk, stock_actual, final in filas:
+                if final is None:
+                    final = archivados.get(pk, 0)
+                if final != stock_actual:
+                    # En un ajuste la cantidad es el stock final (ver calcular_stock_nuevo)
+                    ajustes.append(MovimientoInventario(
+                        producto_id=pk,
+                        tipo='ajuste',
+                        cantidad=stock_actual,
+                        stock_anterior=final,
+                        stock_nuevo=stock_actual,
+                        motivo=MOTIVO_AJUSTE,
+                        usuario=usuario,
+                    ))
+            MovimientoInventario.objects.bulk_create(ajustes)
+            creados += len(ajustes)
+    return creados
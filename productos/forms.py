@@ -1,5 +1,21 @@
 from django import forms
 from .models import Producto, Categoria, Proveedor, MovimientoInventario
+from .precios import CAMPOS_PRECIO, OPERACIONES
+
+def validar_reglas_producto(datos):
+    """Reglas de negocio de un producto; también las usa la importación masiva."""
+    precio_compra = datos.get('precio_compra')
+    precio_venta = datos.get('precio_venta')
+    stock_minimo = datos.get('stock_minimo')
+    stock_maximo = datos.get('stock_maximo')
+    
+    if precio_compra and precio_venta:
+        if precio_venta <= precio_compra:
+            raise forms.ValidationError('El precio de venta debe ser mayor al precio de compra.')
+    
+    if stock_minimo and stock_maximo:
+        if stock_minimo > stock_maximo:
+            raise forms.ValidationError('El stock mínimo no puede ser mayor al stock máximo.')
 
 class ProductoForm(forms.ModelForm):
     class Meta:
@@ -49,6 +65,9 @@ class ProductoForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            # Al editar, el stock solo cambia con movimientos de inventario
+            del self.fields['stock_actual']
         self.fields['categoria'].queryset = Categoria.objects.filter(activa=True)
         self.fields['proveedor'].queryset = Proveedor.objects.filter(activo=True)
         self.fields['categoria'].empty_label = "Seleccionar categoría"
@@ -56,19 +75,7 @@ class ProductoForm(forms.ModelForm):
     
     def clean(self):
         cleaned_data = super().clean()
-        precio_compra = cleaned_data.get('precio_compra')
-        precio_venta = cleaned_data.get('precio_venta')
-        stock_minimo = cleaned_data.get('stock_minimo')
-        stock_maximo = cleaned_data.get('stock_maximo')
-        
-        if precio_compra and precio_venta:
-            if precio_venta <= precio_compra:
-                raise forms.ValidationError('El precio de venta debe ser mayor al precio de compra.')
-        
-        if stock_minimo and stock_maximo:
-            if stock_minimo > stock_maximo:
-                raise forms.ValidationError('El stock mínimo no puede ser mayor al stock máximo.')
-        
+        validar_reglas_producto(cleaned_data)
         return cleaned_data
 
 class CategoriaForm(forms.ModelForm):
@@ -172,3 +179,74 @@ class BusquedaProductoForm(forms.Form):
         widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         label='Solo productos con bajo stock'
     )
+
+class ImportarProductosForm(forms.Form):
+    archivo = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+        label='Archivo CSV o XLSX'
+    )
+    crear_categorias = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='Crear las categorías que no existen'
+    )
+    
+    def clean_archivo(self):
+        archivo = self.cleaned_data.get('archivo')
+        if not archivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('El archivo debe ser CSV o XLSX.')
+        return archivo
+
+class ActualizarPreciosForm(forms.Form):
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.filter(activa=True),
+        required=False,
+        empty_label="Todas las categorías",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Categoría'
+    )
+    
+    proveedor = forms.ModelChoiceField(
+        queryset=Proveedor.objects.filter(activo=True),
+        required=False,
+        empty_label="Todos los proveedores",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Proveedor'
+    )
+    
+    campo = forms.ChoiceField(
+        choices=CAMPOS_PRECIO,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Precio a modificar'
+    )
+    
+    operacion = forms.ChoiceField(
+        choices=OPERACIONES,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Operación'
+    )
+    
+    valor = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+        label='Valor (% o monto)'
+    )
+    
+    motivo = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+        label='Motivo'
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        operacion = cleaned_data.get('operacion')
+        valor = cleaned_data.get('valor')
+        if operacion in ('porcentaje', 'monto') and valor is None:
+            self.add_error('valor', 'Indique el porcentaje o monto a aplicar.')
+        if operacion == 'porcentaje' and valor is not None and valor <= -100:
+            self.add_error('valor', 'La variación porcentual debe ser mayor a -100%.')
+        return cleaned_data
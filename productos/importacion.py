@@ -0,0 +1,361 @@
+"""
+Importación masiva de productos desde CSV o XLSX.
+
+Las filas se leen como stream y se procesan por lotes: cada lote se valida
+con las reglas de ProductoForm, se hace upsert por código con bulk_create y
+se registran en bloque los movimientos de "Stock inicial" de los productos
+nuevos. La memoria usada depende del tamaño del lote, no del archivo.
+
+Una celda de precio vacía deja el valor guardado del producto (0 si es
+nuevo). Las categorías, igual que los proveedores, deben existir; las
+faltantes solo se crean si se pide con `crear_categorias`.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django import forms
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import alertas, autocompletar, busqueda
+from .forms import validar_reglas_producto
+from .models import Producto, Categoria, Proveedor, MovimientoInventario, ValoracionInventario, BAJO_STOCK
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 200
+
+# Columnas que se actualizan cuando el código ya existe (solo las que vienen
+# en el archivo). El stock de un producto existente no se pisa: sus cambios
+# van por movimientos.
+CAMPOS_ACTUALIZABLES = [
+    'nombre', 'descripcion', 'tipo', 'categoria', 'precio_compra', 'precio_venta',
+    'margen_ganancia', 'stock_minimo', 'stock_maximo', 'proveedor',
+    'codigo_proveedor', 'activo', 'updated_at',
+]
+
+# Si la celda está vacía, un producto existente conserva el valor guardado
+CAMPOS_PRECIO = ['precio_compra', 'precio_venta', 'margen_ganancia']
+
+VALORES_VERDADEROS = ('1', 'si', 'sí', 'true', 'verdadero', 'x', 'activo')
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.procesadas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.movimientos = 0
+        self.errores = []
+        self.total_errores = 0
+
+    def agregar_error(self, linea, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((linea, mensaje))
+
+
+def _normalizar_encabezado(valor):
+    return str(valor or '').strip().lower().replace(' ', '_')
+
+
+def _leer_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    encabezados = [_normalizar_encabezado(valor) for valor in next(lector, [])]
+    for fila in lector:
+        if any(fila):
+            yield dict(zip(encabezados, fila))
+
+
+def _leer_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise forms.ValidationError('Para importar XLSX se requiere instalar openpyxl.')
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [_normalizar_encabezado(valor) for valor in next(filas, [])]
+        for fila in filas:
+            if any(valor not in (None, '') for valor in fila):
+                yield dict(zip(encabezados, fila))
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Genera un dict por fila con los encabezados en minúsculas."""
+    if nombre_archivo.lower().endswith('.xlsx'):
+        return _leer_xlsx(archivo)
+    return _leer_csv(archivo)
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def _numero(valor, campo, mensaje):
+    """Decimal finito y no negativo a partir del texto de una celda."""
+    try:
+        numero = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise forms.ValidationError(f'{campo}: "{valor}" {mensaje}')
+    if not numero.is_finite():
+        raise forms.ValidationError(f'{campo}: "{valor}" {mensaje}')
+    if numero < 0:
+        raise forms.ValidationError(f'{campo}: no puede ser negativo.')
+    return numero
+
+
+def _decimal(fila, campo):
+    """Número con los decimales del campo, o None si la celda está vacía."""
+    valor = _texto(fila, campo)
+    if not valor:
+        return None
+    numero = _numero(valor, campo, 'no es un número válido.')
+    campo_modelo = Producto._meta.get_field(campo)
+    enteros = campo_modelo.max_digits - campo_modelo.decimal_places
+    # Se compara antes de redondear (quantize falla con números enormes) y después
+    if numero < 10 ** enteros:
+        numero = numero.quantize(Decimal(1).scaleb(-campo_modelo.decimal_places))
+    if numero >= 10 ** enteros:
+        raise forms.ValidationError(f'{campo}: máximo {enteros} dígitos enteros.')
+    return numero
+
+
+def _entero(fila, campo):
+    valor = _texto(fila, campo)
+    if not valor:
+        return 0
+    numero = int(_numero(valor, campo, 'no es un número entero.'))
+    _, maximo = connection.ops.integer_field_ranges[Producto._meta.get_field(campo).get_internal_type()]
+    if numero > maximo:
+        raise forms.ValidationError(f'{campo}: no puede ser mayor que {maximo}.')
+    return numero
+
+
+def _limpiar_fila(fila):
+    """Convierte y valida una fila; lanza ValidationError si no es válida."""
+    datos = {
+        'codigo': _texto(fila, 'codigo'),
+        'nombre': _texto(fila, 'nombre'),
+        'descripcion': _texto(fila, 'descripcion'),
+        'tipo': _texto(fila, 'tipo').lower() or 'producto',
+        'categoria': _texto(fila, 'categoria'),
+        'proveedor': _texto(fila, 'proveedor'),
+        'codigo_proveedor': _texto(fila, 'codigo_proveedor'),
+        'precio_compra': _decimal(fila, 'precio_compra'),
+        'precio_venta': _decimal(fila, 'precio_venta'),
+        'margen_ganancia': _decimal(fila, 'margen_ganancia'),
+        'stock_actual': _entero(fila, 'stock_actual'),
+        'stock_minimo': _entero(fila, 'stock_minimo'),
+        'stock_maximo': _entero(fila, 'stock_maximo'),
+    }
+    activo = _texto(fila, 'activo').lower()
+    datos['activo'] = activo in VALORES_VERDADEROS if activo else True
+
+    if not datos['codigo']:
+        raise forms.ValidationError('El código es obligatorio.')
+    if not datos['nombre']:
+        raise forms.ValidationError('El nombre es obligatorio.')
+    for campo in ('codigo', 'nombre', 'codigo_proveedor'):
+        largo = Producto._meta.get_field(campo).max_length
+        if len(datos[campo]) > largo:
+            raise forms.ValidationError(f'{campo}: máximo {largo} caracteres.')
+    if datos['tipo'] not in dict(Producto.TIPO_CHOICES):
+        raise forms.ValidationError(f'tipo: "{datos["tipo"]}" no es válido.')
+
+    validar_reglas_producto(datos)
+    return datos
+
+
+class _Catalogos:
+    """Mapas nombre -> id de categorías y proveedores, en memoria."""
+
+    def __init__(self):
+        self.categorias = {
+            nombre.lower(): pk for pk, nombre in Categoria.objects.values_list('pk', 'nombre')
+        }
+        self.proveedores = {
+            nombre.lower(): pk for pk, nombre in Proveedor.objects.values_list('pk', 'nombre')
+        }
+
+    def categoria_existe(self, nombre):
+        return not nombre or nombre.lower() in self.categorias
+
+    def crear_categorias_faltantes(self, nombres):
+        faltantes = {nombre for nombre in nombres if nombre and nombre.lower() not in self.categorias}
+        if not faltantes:
+            return
+        Categoria.objects.bulk_create(
+            [Categoria(nombre=nombre) for nombre in faltantes], ignore_conflicts=True
+        )
+        for pk, nombre in Categoria.objects.filter(nombre__in=faltantes).values_list('pk', 'nombre'):
+            self.categorias[nombre.lower()] = pk
+
+
+def _completar_precios(datos, guardados):
+    """
+    Reemplaza los precios vacíos por los `guardados` del producto existente
+    (None si es nuevo: quedan en 0) y vuelve a validar las reglas con ellos.
+    """
+    vacios = [campo for campo in CAMPOS_PRECIO if datos[campo] is None]
+    for campo in vacios:
+        datos[campo] = Decimal('0') if guardados is None else guardados[campo]
+    if vacios and guardados is not None:
+        validar_reglas_producto(datos)
+
+
+def _importar_lote(lote, catalogos, usuario, resultado, crear_categorias=False):
+    validos = {}
+    lineas = {}
+    for linea, fila in lote:
+        try:
+            datos = _limpiar_fila(fila)
+            if datos['proveedor'] and datos['proveedor'].lower() not in catalogos.proveedores:
+                raise forms.ValidationError(f'Proveedor "{datos["proveedor"]}" no existe.')
+            if not crear_categorias and not catalogos.categoria_existe(datos['categoria']):
+                raise forms.ValidationError(f'Categoría "{datos["categoria"]}" no existe.')
+        except forms.ValidationError as error:
+            resultado.agregar_error(linea, ' '.join(error.messages))
+            continue
+        # Si un código se repite en el lote, gana la última fila
+        validos[datos['codigo']] = datos
+        lineas[datos['codigo']] = linea
+
+    if not validos:
+        return
+
+    if crear_categorias:
+        catalogos.crear_categorias_faltantes(datos['categoria'] for datos in validos.values())
+    columnas = set(lote[0][1])
+    campos_actualizables = [
+        campo for campo in CAMPOS_ACTUALIZABLES if campo in columnas or campo == 'updated_at'
+    ]
+
+    productos = {}
+    for datos in validos.values():
+        productos[datos['codigo']] = Producto(
+            codigo=datos['codigo'],
+            nombre=datos['nombre'],
+            descripcion=datos['descripcion'],
+            tipo=datos['tipo'],
+            categoria_id=catalogos.categorias.get(datos['categoria'].lower()),
+            proveedor_id=catalogos.proveedores.get(datos['proveedor'].lower()),
+            codigo_proveedor=datos['codigo_proveedor'],
+            precio_compra=datos['precio_compra'],
+            precio_venta=datos['precio_venta'],
+            margen_ganancia=datos['margen_ganancia'],
+            stock_actual=datos['stock_actual'],
+            stock_minimo=datos['stock_minimo'],
+            stock_maximo=datos['stock_maximo'],
+            bajo_stock=datos['stock_actual'] <= datos['stock_minimo'],
+            activo=datos['activo'],
+        )
+
+    with transaction.atomic():
+        # Stock y precios actuales de los existentes, bloqueados hasta el commit
+        existentes = {
+            codigo: dict(zip(['stock_actual', *CAMPOS_PRECIO], valores))
+            for codigo, *valores in Producto.objects.select_for_update()
+            .filter(codigo__in=validos)
+            .order_by('pk')
+            .values_list('codigo', 'stock_actual', *CAMPOS_PRECIO)
+        }
+        for codigo, datos in list(validos.items()):
+            try:
+                _completar_precios(datos, existentes.get(codigo))
+            except forms.ValidationError as error:
+                resultado.agregar_error(lineas[codigo], ' '.join(error.messages))
+                del validos[codigo], productos[codigo]
+                existentes.pop(codigo, None)
+                continue
+            for campo in CAMPOS_PRECIO:
+                setattr(productos[codigo], campo, datos[campo])
+        if not validos:
+            return
+
+        Producto.objects.bulk_create(
+            list(productos.values()),
+            update_conflicts=True,
+            unique_fields=['codigo'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=campos_actualizables,
+        )
+        if existentes and 'stock_minimo' in columnas:
+            # El stock de los existentes no viene del archivo: se compara en la BD
+            Producto.objects.filter(codigo__in=existentes).update(
+                bajo_stock=BAJO_STOCK, updated_at=timezone.now()
+            )
+
+        con_stock = [
+            codigo for codigo, datos in validos.items()
+            if codigo not in existentes and datos['stock_actual'] > 0
+        ]
+        ids = dict(
+            Producto.objects.filter(codigo__in=validos).values_list('codigo', 'pk')
+        )
+        movimientos = [
+            MovimientoInventario(
+                producto_id=ids[codigo],
+                tipo='entrada',
+                cantidad=validos[codigo]['stock_actual'],
+                stock_anterior=0,
+                stock_nuevo=validos[codigo]['stock_actual'],
+                motivo='Stock inicial',
+                usuario=usuario,
+            )
+            for codigo in con_stock
+        ]
+        MovimientoInventario.objects.bulk_create(movimientos)
+
+        diferencias = {}
+        for codigo, datos in validos.items():
+            if codigo not in existentes:
+                diferencias[ids[codigo]] = datos['stock_actual'] * datos['precio_compra']
+            elif 'precio_compra' in columnas:
+                guardados = existentes[codigo]
+                diferencias[ids[codigo]] = guardados['stock_actual'] * (
+                    datos['precio_compra'] - guardados['precio_compra']
+                )
+        ValoracionInventario.ajustar(diferencias)
+
+    resultado.creados += len(validos) - len(existentes)
+    resultado.actualizados += len(existentes)
+    resultado.movimientos += len(movimientos)
+
+
+def importar_productos(filas, usuario=None, tamano_lote=TAMANO_LOTE, crear_categorias=False):
+    """
+    Importa productos desde un iterable de dicts (ver leer_filas()). Con
+    `crear_categorias` se crean las categorías que no existen; si no, esas
+    filas se rechazan.
+
+    Devuelve un ResultadoImportacion con los totales y los errores por línea.
+    """
+    resultado = ResultadoImportacion()
+    catalogos = _Catalogos()
+    # La línea 1 es el encabezado
+    numeradas = enumerate(filas, start=2)
+
+    while True:
+        lote = list(islice(numeradas, tamano_lote))
+        if not lote:
+            break
+        resultado.procesadas += len(lote)
+        _importar_lote(lote, catalogos, usuario, resultado, crear_categorias)
+
+    # bulk_create no dispara señales
+    busqueda.invalidar_indice()
+    autocompletar.invalidar_indice()
+    alertas.invalidar_conteos()
+    return resultado
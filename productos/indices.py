@@ -0,0 +1,134 @@
+"""
+Índices de productos que cada proceso mantiene en memoria.
+
+Cada proceso arma su propia copia del índice (búsqueda, autocompletado) la
+primera vez que se usa. Los cambios quedan en la base de datos, que ven
+todos los workers: VersionIndice lleva la versión de cada índice y
+CambioIndice los productos que tocó cada versión. Registrar un cambio
+incrementa la versión con un UPDATE atómico y anota los productos en la
+misma transacción.
+
+Las consultas no leen la versión: un proceso la revisa como mucho cada
+INTERVALO_REVISION segundos y, si otro la cambió, vuelve a leer solo los
+productos anotados desde su versión y se los aplica a su copia. Solo se
+reconstruye el índice completo si alguien lo invalidó (importaciones y
+cambios masivos) o si la copia está tan atrasada que sus cambios ya se
+podaron. Mientras un hilo revisa, los demás siguen usando la copia que hay.
+"""
+import threading
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CambioIndice, VersionIndice
+
+# Segundos que una copia se usa sin revisar la versión
+INTERVALO_REVISION = 5
+
+# Con más productos que esto en un cambio se invalida el índice completo
+MAXIMO_CAMBIOS = 1000
+
+# Cambios que se conservan; cada PODA versiones se borran los anteriores
+RETENCION = 10000
+PODA = 1000
+
+
+class IndiceCompartido:
+    """
+    Índice en memoria versionado en `clave`. `construir()` lo arma completo
+    y `actualizar(indice, ids)` vuelve a leer esos productos y los aplica.
+    """
+
+    def __init__(self, clave, construir, actualizar, intervalo=INTERVALO_REVISION):
+        self.clave = clave
+        self.construir = construir
+        self.actualizar = actualizar
+        self.intervalo = intervalo
+        self._indice = None
+        self._version = None
+        self._proxima_revision = 0
+        self._lock = threading.Lock()
+
+    def version_actual(self):
+        version = VersionIndice.objects.filter(clave=self.clave).values_list('version', flat=True).first()
+        return version or 0
+
+    def _incrementar_version(self, ids):
+        """Incrementa la versión, anota los productos (None: reconstruir) y devuelve la nueva."""
+        versiones = VersionIndice.objects.filter(clave=self.clave)
+        with transaction.atomic():
+            if not versiones.update(version=F('version') + 1):
+                try:
+                    with transaction.atomic():
+                        VersionIndice.objects.create(clave=self.clave, version=0)
+                except IntegrityError:
+                    # Otro proceso la creó al mismo tiempo
+                    pass
+                versiones.update(version=F('version') + 1)
+            # La fila queda bloqueada hasta el commit: la versión leída es la propia
+            version = versiones.values_list('version', flat=True).get()
+            CambioIndice.objects.bulk_create([
+                CambioIndice(clave=self.clave, version=version, producto_id=pk) for pk in ids
+            ])
+            if version % PODA == 0:
+                CambioIndice.objects.filter(clave=self.clave, version__lte=version - RETENCION).delete()
+        return version
+
+    def _sincronizar(self):
+        """Lleva la copia local a la versión actual, aplicando los cambios anotados."""
+        version = self.version_actual()
+        if self._indice is not None and version == self._version:
+            return
+        if self._indice is not None:
+            cambios = list(
+                CambioIndice.objects.filter(clave=self.clave, version__gt=self._version, version__lte=version)
+                .values_list('version', 'producto_id')
+            )
+            ids = {pk for _, pk in cambios}
+            if None not in ids and len({v for v, _ in cambios}) == version - self._version:
+                self.actualizar(self._indice, ids)
+                self._version = version
+                return
+        # Se construye después de leer la versión: un cambio que entre en medio
+        # queda incluido y, como sube la versión, solo se vuelve a aplicar
+        self._indice, self._version = self.construir(), version
+
+    def obtener(self):
+        """La copia local; revisa la versión si pasó el intervalo."""
+        indice = self._indice
+        if indice is not None and time.monotonic() < self._proxima_revision:
+            return indice
+        # Si otro hilo ya está revisando, se usa la copia que hay
+        if not self._lock.acquire(blocking=indice is None):
+            return indice
+        try:
+            if self._indice is None or time.monotonic() >= self._proxima_revision:
+                self._sincronizar()
+                self._proxima_revision = time.monotonic() + self.intervalo
+            return self._indice
+        finally:
+            self._lock.release()
+
+    def registrar(self, ids):
+        """
+        Registra los productos `ids`, ya confirmados en la base de datos, y
+        los aplica a la copia local si estaba al día.
+        """
+        ids = set(ids)
+        if not ids:
+            return
+        if len(ids) > MAXIMO_CAMBIOS:
+            self.invalidar()
+            return
+        with self._lock:
+            version = self._incrementar_version(ids)
+            if self._indice is not None and self._version == version - 1:
+                self.actualizar(self._indice, ids)
+                self._version = version
+
+    def invalidar(self):
+        """Pide reconstruir el índice en todos los procesos."""
+        with self._lock:
+            self._indice = None
+            self._incrementar_version([None])
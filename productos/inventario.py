@@ -0,0 +1,95 @@
+"""
+Registro de movimientos de inventario.
+
+Todos los cambios de stock pasan por registrar_movimientos(): bloquea las
+filas de los productos afectados (en orden de id, para evitar deadlocks),
+calcula el stock nuevo, guarda los movimientos con bulk_create y actualiza
+solo las columnas stock_actual y bajo_stock, todo en una misma transacción
+junto con el ajuste de la valorización total del inventario.
+"""
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+from . import alertas
+from .models import Producto, MovimientoInventario, ValoracionInventario
+
+
+def calcular_stock_nuevo(tipo, stock_actual, cantidad):
+    """Stock resultante de aplicar un movimiento al stock actual."""
+    if tipo == 'entrada':
+        return stock_actual + cantidad
+    if tipo == 'salida':
+        return max(0, stock_actual - cantidad)
+    # ajuste: la cantidad es el stock final
+    return cantidad
+
+
+def registrar_movimientos(movimientos):
+    """
+    Aplica una lista de MovimientoInventario sin guardar.
+
+    Cada movimiento debe traer producto_id, tipo, cantidad y motivo; aquí se
+    completan stock_anterior y stock_nuevo. Los movimientos de un mismo
+    producto se aplican en el orden de la lista.
+    """
+    movimientos = list(movimientos)
+    if not movimientos:
+        return movimientos
+
+    producto_ids = sorted({movimiento.producto_id for movimiento in movimientos})
+
+    with transaction.atomic():
+        filas = (
+            Producto.objects.select_for_update()
+            .filter(pk__in=producto_ids)
+            .order_by('pk')
+            .values_list('pk', 'stock_actual', 'stock_minimo', 'bajo_stock', 'precio_compra')
+        )
+        stocks = {}
+        minimos = {}
+        bajo_stock = {}
+        precios = {}
+        for pk, stock_actual, stock_minimo, bajo, precio_compra in filas:
+            stocks[pk] = stock_actual
+            minimos[pk] = stock_minimo
+            bajo_stock[pk] = bajo
+            precios[pk] = precio_compra
+        faltantes = set(producto_ids) - set(stocks)
+        if faltantes:
+            raise Producto.DoesNotExist(f"Productos inexistentes: {sorted(faltantes)}")
+
+        iniciales = dict(stocks)
+        for movimiento in movimientos:
+            stock_anterior = stocks[movimiento.producto_id]
+            stock_nuevo = calcular_stock_nuevo(movimiento.tipo, stock_anterior, movimiento.cantidad)
+            movimiento.stock_anterior = stock_anterior
+            movimiento.stock_nuevo = stock_nuevo
+            stocks[movimiento.producto_id] = stock_nuevo
+
+        MovimientoInventario.objects.bulk_create(movimientos)
+
+        cambios = {pk: stock for pk, stock in stocks.items() if stock != iniciales[pk]}
+        if cambios:
+            nuevos_bajo_stock = {pk: stock <= minimos[pk] for pk, stock in cambios.items()}
+            Producto.objects.filter(pk__in=cambios).update(
+                stock_actual=Case(
+                    *[When(pk=pk, then=Value(stock)) for pk, stock in cambios.items()]
+                ),
+                bajo_stock=Case(
+                    *[When(pk=pk, then=Value(bajo)) for pk, bajo in nuevos_bajo_stock.items()]
+                ),
+                updated_at=timezone.now(),
+            )
+            if any(bajo != bajo_stock[pk] for pk, bajo in nuevos_bajo_stock.items()):
+                alertas.invalidar_conteos()
+            ValoracionInventario.ajustar({
+                pk: (stock - iniciales[pk]) * precios[pk] for pk, stock in cambios.items()
+            })
+
+    return movimientos
+
+
+def registrar_movimiento(movimiento):
+    """Aplica un solo movimiento; ver registrar_movimientos()."""
+    return registrar_movimientos([movimiento])[0]
@@ -0,0 +1,39 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from productos.archivo import archivar_movimientos, directorio_archivo, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = ('Mueve los movimientos de inventario antiguos (ya consolidados en saldos) '
+            'a archivos columnares por mes en MEDIA_ROOT/var/movimientos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=12,
+                            help='Archiva los movimientos con más de N meses (por defecto %(default)s)')
+        parser.add_argument('--antes-de', dest='antes_de',
+                            help='Fecha de corte AAAA-MM-DD; reemplaza a --meses')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Movimientos por lote (por defecto %(default)s)')
+
+    def handle(self, *args, **options):
+        if options['antes_de']:
+            try:
+                dia = parse_date(options['antes_de'])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise CommandError('--antes-de debe tener el formato AAAA-MM-DD.')
+        else:
+            hoy = timezone.localdate()
+            meses = hoy.year * 12 + hoy.month - 1 - options['meses']
+            dia = hoy.replace(year=meses // 12, month=meses % 12 + 1, day=1)
+        corte = timezone.make_aware(datetime.combine(dia, time.min))
+
+        archivados = archivar_movimientos(corte, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{archivados} movimientos anteriores a {dia} archivados en {directorio_archivo()}.'
+        ))
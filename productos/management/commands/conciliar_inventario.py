@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import conciliacion
+
+
+class Command(BaseCommand):
+    help = ('Revisa la cadena stock_anterior/stock_nuevo de los movimientos de cada producto '
+            'y reporta saltos y descuadres con stock_actual.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos en paralelo (por defecto, uno por CPU)')
+        parser.add_argument('--rango', type=int, default=conciliacion.PRODUCTOS_POR_RANGO,
+                            help='Productos por tarea (por defecto %(default)s)')
+        parser.add_argument('--lote', type=int, default=conciliacion.TAMANO_LOTE,
+                            help='Movimientos leídos por consulta (por defecto %(default)s)')
+        parser.add_argument('--mostrar', type=int, default=20,
+                            help='Incidencias a listar de cada tipo (por defecto %(default)s)')
+        parser.add_argument('--corregir', action='store_true',
+                            help='Registra un ajuste en cada producto descuadrado para que su '
+                                 'cadena termine en el stock actual')
+        parser.add_argument('--usuario', help='Usuario al que se asignan los ajustes')
+
+    def _listar(self, titulo, incidencias, mostrar):
+        total = sum(abs(incidencia.diferencia) for incidencia in incidencias)
+        self.stdout.write(f'{titulo}: {len(incidencias)} (suma de diferencias: {total} unidades)')
+        # Primero los de mayor magnitud
+        for incidencia in sorted(incidencias, key=lambda i: -abs(i.diferencia))[:mostrar]:
+            donde = f' en movimiento {incidencia.movimiento_id}' if incidencia.movimiento_id else ''
+            self.stdout.write(
+                f'  {incidencia.codigo}{donde}: esperado {incidencia.esperado}, '
+                f'encontrado {incidencia.encontrado} ({incidencia.diferencia:+d})'
+            )
+        if len(incidencias) > mostrar:
+            self.stdout.write(f'  ... y {len(incidencias) - mostrar} más.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"El usuario {options['usuario']} no existe.")
+
+        inicio = time.monotonic()
+        resultado = conciliacion.conciliar(
+            procesos=options['procesos'],
+            productos_por_rango=options['rango'],
+            tamano_lote=options['lote'],
+        )
+        self.stdout.write(
+            f'{resultado.productos} productos y {resultado.movimientos} movimientos revisados '
+            f'en {time.monotonic() - inicio:.1f} s.'
+        )
+        self._listar('Saltos en la cadena', resultado.saltos, options['mostrar'])
+        self._listar('Descuadres con stock actual', resultado.descuadres, options['mostrar'])
+
+        if options['corregir'] and resultado.descuadres:
+            creados = conciliacion.corregir_descuadres(
+                [incidencia.producto_id for incidencia in resultado.descuadres], usuario=usuario,
+            )
+            self.stdout.write(self.style.SUCCESS(f'{creados} movimientos de ajuste registrados.'))
+        elif not resultado.incidencias:
+            self.stdout.write(self.style.SUCCESS('Sin incidencias.'))
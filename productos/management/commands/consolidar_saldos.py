@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from productos.saldos import consolidar_saldos, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Consolida los movimientos de inventario nuevos en saldos diarios por producto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Movimientos por lote (por defecto %(default)s)')
+
+    def handle(self, *args, **options):
+        procesados = consolidar_saldos(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{procesados} movimientos consolidados.'))
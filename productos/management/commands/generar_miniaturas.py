@@ -0,0 +1,25 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from erp_system.imagenes import MODELOS_CON_IMAGEN, procesar_imagen
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de productos y fotos de técnicos que aún no las tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Revisa también las imágenes que ya tienen miniaturas')
+
+    def handle(self, *args, **options):
+        for modelo, campo, campo_hash in MODELOS_CON_IMAGEN:
+            Modelo = apps.get_model(modelo)
+            pendientes = Modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            if not options['todas']:
+                pendientes = pendientes.filter(**{campo_hash: ''})
+
+            total = 0
+            for pk in pendientes.values_list('pk', flat=True).iterator():
+                procesar_imagen(modelo, pk, campo, campo_hash)
+                total += 1
+            self.stdout.write(f'{modelo}: {total} imágenes procesadas.')
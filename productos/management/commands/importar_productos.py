@@ -0,0 +1,58 @@
+import csv
+
+from django import forms
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.importacion import importar_productos, leer_filas, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa o actualiza productos desde un archivo CSV o XLSX. '
+        'Los productos se identifican por código; el stock de los existentes no se modifica.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Filas por lote (por defecto %(default)s)')
+        parser.add_argument('--usuario', help='Usuario al que se asignan los movimientos de stock inicial')
+        parser.add_argument('--crear-categorias', action='store_true',
+                            help='Crear las categorías que no existen (por defecto esas filas se rechazan)')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"El usuario {options['usuario']} no existe.")
+
+        try:
+            archivo = open(options['archivo'], 'rb')
+        except OSError as error:
+            raise CommandError(f'No se pudo abrir el archivo: {error}')
+
+        with archivo:
+            filas = leer_filas(archivo, options['archivo'])
+            try:
+                resultado = importar_productos(
+                    filas, usuario=usuario, tamano_lote=options['lote'],
+                    crear_categorias=options['crear_categorias'],
+                )
+            except forms.ValidationError as error:
+                raise CommandError(' '.join(error.messages))
+            except (UnicodeDecodeError, csv.Error) as error:
+                raise CommandError(f'No se pudo leer el archivo: {error}')
+
+        for linea, mensaje in resultado.errores:
+            self.stderr.write(f'Línea {linea}: {mensaje}')
+        if resultado.total_errores > len(resultado.errores):
+            self.stderr.write(f'... y {resultado.total_errores - len(resultado.errores)} errores más.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.procesadas} filas procesadas: {resultado.creados} productos creados, '
+            f'{resultado.actualizados} actualizados, {resultado.movimientos} movimientos de stock inicial, '
+            f'{resultado.total_errores} errores.'
+        ))
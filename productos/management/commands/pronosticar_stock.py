@@ -0,0 +1,57 @@
+import argparse
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos import pronosticos
+
+
+def _probabilidad(valor):
+    """Número estrictamente entre 0 y 1 (inv_cdf no admite los extremos)."""
+    try:
+        numero = float(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'"{valor}" no es un número.')
+    if not 0 < numero < 1:
+        raise argparse.ArgumentTypeError('debe estar entre 0 y 1, sin incluirlos.')
+    return numero
+
+
+def _entero_desde(minimo):
+    """Tipo de argparse: entero mayor o igual que `minimo`."""
+    def convertir(valor):
+        try:
+            numero = int(valor)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'"{valor}" no es un número entero.')
+        if numero < minimo:
+            raise argparse.ArgumentTypeError(f'debe ser mayor o igual que {minimo}.')
+        return numero
+    return convertir
+
+
+class Command(BaseCommand):
+    help = 'Calcula la demanda diaria y el stock mínimo/máximo sugerido de cada producto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=_entero_desde(1), default=pronosticos.DIAS_ANALIZADOS,
+                            help='Días de historial a analizar, al menos 1 (por defecto %(default)s)')
+        parser.add_argument('--reposicion', type=_entero_desde(0), default=pronosticos.DIAS_REPOSICION,
+                            help='Días que tarda un pedido al proveedor (por defecto %(default)s)')
+        parser.add_argument('--cobertura', type=_entero_desde(0), default=pronosticos.DIAS_COBERTURA,
+                            help='Días de demanda que cubre el stock máximo (por defecto %(default)s)')
+        parser.add_argument('--nivel-servicio', dest='nivel_servicio', type=_probabilidad,
+                            default=pronosticos.NIVEL_SERVICIO,
+                            help='Probabilidad de no quebrar stock, mayor que 0 y menor que 1 (por defecto %(default)s)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        total = pronosticos.calcular_pronosticos(
+            dias=options['dias'],
+            dias_reposicion=options['reposicion'],
+            dias_cobertura=options['cobertura'],
+            nivel_servicio=options['nivel_servicio'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} pronósticos calculados en {time.monotonic() - inicio:.1f} s.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from productos.models import ValoracionInventario
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde los productos el valor total del inventario.'
+
+    def handle(self, *args, **options):
+        anterior = ValoracionInventario.objects.aggregate(total=Sum('valor_total'))['total']
+        total = ValoracionInventario.recalcular()
+        if anterior is not None and anterior != total:
+            self.stdout.write(self.style.WARNING(f'Diferencia corregida: {total - anterior}'))
+        self.stdout.write(self.style.SUCCESS(f'Valor total del inventario: {total}'))
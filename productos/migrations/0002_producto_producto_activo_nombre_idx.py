@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre', 'id'], name='producto_activo_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+MYSQL_CREAR = (
+    "ALTER TABLE productos_producto "
+    "ADD FULLTEXT INDEX producto_busqueda_ft (nombre, codigo, descripcion)"
+)
+MYSQL_BORRAR = "ALTER TABLE productos_producto DROP INDEX producto_busqueda_ft"
+
+POSTGRES_CREAR = [
+    "CREATE INDEX producto_busqueda_gin ON productos_producto USING GIN ("
+    "to_tsvector('spanish', coalesce(productos_producto.nombre, '') || ' ' || "
+    "coalesce(productos_producto.codigo, '') || ' ' || coalesce(productos_producto.descripcion, '')))",
+    "CREATE INDEX producto_codigo_prefijo ON productos_producto "
+    "(UPPER(codigo::text) text_pattern_ops)",
+]
+POSTGRES_BORRAR = [
+    "DROP INDEX IF EXISTS producto_busqueda_gin",
+    "DROP INDEX IF EXISTS producto_codigo_prefijo",
+]
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(MYSQL_CREAR)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_CREAR:
+            schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(MYSQL_BORRAR)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_BORRAR:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """Índices de texto completo para productos.busqueda (solo MySQL y PostgreSQL)."""
+
+    dependencies = [
+        ('productos', '0002_producto_producto_activo_nombre_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_producto_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('stock', models.PositiveIntegerField()),
+                ('ultimo_movimiento_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Saldo de Inventario',
+                'verbose_name_plural': 'Saldos de Inventario',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldoinventario',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='productos.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='saldoinventario',
+            index=models.Index(fields=['ultimo_movimiento_id'], name='saldo_ultimo_movimiento_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldoinventario',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='saldo_producto_fecha_unico'),
+        ),
+    ]
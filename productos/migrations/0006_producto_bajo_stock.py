@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:09
+
+from django.db import migrations, models
+from django.db.models import Case, When, Value, F
+
+
+def calcular_bajo_stock(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    Producto.objects.update(bajo_stock=Case(
+        When(stock_actual__lte=F('stock_minimo'), then=Value(True)),
+        default=Value(False),
+        output_field=models.BooleanField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_producto_imagen_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='bajo_stock',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(calcular_bajo_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'bajo_stock', 'stock_actual'], name='producto_bajo_stock_idx'),
+        ),
+    ]
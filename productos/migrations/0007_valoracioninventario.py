@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:10
+
+from django.db import migrations, models
+from django.db.models import F, Sum, ExpressionWrapper
+
+
+def crear_valoracion(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    ValoracionInventario = apps.get_model('productos', 'ValoracionInventario')
+    total = Producto.objects.aggregate(total=Sum(ExpressionWrapper(
+        F('stock_actual') * F('precio_compra'),
+        output_field=models.DecimalField(max_digits=18, decimal_places=2),
+    )))['total']
+    ValoracionInventario.objects.update_or_create(pk=1, defaults={'valor_total': total or 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_producto_bajo_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValoracionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Valoración de Inventario',
+                'verbose_name_plural': 'Valoración de Inventario',
+            },
+        ),
+        migrations.RunPython(crear_valoracion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_categoria_proveedor_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('demanda_diaria', models.FloatField(default=0)),
+                ('desviacion_diaria', models.FloatField(default=0)),
+                ('stock_seguridad', models.PositiveIntegerField(default=0)),
+                ('stock_minimo_sugerido', models.PositiveIntegerField(default=0)),
+                ('stock_maximo_sugerido', models.PositiveIntegerField(default=0)),
+                ('dias_para_quiebre', models.FloatField(blank=True, null=True)),
+                ('dias_analizados', models.PositiveIntegerField(default=0)),
+                ('dias_reposicion', models.PositiveIntegerField(default=0)),
+                ('nivel_servicio', models.FloatField(default=0)),
+                ('calculado_en', models.DateTimeField()),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Pronóstico de Stock',
+                'verbose_name_plural': 'Pronósticos de Stock',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('productos', '0009_pronosticostock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_compra_anterior', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_venta_anterior', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_compra_nuevo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_venta_nuevo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('motivo', models.CharField(max_length=200)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='productos.producto')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Historial de Precio',
+                'verbose_name_plural': 'Historial de Precios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='historial_producto_fecha_idx')],
+            },
+        ),
+    ]
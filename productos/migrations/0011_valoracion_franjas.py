@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import F, Sum, ExpressionWrapper
+from django.db.models.functions import Mod
+
+# Igual que ValoracionInventario.FRANJAS al crear esta migración
+FRANJAS = 16
+
+
+def repartir_en_franjas(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    ValoracionInventario = apps.get_model('productos', 'ValoracionInventario')
+    valores = dict(
+        Producto.objects.order_by()
+        .annotate(franja=Mod('pk', FRANJAS) + 1)
+        .values('franja')
+        .annotate(total=Sum(ExpressionWrapper(
+            F('stock_actual') * F('precio_compra'),
+            output_field=models.DecimalField(max_digits=18, decimal_places=2),
+        )))
+        .values_list('franja', 'total')
+    )
+    for franja in range(1, FRANJAS + 1):
+        ValoracionInventario.objects.update_or_create(
+            pk=franja, defaults={'valor_total': valores.get(franja) or 0}
+        )
+    ValoracionInventario.objects.filter(pk__gt=FRANJAS).delete()
+
+
+def juntar_franjas(apps, schema_editor):
+    ValoracionInventario = apps.get_model('productos', 'ValoracionInventario')
+    total = ValoracionInventario.objects.aggregate(total=Sum('valor_total'))['total']
+    ValoracionInventario.objects.exclude(pk=1).delete()
+    ValoracionInventario.objects.update_or_create(pk=1, defaults={'valor_total': total or 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_historialprecio'),
+    ]
+
+    operations = [
+        migrations.RunPython(repartir_en_franjas, juntar_franjas),
+    ]
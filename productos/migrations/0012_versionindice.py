@@ -0,0 +1,24 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_valoracion_franjas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionIndice',
+            fields=[
+                ('clave', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versión de Índice',
+                'verbose_name_plural': 'Versiones de Índices',
+            },
+        ),
+    ]
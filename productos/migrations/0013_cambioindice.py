@@ -0,0 +1,27 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_versionindice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioIndice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50)),
+                ('version', models.PositiveBigIntegerField()),
+                ('producto_id', models.BigIntegerField(null=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de Índice',
+                'verbose_name_plural': 'Cambios de Índices',
+                'indexes': [models.Index(fields=['clave', 'version'], name='cambioindice_clave_version_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Count, When, Value, F, Sum, ExpressionWrapper
+from django.db.models.functions import Mod
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import User
 
@@ -6,6 +11,7 @@ class Categoria(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     descripcion = models.TextField(blank=True)
     activa = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = "Categoría"
@@ -23,6 +29,7 @@ class Proveedor(models.Model):
     direccion = models.TextField(blank=True)
     contacto = models.CharField(max_length=100, blank=True)
     activo = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = "Proveedor"
@@ -32,6 +39,12 @@ class Proveedor(models.Model):
     def __str__(self):
         return self.nombre
 
+# Campos de Producto que afectan bajo_stock o la valorización del inventario
+CAMPOS_VALORIZACION = {'stock_actual', 'stock_minimo', 'precio_compra'}
+
+# Campos que usan los índices en memoria de búsqueda y autocompletado
+CAMPOS_INDEXADOS = ('codigo', 'nombre', 'descripcion', 'precio_venta', 'activo')
+
 class Producto(models.Model):
     TIPO_CHOICES = [
         ('producto', 'Producto'),
@@ -55,11 +68,13 @@ class Producto(models.Model):
     stock_actual = models.PositiveIntegerField(default=0)
     stock_minimo = models.PositiveIntegerField(default=0)
     stock_maximo = models.PositiveIntegerField(default=0)
+    bajo_stock = models.BooleanField(default=True, editable=False)  # stock_actual <= stock_minimo
     
     # Información adicional
     proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
     codigo_proveedor = models.CharField(max_length=100, blank=True)
     imagen = models.ImageField(upload_to='productos/imagenes/', null=True, blank=True)
+    imagen_hash = models.CharField(max_length=40, blank=True, editable=False)  # Miniaturas generadas
     
     # Estado
     activo = models.BooleanField(default=True)
@@ -72,13 +87,98 @@ class Producto(models.Model):
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['nombre']
+        indexes = [
+            # Paginación por cursor del catálogo: WHERE activo ORDER BY nombre, id
+            models.Index(fields=['activo', 'nombre', 'id'], name='producto_activo_nombre_idx'),
+            # Alertas de restock: WHERE activo AND bajo_stock ORDER BY stock_actual
+            models.Index(fields=['activo', 'bajo_stock', 'stock_actual'], name='producto_bajo_stock_idx'),
+        ]
+    
+    # Campos indexados con los valores con que se leyó de la base
+    _indexados_original = None
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._indexados_original = {
+            campo: instancia.__dict__[campo] for campo in CAMPOS_INDEXADOS if campo in instancia.__dict__
+        }
+        return instancia
+    
+    def indexados_cambiados(self, update_fields=None):
+        """
+        Campos indexados que cambió el último save(), comparando con los
+        valores leídos de la base (en un alta, todos). Deja los guardados
+        como nuevos valores originales.
+        """
+        campos = [
+            campo for campo in CAMPOS_INDEXADOS
+            if campo in self.__dict__ and (update_fields is None or campo in update_fields)
+        ]
+        if self._indexados_original is None:
+            self._indexados_original = {}
+            cambiados = set(campos)
+        else:
+            cambiados = {
+                campo for campo in campos
+                if campo not in self._indexados_original
+                or self._indexados_original[campo] != self.__dict__[campo]
+            }
+        for campo in campos:
+            self._indexados_original[campo] = self.__dict__[campo]
+        return cambiados
+    
     def get_absolute_url(self):
         return reverse('productos:detail', kwargs={'pk': self.pk})
     
+    def save(self, *args, **kwargs):
+        campos = kwargs.get('update_fields')
+        if campos is None and not self._state.adding:
+            # Con campos diferidos Django guarda solo los cargados
+            diferidos = self.get_deferred_fields()
+            if diferidos:
+                campos = [
+                    f.attname for f in self._meta.concrete_fields
+                    if not f.primary_key and f.attname not in diferidos
+                ]
+        campos = None if campos is None else set(campos)
+        if campos is not None and not campos & CAMPOS_VALORIZACION:
+            # No cambia stock, mínimo ni precio de compra: ni bajo_stock ni la valorización
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            # Valores guardados, bloqueados para calcular la diferencia de valorización
+            anterior = None
+            if not self._state.adding and self.pk is not None:
+                anterior = (
+                    Producto.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list('stock_actual', 'stock_minimo', 'precio_compra')
+                    .first()
+                )
+            
+            # Si un campo no se guarda se usa el valor de la BD, no el de memoria
+            def valor(campo, posicion):
+                if anterior is not None and campos is not None and campo not in campos:
+                    return anterior[posicion]
+                return self._meta.get_field(campo).to_python(getattr(self, campo))
+            
+            stock = valor('stock_actual', 0)
+            precio = valor('precio_compra', 2)
+            self.bajo_stock = stock <= valor('stock_minimo', 1)
+            if campos is not None:
+                if campos & {'stock_actual', 'stock_minimo'}:
+                    campos.add('bajo_stock')
+                kwargs['update_fields'] = campos
+            
+            super().save(*args, **kwargs)
+            
+            valor_anterior = anterior[0] * anterior[2] if anterior is not None else 0
+            ValoracionInventario.ajustar({self.pk: stock * precio - valor_anterior})
+    
     @property
     def necesita_restock(self):
         return self.stock_actual <= self.stock_minimo
@@ -87,6 +187,127 @@ class Producto(models.Model):
     def valor_inventario(self):
         return self.stock_actual * self.precio_compra
 
+# Valor de bajo_stock calculado en la BD, para update() masivos
+BAJO_STOCK = Case(
+    When(stock_actual__lte=F('stock_minimo'), then=Value(True)),
+    default=Value(False),
+    output_field=models.BooleanField(),
+)
+
+# stock_actual * precio_compra calculado en la BD, para agregaciones
+VALOR_INVENTARIO = ExpressionWrapper(
+    F('stock_actual') * F('precio_compra'),
+    output_field=models.DecimalField(max_digits=18, decimal_places=2),
+)
+
+class ValoracionInventario(models.Model):
+    """
+    Valor total del inventario (suma de stock_actual * precio_compra)
+    repartido en FRANJAS filas: la fila de id k + 1 suma los productos con
+    id % FRANJAS == k. Cada cambio de stock o de precio ajusta solo la franja
+    de sus productos, así que los movimientos concurrentes de productos
+    distintos casi nunca esperan el mismo bloqueo. El total es la suma de
+    las franjas, sin recorrer los productos.
+    """
+    
+    FRANJAS = 16
+    
+    valor_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Valoración de Inventario"
+        verbose_name_plural = "Valoración de Inventario"
+    
+    def __str__(self):
+        return f"{self.valor_total}"
+    
+    @classmethod
+    def ajustar(cls, diferencias):
+        """
+        Suma las diferencias {producto_id: diferencia} a sus franjas; debe
+        llamarse en la transacción del cambio. Las franjas se actualizan en
+        orden de id para no cruzar bloqueos con otra transacción.
+        """
+        por_franja = {}
+        for producto_id, diferencia in diferencias.items():
+            franja = producto_id % cls.FRANJAS + 1
+            por_franja[franja] = por_franja.get(franja, 0) + Decimal(diferencia or 0)
+        ahora = timezone.now()
+        for franja, diferencia in sorted(por_franja.items()):
+            if not diferencia:
+                continue
+            actualizadas = cls.objects.filter(pk=franja).update(
+                valor_total=F('valor_total') + diferencia, updated_at=ahora,
+            )
+            if not actualizadas:
+                # Falta la franja: se reconstruyen todas desde los productos, que ya incluyen este cambio
+                cls.recalcular()
+                return
+    
+    @classmethod
+    def recalcular(cls):
+        """Recalcula las franjas desde los productos; devuelve el total."""
+        with transaction.atomic():
+            list(cls.objects.select_for_update().order_by('pk').values_list('pk'))
+            valores = dict(
+                Producto.objects.order_by()
+                .annotate(franja=Mod('pk', cls.FRANJAS) + 1)
+                .values('franja')
+                .annotate(total=Sum(VALOR_INVENTARIO))
+                .values_list('franja', 'total')
+            )
+            for franja in range(1, cls.FRANJAS + 1):
+                cls.objects.update_or_create(
+                    pk=franja, defaults={'valor_total': valores.get(franja) or Decimal('0')}
+                )
+            cls.objects.filter(pk__gt=cls.FRANJAS).delete()
+        return sum((valor or Decimal('0') for valor in valores.values()), Decimal('0'))
+    
+    @classmethod
+    def total(cls):
+        datos = cls.objects.aggregate(franjas=Count('pk'), valor=Sum('valor_total'))
+        if datos['franjas'] < cls.FRANJAS:
+            return cls.recalcular()
+        return datos['valor']
+
+
+class VersionIndice(models.Model):
+    """
+    Versión de un índice en memoria (productos.indices). Cada cambio la
+    incrementa con un UPDATE atómico y deja en CambioIndice los productos
+    que tocó, así los demás procesos aplican solo esos a su copia.
+    """
+
+    clave = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versión de Índice"
+        verbose_name_plural = "Versiones de Índices"
+
+    def __str__(self):
+        return f"{self.clave}: {self.version}"
+
+
+class CambioIndice(models.Model):
+    """Producto cambiado en una versión de un índice; sin producto, la versión pide reconstruirlo."""
+
+    clave = models.CharField(max_length=50)
+    version = models.PositiveBigIntegerField()
+    # Sin ForeignKey: también se registran los productos eliminados
+    producto_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        verbose_name = "Cambio de Índice"
+        verbose_name_plural = "Cambios de Índices"
+        indexes = [
+            models.Index(fields=['clave', 'version'], name='cambioindice_clave_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} {self.version}: {self.producto_id}"
+
 class MovimientoInventario(models.Model):
     TIPO_MOVIMIENTO_CHOICES = [
         ('entrada', 'Entrada'),
@@ -114,6 +335,86 @@ class MovimientoInventario(models.Model):
         verbose_name = "Movimiento de Inventario"
         verbose_name_plural = "Movimientos de Inventario"
         ordering = ['-fecha']
+        indexes = [
+            # Historial por producto y consultas de stock a una fecha
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.producto.codigo} - {self.tipo} - {self.cantidad}"
+
+class HistorialPrecio(models.Model):
+    """Precios de un producto antes y después de una actualización masiva."""
+    
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='historial_precios')
+    precio_compra_anterior = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_venta_anterior = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_compra_nuevo = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_venta_nuevo = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    motivo = models.CharField(max_length=200)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Historial de Precio"
+        verbose_name_plural = "Historial de Precios"
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='historial_producto_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto_id} - {self.fecha:%d/%m/%Y}"
+
+class SaldoInventario(models.Model):
+    """Stock de un producto al cierre de cada día con movimientos."""
+    
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='saldos')
+    fecha = models.DateField()
+    stock = models.PositiveIntegerField()
+    
+    # Último movimiento incluido; sirve de marca para consolidar en forma incremental
+    ultimo_movimiento_id = models.BigIntegerField()
+    
+    class Meta:
+        verbose_name = "Saldo de Inventario"
+        verbose_name_plural = "Saldos de Inventario"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='saldo_producto_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['ultimo_movimiento_id'], name='saldo_ultimo_movimiento_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto_id} - {self.fecha} - {self.stock}"
+
+class PronosticoStock(models.Model):
+    """Demanda estimada y stock sugerido de un producto según sus salidas recientes."""
+    
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='pronostico')
+    
+    # Demanda diaria (unidades) en la ventana analizada
+    demanda_diaria = models.FloatField(default=0)
+    desviacion_diaria = models.FloatField(default=0)
+    
+    # Sugerencias; el mínimo sugerido es el punto de reorden
+    stock_seguridad = models.PositiveIntegerField(default=0)
+    stock_minimo_sugerido = models.PositiveIntegerField(default=0)
+    stock_maximo_sugerido = models.PositiveIntegerField(default=0)
+    dias_para_quiebre = models.FloatField(null=True, blank=True)  # None si no hay demanda
+    
+    # Parámetros usados
+    dias_analizados = models.PositiveIntegerField(default=0)
+    dias_reposicion = models.PositiveIntegerField(default=0)
+    nivel_servicio = models.FloatField(default=0)
+    calculado_en = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = "Pronóstico de Stock"
+        verbose_name_plural = "Pronósticos de Stock"
+    
+    def __str__(self):
+        return f"{self.producto_id} - mínimo sugerido {self.stock_minimo_sugerido}"
@@ -0,0 +1,235 @@
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En lugar de OFFSET, cada página se pide "después" o "antes" de la última
+fila vista, comparando por las columnas del orden. Con un índice sobre esas
+columnas el costo de cada página no depende del tamaño de la tabla.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+
+class PaginaKeyset:
+    """Resultado de una página: objetos y cursores para navegar."""
+
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+class TotalAproximado:
+    """Total de filas que puede ser exacto, acotado o estimado."""
+
+    def __init__(self, valor, exacto=True, acotado=False):
+        self.valor = valor
+        self.exacto = exacto
+        self.acotado = acotado
+
+    def __str__(self):
+        if self.exacto:
+            return str(self.valor)
+        if self.acotado:
+            return f"{self.valor}+"
+        return f"~{self.valor}"
+
+
+def _campos_orden(orden):
+    """Convierte ('-fecha', 'id') en [('fecha', True), ('id', False)]."""
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+
+
+def codificar_cursor(objeto, orden):
+    """Codifica los valores de orden de un objeto como token para la URL."""
+    valores = []
+    for nombre, _ in _campos_orden(orden):
+        campo = objeto._meta.get_field(nombre)
+        valores.append(campo.value_to_string(objeto))
+    datos = json.dumps(valores, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+
+def decodificar_cursor(token, modelo, orden):
+    """Devuelve los valores de orden del cursor, o None si es inválido."""
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+        campos = _campos_orden(orden)
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return [
+            modelo._meta.get_field(nombre).to_python(valor)
+            for (nombre, _), valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _filtro_keyset(orden, valores, hacia_atras=False):
+    """Construye el Q lexicográfico (a, b) > (x, y) respetando el sentido."""
+    filtro = Q()
+    iguales = Q()
+    for (nombre, descendente), valor in zip(_campos_orden(orden), valores):
+        lookup = f"{nombre}__gt" if descendente == hacia_atras else f"{nombre}__lt"
+        filtro |= iguales & Q(**{lookup: valor})
+        iguales &= Q(**{nombre: valor})
+    return filtro
+
+
+def _invertir_orden(orden):
+    return [campo[1:] if campo.startswith('-') else f"-{campo}" for campo in orden]
+
+
+def paginar_keyset(queryset, orden, despues=None, antes=None, por_pagina=50):
+    """
+    Pagina un queryset por cursor.
+
+    `orden` debe terminar en una columna única (normalmente 'id') para que
+    el orden sea total. `despues` y `antes` son tokens de codificar_cursor.
+    """
+    modelo = queryset.model
+    orden = list(orden)
+    hacia_atras = False
+
+    if despues:
+        valores = decodificar_cursor(despues, modelo, orden)
+        if valores is not None:
+            queryset = queryset.filter(_filtro_keyset(orden, valores))
+    elif antes:
+        valores = decodificar_cursor(antes, modelo, orden)
+        if valores is not None:
+            queryset = queryset.filter(_filtro_keyset(orden, valores, hacia_atras=True))
+            hacia_atras = True
+
+    if hacia_atras:
+        objetos = list(queryset.order_by(*_invertir_orden(orden))[:por_pagina + 1])
+    else:
+        objetos = list(queryset.order_by(*orden)[:por_pagina + 1])
+
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+
+    if hacia_atras:
+        objetos.reverse()
+        cursor_anterior = codificar_cursor(objetos[0], orden) if hay_mas and objetos else None
+        cursor_siguiente = codificar_cursor(objetos[-1], orden) if objetos else None
+    else:
+        cursor_siguiente = codificar_cursor(objetos[-1], orden) if hay_mas else None
+        cursor_anterior = codificar_cursor(objetos[0], orden) if despues and objetos else None
+
+    return PaginaKeyset(objetos, cursor_siguiente, cursor_anterior)
+
+
+def iterar_keyset(queryset, orden, campos, tamano_lote=2000):
+    """
+    Genera las tuplas values_list(*campos) del queryset completo, en `orden`.
+
+    Recorre por lotes con el mismo filtro por cursor que paginar_keyset: cada
+    lote es una consulta corta, así que no queda un cursor abierto durante
+    toda la exportación y la memoria no depende del total (MySQLdb trae el
+    resultado completo al cliente aunque se use .iterator()). Las columnas
+    del orden no pueden ser nulas.
+    """
+    orden = list(orden)
+    campos = list(campos)
+    nombres = [nombre for nombre, _ in _campos_orden(orden)]
+    columnas = campos + [nombre for nombre in nombres if nombre not in campos]
+    posiciones = [columnas.index(nombre) for nombre in nombres]
+    cantidad = len(campos)
+    valores = None
+
+    while True:
+        lote = queryset if valores is None else queryset.filter(_filtro_keyset(orden, valores))
+        filas = list(lote.order_by(*orden).values_list(*columnas)[:tamano_lote])
+        for fila in filas:
+            yield fila[:cantidad]
+        if len(filas) < tamano_lote:
+            return
+        valores = [filas[-1][posicion] for posicion in posiciones]
+
+
+def paginar_ranking(queryset, ranking, despues=None, antes=None, por_pagina=50):
+    """
+    Pagina resultados que vienen ordenados por relevancia.
+
+    `ranking` es la lista acotada de ids en orden de relevancia; los cursores
+    son posiciones dentro de esa lista después de aplicar los filtros del
+    queryset. Devuelve la página y el total de coincidencias.
+    """
+    visibles = set(queryset.filter(pk__in=ranking).values_list('pk', flat=True))
+    ids = [pk for pk in ranking if pk in visibles]
+
+    try:
+        if despues:
+            inicio = max(int(despues), 0)
+        elif antes:
+            inicio = max(int(antes) - por_pagina, 0)
+        else:
+            inicio = 0
+    except ValueError:
+        inicio = 0
+
+    ids_pagina = ids[inicio:inicio + por_pagina]
+    por_id = queryset.in_bulk(ids_pagina)
+    objetos = [por_id[pk] for pk in ids_pagina if pk in por_id]
+
+    cursor_siguiente = str(inicio + por_pagina) if inicio + por_pagina < len(ids) else None
+    cursor_anterior = str(inicio) if inicio > 0 else None
+    return PaginaKeyset(objetos, cursor_siguiente, cursor_anterior), len(ids)
+
+
+def _estimar_filas_tabla(modelo):
+    """Lee el número de filas estimado de las estadísticas del motor."""
+    tabla = modelo._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = (
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        )
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tabla])
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+def total_aproximado(queryset, tope=1000):
+    """
+    Cuenta filas sin recorrer toda la tabla.
+
+    Sin filtros usa las estadísticas del motor; con filtros cuenta como
+    máximo `tope` + 1 filas y reporta "tope+" si hay más.
+    """
+    if not queryset.query.has_filters():
+        estimado = _estimar_filas_tabla(queryset.model)
+        if estimado is not None and estimado > tope:
+            return TotalAproximado(estimado, exacto=False)
+
+    cantidad = queryset.order_by().values('pk')[:tope + 1].count()
+    if cantidad > tope:
+        return TotalAproximado(tope, exacto=False, acotado=True)
+    return TotalAproximado(cantidad)
@@ -0,0 +1,191 @@
+"""
+Actualización masiva de precios.
+
+El precio nuevo se calcula en la base de datos con una expresión (porcentaje,
+monto fijo o precio de compra más margen) y se aplica con un UPDATE por lote
+de ids. Antes de cada UPDATE se bloquean las filas del lote y los precios
+anteriores y nuevos se copian a HistorialPrecio con un INSERT ... SELECT.
+Si algún precio nuevo no cabe en la columna, no se aplica nada.
+"""
+from decimal import Decimal
+
+from django import forms
+from django.db import connection, transaction
+from django.db.models import (
+    CharField, DateTimeField, DecimalField, ExpressionWrapper, F, IntegerField, Max, Sum, Value,
+)
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from . import autocompletar
+from .models import Producto, HistorialPrecio, ValoracionInventario
+
+TAMANO_LOTE = 2000
+MUESTRA_PREVIA = 20
+
+CAMPOS_PRECIO = [
+    ('precio_venta', 'Precio de venta'),
+    ('precio_compra', 'Precio de compra'),
+]
+OPERACIONES = [
+    ('porcentaje', 'Variación porcentual'),
+    ('monto', 'Monto fijo'),
+    ('margen', 'Recalcular desde el margen de ganancia'),
+]
+
+_PRECIO = DecimalField(max_digits=10, decimal_places=2)
+# Mayor precio que cabe en las columnas de precio (y de HistorialPrecio)
+PRECIO_MAXIMO = Decimal(10) ** (_PRECIO.max_digits - _PRECIO.decimal_places) - Decimal('0.01')
+
+
+def expresion_precio(operacion, campo, valor):
+    """Expresión SQL con el precio nuevo de `campo`, redondeado y nunca negativo."""
+    if operacion == 'margen':
+        # El margen define el precio de venta a partir del de compra
+        nuevo = F('precio_compra') * (Value(Decimal('1')) + F('margen_ganancia') * Value(Decimal('0.01')))
+    elif operacion == 'porcentaje':
+        nuevo = F(campo) * Value(Decimal('1') + Decimal(valor) / Decimal('100'))
+    elif operacion == 'monto':
+        nuevo = F(campo) + Value(Decimal(valor))
+    else:
+        raise ValueError(f'Operación desconocida: {operacion}')
+    return Greatest(
+        Round(ExpressionWrapper(nuevo, output_field=_PRECIO), 2, output_field=_PRECIO),
+        Value(Decimal('0')),
+        output_field=_PRECIO,
+    )
+
+
+def productos_a_actualizar(categoria=None, proveedor=None, solo_activos=True):
+    productos = Producto.objects.all()
+    if categoria is not None:
+        productos = productos.filter(categoria=categoria)
+    if proveedor is not None:
+        productos = productos.filter(proveedor=proveedor)
+    if solo_activos:
+        productos = productos.filter(activo=True)
+    return productos
+
+
+def validar_rango(productos, nuevo):
+    """Falla si algún precio nuevo no cabe en la columna, antes de escribir nada."""
+    maximo = productos.aggregate(maximo=Max(nuevo))['maximo']
+    if maximo is not None and maximo > PRECIO_MAXIMO:
+        raise forms.ValidationError(
+            f'El cambio deja precios de hasta {maximo:,.2f} y el máximo admitido es {PRECIO_MAXIMO:,.2f}.'
+        )
+
+
+def previsualizar(productos, operacion, campo, valor, muestra=MUESTRA_PREVIA):
+    """Resultado del cambio sin aplicarlo: totales y una muestra de productos."""
+    if operacion == 'margen':
+        campo = 'precio_venta'
+    nuevo = expresion_precio(operacion, campo, valor)
+    validar_rango(productos, nuevo)
+    totales = productos.aggregate(anterior=Sum(campo), nuevo=Sum(nuevo))
+    centavos = Decimal('0.01')
+    return {
+        'campo': campo,
+        'total_productos': productos.count(),
+        'suma_anterior': (totales['anterior'] or Decimal('0')).quantize(centavos),
+        'suma_nueva': (totales['nuevo'] or Decimal('0')).quantize(centavos),
+        'muestra': list(
+            productos.annotate(precio_nuevo=nuevo)
+            .order_by('pk')
+            .values('pk', 'codigo', 'nombre', campo, 'precio_nuevo')[:muestra]
+        ),
+    }
+
+
+def _insertar_historial(lote, campo, nuevo, usuario, motivo, fecha):
+    """
+    INSERT ... SELECT de los precios anteriores y nuevos del lote, antes del
+    UPDATE y sin traer las filas a Python. Devuelve cuántas filas insertó.
+    """
+    nuevos = {
+        'compra_nueva': nuevo if campo == 'precio_compra' else F('precio_compra'),
+        'venta_nueva': nuevo if campo == 'precio_venta' else F('precio_venta'),
+    }
+    seleccion = (
+        lote.annotate(
+            **nuevos,
+            motivo_historial=Value(motivo, output_field=CharField()),
+            usuario_historial=Value(usuario.pk if usuario else None, output_field=IntegerField()),
+            fecha_historial=Value(fecha, output_field=DateTimeField()),
+        )
+        .exclude(**{('compra_nueva' if campo == 'precio_compra' else 'venta_nueva'): F(campo)})
+        .order_by()
+        .values(
+            'pk', 'precio_compra', 'precio_venta', 'compra_nueva', 'venta_nueva',
+            'motivo_historial', 'usuario_historial', 'fecha_historial',
+        )
+    )
+    destino = {
+        'id': 'producto_id',
+        'precio_compra': 'precio_compra_anterior',
+        'precio_venta': 'precio_venta_anterior',
+        'compra_nueva': 'precio_compra_nuevo',
+        'venta_nueva': 'precio_venta_nuevo',
+        'motivo_historial': 'motivo',
+        'usuario_historial': 'usuario_id',
+        'fecha_historial': 'fecha',
+    }
+    compilador = seleccion.query.get_compiler(using=seleccion.db)
+    sql, params = compilador.as_sql()
+    # Columnas de destino en el orden en que el SELECT compilado trae cada valor
+    # (Django pone los campos antes que las anotaciones, no en el orden de values())
+    columnas = [
+        destino[alias or expresion.target.attname] for expresion, _, alias in compilador.select
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO %s (%s) %s' % (
+                connection.ops.quote_name(HistorialPrecio._meta.db_table),
+                ', '.join(connection.ops.quote_name(columna) for columna in columnas),
+                sql,
+            ),
+            params,
+        )
+        return cursor.rowcount
+
+
+def aplicar(productos, operacion, campo, valor, usuario=None, motivo='', tamano_lote=TAMANO_LOTE):
+    """
+    Aplica el cambio por lotes; devuelve cuántos productos cambiaron de precio.
+    Lanza ValidationError si algún precio nuevo no cabe en la columna.
+    """
+    if operacion == 'margen':
+        campo = 'precio_venta'
+    nuevo = expresion_precio(operacion, campo, valor)
+    validar_rango(productos, nuevo)
+    motivo = motivo or dict(OPERACIONES)[operacion]
+    ultimo = 0
+    cambiados = 0
+
+    while True:
+        ids = list(
+            productos.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:tamano_lote]
+        )
+        if not ids:
+            break
+        ultimo = ids[-1]
+        lote = Producto.objects.filter(pk__in=ids)
+
+        with transaction.atomic():
+            # Bloquea el lote para que historial, valorización y UPDATE vean los mismos precios
+            list(lote.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+            if campo == 'precio_compra':
+                ValoracionInventario.ajustar(dict(lote.annotate(diferencia=ExpressionWrapper(
+                    F('stock_actual') * (nuevo - F('precio_compra')),
+                    output_field=DecimalField(max_digits=18, decimal_places=2),
+                )).values_list('pk', 'diferencia')))
+
+            ahora = timezone.now()
+            cambiados += _insertar_historial(lote, campo, nuevo, usuario, motivo, ahora)
+            lote.update(**{campo: nuevo}, updated_at=ahora)
+
+    if cambiados and campo == 'precio_venta':
+        # El autocompletado muestra el precio de venta
+        autocompletar.invalidar_indice()
+    return cambiados
@@ -0,0 +1,141 @@
+"""
+Pronóstico de demanda y stock sugerido por producto.
+
+calcular_pronosticos() carga en arreglos de NumPy las salidas de los últimos
+días, las suma por producto y día y calcula para todo el catálogo a la vez:
+
+- demanda diaria media y su desviación (los días sin salidas cuentan como 0);
+- stock de seguridad = z * desviación * sqrt(días de reposición);
+- mínimo sugerido (punto de reorden) = demanda * días de reposición + seguridad;
+- máximo sugerido = mínimo + demanda * días de cobertura;
+- días para quiebre = stock actual / demanda.
+
+z sale del nivel de servicio pedido (distribución normal).
+"""
+import math
+from datetime import datetime, time, timedelta
+from statistics import NormalDist
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Producto, MovimientoInventario, PronosticoStock
+
+DIAS_ANALIZADOS = 90
+DIAS_REPOSICION = 7
+DIAS_COBERTURA = 30
+NIVEL_SERVICIO = 0.95
+TAMANO_LOTE = 5000
+
+
+def _cargar_salidas(desde, hasta):
+    """Arreglos (producto_id, segundos desde `desde`, cantidad) de las salidas del período."""
+    import numpy as np
+
+    filas = (
+        MovimientoInventario.objects.filter(tipo='salida', fecha__gte=desde, fecha__lt=hasta)
+        .values_list('producto_id', 'fecha', 'cantidad')
+        .order_by()
+    )
+    inicio = desde.timestamp()
+    producto_ids = []
+    segundos = []
+    cantidades = []
+    for producto_id, fecha, cantidad in filas.iterator(chunk_size=20000):
+        producto_ids.append(producto_id)
+        segundos.append(fecha.timestamp() - inicio)
+        cantidades.append(cantidad)
+    return (
+        np.array(producto_ids, dtype=np.int64),
+        np.array(segundos, dtype=np.float64),
+        np.array(cantidades, dtype=np.float64),
+    )
+
+
+def _guardar(filas):
+    """Reemplaza todos los pronósticos por `filas` en una transacción."""
+    tabla = connection.ops.quote_name(PronosticoStock._meta.db_table)
+    columnas = [
+        'producto_id', 'demanda_diaria', 'desviacion_diaria', 'stock_seguridad',
+        'stock_minimo_sugerido', 'stock_maximo_sugerido', 'dias_para_quiebre',
+        'dias_analizados', 'dias_reposicion', 'nivel_servicio', 'calculado_en',
+    ]
+    # INSERT directo con executemany: con 100k filas, armar cada
+    # instancia y compilar bulk_create cuesta más que el cálculo completo
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        tabla,
+        ', '.join(connection.ops.quote_name(columna) for columna in columnas),
+        ', '.join(['%s'] * len(columnas)),
+    )
+    with transaction.atomic():
+        PronosticoStock.objects.all().delete()
+        with connection.cursor() as cursor:
+            for inicio in range(0, len(filas), TAMANO_LOTE):
+                cursor.executemany(sql, filas[inicio:inicio + TAMANO_LOTE])
+
+
+def calcular_pronosticos(dias=DIAS_ANALIZADOS, dias_reposicion=DIAS_REPOSICION,
+                         dias_cobertura=DIAS_COBERTURA, nivel_servicio=NIVEL_SERVICIO):
+    """Recalcula PronosticoStock para los productos activos; devuelve cuántos guardó."""
+    if not 0 < nivel_servicio < 1:
+        raise ValueError('El nivel de servicio debe estar entre 0 y 1, sin incluirlos.')
+    import numpy as np
+
+    ahora = timezone.now()
+    hoy = timezone.localdate(ahora)
+    inicio = hoy - timedelta(days=dias)
+    desde = timezone.make_aware(datetime.combine(inicio, time.min))
+    hasta = timezone.make_aware(datetime.combine(hoy, time.min))
+
+    productos = list(
+        Producto.objects.filter(activo=True).exclude(tipo='servicio')
+        .order_by('pk')
+        .values_list('pk', 'stock_actual')
+    )
+    if not productos:
+        return 0
+    ids = np.fromiter((pk for pk, _ in productos), dtype=np.int64, count=len(productos))
+    stock = np.fromiter((s for _, s in productos), dtype=np.float64, count=len(productos))
+
+    salida_ids, segundos, cantidades = _cargar_salidas(desde, hasta)
+
+    # Posición de cada salida en `ids` (ordenado); se descartan productos inactivos
+    posiciones = np.minimum(np.searchsorted(ids, salida_ids), len(ids) - 1)
+    validas = ids[posiciones] == salida_ids
+    posiciones = posiciones[validas]
+    indices_dia = np.minimum((segundos[validas] // 86400).astype(np.int64), dias - 1)
+    cantidades = cantidades[validas]
+
+    # Total por (producto, día) para la varianza diaria
+    claves, inversa = np.unique(posiciones * dias + indices_dia, return_inverse=True)
+    por_dia = np.bincount(inversa, weights=cantidades)
+    posiciones = claves // dias
+
+    suma = np.bincount(posiciones, weights=por_dia, minlength=len(ids))
+    suma_cuadrados = np.bincount(posiciones, weights=por_dia ** 2, minlength=len(ids))
+
+    demanda = suma / dias
+    varianza = np.maximum(suma_cuadrados / dias - demanda ** 2, 0.0)
+    desviacion = np.sqrt(varianza)
+
+    z = NormalDist().inv_cdf(nivel_servicio)
+    seguridad = np.ceil(z * desviacion * np.sqrt(dias_reposicion))
+    minimo = np.ceil(demanda * dias_reposicion) + seguridad
+    maximo = minimo + np.ceil(demanda * dias_cobertura)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_quiebre = np.where(demanda > 0, stock / demanda, np.nan)
+
+    calculado_en = connection.ops.adapt_datetimefield_value(ahora)
+    filas = [
+        (
+            pk, round(dem, 4), round(desv, 4), int(seg), int(mini), int(maxi),
+            None if math.isnan(quiebre) else round(quiebre, 1),
+            dias, dias_reposicion, nivel_servicio, calculado_en,
+        )
+        for pk, dem, desv, seg, mini, maxi, quiebre in zip(
+            ids.tolist(), demanda.tolist(), desviacion.tolist(), seguridad.tolist(),
+            minimo.tolist(), maximo.tolist(), dias_quiebre.tolist(),
+        )
+    ]
+    _guardar(filas)
+    return len(filas)
@@ -0,0 +1,121 @@
+"""
+Saldos diarios de inventario.
+
+consolidar_saldos() recorre solo los movimientos nuevos (id mayor a la última
+marca consolidada) y guarda, por producto y día, el stock al cierre. Con eso
+stock_en_fecha() responde con el saldo más cercano y los pocos movimientos
+posteriores, sin recorrer el historial completo.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Producto, MovimientoInventario, SaldoInventario
+
+TAMANO_LOTE = 5000
+
+# Los movimientos más recientes que esto se dejan para la próxima corrida,
+# para no saltar transacciones que aún no confirman
+MARGEN_CONSOLIDACION = timedelta(minutes=5)
+
+
+def _inicio_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def ultima_marca():
+    """Id del último movimiento ya consolidado."""
+    return SaldoInventario.objects.aggregate(marca=Max('ultimo_movimiento_id'))['marca'] or 0
+
+
+def consolidar_saldos(tamano_lote=TAMANO_LOTE, margen=MARGEN_CONSOLIDACION):
+    """Consolida los movimientos nuevos en SaldoInventario; devuelve cuántos procesó."""
+    marca = ultima_marca()
+    hasta = timezone.now() - margen
+    procesados = 0
+    unique_fields = (
+        ['producto', 'fecha'] if connection.features.supports_update_conflicts_with_target else None
+    )
+
+    while True:
+        lote = list(
+            MovimientoInventario.objects.filter(pk__gt=marca, fecha__lt=hasta)
+            .order_by('pk')
+            .values_list('pk', 'producto_id', 'fecha', 'stock_nuevo')[:tamano_lote]
+        )
+        if not lote:
+            break
+
+        cierres = {}
+        for pk, producto_id, fecha, stock_nuevo in lote:
+            # Ordenados por id: el último de cada día queda como cierre
+            cierres[(producto_id, timezone.localdate(fecha))] = (pk, stock_nuevo)
+
+        with transaction.atomic():
+            SaldoInventario.objects.bulk_create(
+                [
+                    SaldoInventario(
+                        producto_id=producto_id,
+                        fecha=dia,
+                        stock=stock,
+                        ultimo_movimiento_id=pk,
+                    )
+                    for (producto_id, dia), (pk, stock) in cierres.items()
+                ],
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=['stock', 'ultimo_movimiento_id'],
+            )
+
+        marca = lote[-1][0]
+        procesados += len(lote)
+
+    return procesados
+
+
+def stock_en_fecha(producto_id, fecha):
+    """
+    Stock de un producto al cierre de `fecha` (date) o en un instante (datetime).
+
+    Toma el saldo consolidado más cercano anterior y aplica solo los
+    movimientos posteriores al último que incluye ese saldo. El saldo de un
+    día puede ser parcial (la consolidación corre durante el día), así que
+    se sigue desde su último movimiento y no desde el día siguiente.
+    """
+    if isinstance(fecha, datetime):
+        limite = {'fecha__lte': fecha}
+        ultimo_dia_saldo = timezone.localdate(fecha) - timedelta(days=1)
+    else:
+        limite = {'fecha__lt': _inicio_dia(fecha + timedelta(days=1))}
+        ultimo_dia_saldo = fecha
+
+    saldo = (
+        SaldoInventario.objects.filter(producto_id=producto_id, fecha__lte=ultimo_dia_saldo)
+        .order_by('-fecha')
+        .values_list('stock', 'ultimo_movimiento_id')
+        .first()
+    )
+
+    posteriores = MovimientoInventario.objects.filter(producto_id=producto_id, **limite)
+    if saldo:
+        posteriores = posteriores.filter(pk__gt=saldo[1])
+    ultimo = posteriores.order_by('-fecha', '-pk').values_list('stock_nuevo', flat=True).first()
+    if ultimo is not None:
+        return ultimo
+    if saldo:
+        return saldo[0]
+
+    # Sin historial anterior: el stock previo al primer movimiento posterior
+    siguiente = (
+        MovimientoInventario.objects.filter(producto_id=producto_id)
+        .exclude(**limite)
+        .order_by('fecha', 'pk')
+        .values_list('stock_anterior', flat=True)
+        .first()
+    )
+    if siguiente is not None:
+        return siguiente
+
+    return Producto.objects.filter(pk=producto_id).values_list('stock_actual', flat=True).first()
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from erp_system import imagenes
+
+from . import alertas, autocompletar, busqueda
+from .models import Producto, ValoracionInventario
+
+
+@receiver(pre_save, sender=Producto)
+def producto_por_guardar(sender, instance, **kwargs):
+    imagenes.invalidar_hash(instance, 'imagen', 'imagen_hash')
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, update_fields=None, **kwargs):
+    # Los índices en memoria solo se tocan si cambió un campo que usan
+    cambiados = instance.indexados_cambiados(update_fields)
+    if cambiados & busqueda.CAMPOS_INDICE:
+        transaction.on_commit(lambda: busqueda.actualizar_producto(instance))
+    if cambiados & autocompletar.CAMPOS_INDICE:
+        transaction.on_commit(lambda: autocompletar.actualizar_producto(instance))
+    alertas.invalidar_conteos()
+    imagenes.encolar(instance, 'imagen', 'imagen_hash')
+
+
+@receiver(pre_delete, sender=Producto)
+def producto_por_eliminar(sender, instance, **kwargs):
+    # El valor que se descuenta es el guardado, no el de la instancia (puede estar desactualizada)
+    instance._valor_guardado = (
+        Producto.objects.select_for_update().filter(pk=instance.pk)
+        .values_list('stock_actual', 'precio_compra').first()
+    )
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    pk = instance.pk
+    stock, precio = getattr(instance, '_valor_guardado', None) or (instance.stock_actual, instance.precio_compra)
+    ValoracionInventario.ajustar({pk: -stock * precio})
+    transaction.on_commit(lambda: busqueda.quitar_producto(pk))
+    transaction.on_commit(lambda: autocompletar.quitar_producto(pk))
+    alertas.invalidar_conteos()
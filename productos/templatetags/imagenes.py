@@ -0,0 +1,37 @@
+from django import template
+from django.forms.utils import flatatt
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from erp_system.imagenes import TAMANOS, ruta_derivado
+
+register = template.Library()
+
+@register.simple_tag
+def miniatura_url(archivo, hash_contenido, tamano='sm', formato='webp'):
+    """URL del derivado de una imagen; si aún no existe, la del original"""
+    if not archivo:
+        return ''
+    if not hash_contenido or tamano not in TAMANOS:
+        return archivo.url
+    return default_storage.url(ruta_derivado(archivo.name, hash_contenido, tamano, formato))
+
+@register.simple_tag
+def miniatura(archivo, hash_contenido, tamano='sm', class_name='', **kwargs):
+    """Elemento <picture> con la miniatura WebP y JPEG de respaldo"""
+    if not archivo:
+        return ''
+    attrs = {key: value for key, value in kwargs.items() if value is not None}
+    if class_name:
+        attrs['class'] = class_name
+    attrs.setdefault('loading', 'lazy')
+
+    if not hash_contenido or tamano not in TAMANOS:
+        return format_html('<img src="{}"{}>', archivo.url, flatatt(attrs))
+
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"><img src="{}"{}></picture>',
+        miniatura_url(archivo, hash_contenido, tamano, 'webp'),
+        miniatura_url(archivo, hash_contenido, tamano, 'jpg'),
+        flatatt(attrs),
+    )
@@ -1,3 +1,321 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django import forms
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import precios
+from .importacion import importar_productos
+from .indices import IndiceCompartido
+from .inventario import registrar_movimientos
+from .models import (
+    Categoria, HistorialPrecio, MovimientoInventario, Producto, ValoracionInventario, VALOR_INVENTARIO,
+)
+from .saldos import consolidar_saldos, stock_en_fecha
+
+
+class EdicionProductoStockTests(TestCase):
+    """Editar un producto no debe pisar los movimientos registrados mientras el formulario estaba abierto."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bodega', password='clave')
+        self.client.force_login(self.usuario)
+        self.producto = Producto.objects.create(
+            codigo='P-001', nombre='Cable', precio_compra=100, precio_venta=150,
+            stock_actual=10, stock_minimo=2, stock_maximo=50,
+        )
+
+    def datos_formulario(self, respuesta):
+        """Valores que el navegador enviaría con el formulario tal como se mostró."""
+        form = respuesta.context['form']
+        datos = {}
+        for nombre in form.fields:
+            valor = form[nombre].value()
+            if valor is True:
+                datos[nombre] = 'on'
+            elif valor is not None and valor is not False and nombre != 'imagen':
+                datos[nombre] = valor
+        return datos
+
+    def test_formulario_de_edicion_no_trae_stock(self):
+        respuesta = self.client.get(reverse('productos:edit', args=[self.producto.pk]))
+        self.assertNotIn('stock_actual', respuesta.context['form'].fields)
+
+    def test_movimiento_entre_get_y_post_se_conserva(self):
+        url = reverse('productos:edit', args=[self.producto.pk])
+        datos = self.datos_formulario(self.client.get(url))
+
+        # Otro usuario registra una entrada con el formulario abierto
+        self.client.post(reverse('productos:movimiento_create', args=[self.producto.pk]), {
+            'tipo': 'entrada', 'cantidad': 5, 'motivo': 'Compra',
+        })
+
+        # Un formulario viejo que todavía mande el stock mostrado no lo cambia
+        datos.update(nombre='Cable UTP', stock_actual=10)
+        respuesta = self.client.post(url, datos)
+        self.assertRedirects(respuesta, reverse('productos:detail', args=[self.producto.pk]),
+                             fetch_redirect_response=False)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.nombre, 'Cable UTP')
+        self.assertEqual(self.producto.stock_actual, 15)
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(producto=self.producto).values_list('tipo', 'stock_nuevo')),
+            [('entrada', 15)],
+        )
+
+
+class ValoracionInventarioTests(TestCase):
+    """El total repartido en franjas sigue al valor calculado desde los productos."""
+
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(
+                codigo=f'V-{numero}', nombre=f'Producto {numero}',
+                precio_compra=10 + numero, precio_venta=100, stock_actual=numero,
+            )
+            for numero in range(ValoracionInventario.FRANJAS * 2)
+        ]
+
+    def assertTotalCorrecto(self):
+        esperado = Producto.objects.aggregate(total=Sum(VALOR_INVENTARIO))['total'] or Decimal('0')
+        self.assertEqual(ValoracionInventario.total(), esperado)
+
+    def test_movimientos_precios_y_eliminacion(self):
+        self.assertTotalCorrecto()
+        registrar_movimientos([
+            MovimientoInventario(producto_id=producto.pk, tipo='entrada', cantidad=3, motivo='Compra')
+            for producto in self.productos
+        ])
+        self.assertTotalCorrecto()
+
+        # Instancias desactualizadas: el stock en memoria ya no es el guardado
+        self.productos[1].precio_compra = Decimal('99')
+        self.productos[1].save(update_fields=['precio_compra'])
+        self.productos[2].delete()
+        self.assertTotalCorrecto()
+
+        ValoracionInventario.objects.filter(pk=1).delete()
+        self.assertTotalCorrecto()
+
+    def test_guardar_sin_stock_ni_precio_no_bloquea(self):
+        producto = self.productos[0]
+        producto.nombre = 'Renombrado'
+        with self.assertNumQueries(1):
+            producto.save(update_fields=['nombre'])
+
+
+class IndiceCompartidoTests(TestCase):
+    """Dos copias con la misma clave hacen de dos procesos que comparten la base de datos."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='I-1', nombre='Cable', precio_venta=10)
+        self.construcciones = 0
+        self.proceso_a = self.indice(intervalo=0)
+        self.proceso_b = self.indice(intervalo=0)
+
+    def indice(self, intervalo):
+        def construir():
+            self.construcciones += 1
+            return dict(Producto.objects.values_list('pk', 'nombre'))
+
+        def actualizar(indice, ids):
+            for pk in ids:
+                indice.pop(pk, None)
+            indice.update(Producto.objects.filter(pk__in=ids).values_list('pk', 'nombre'))
+
+        return IndiceCompartido('prueba', construir, actualizar, intervalo=intervalo)
+
+    def test_cambio_de_otro_proceso_se_aplica_sin_reconstruir(self):
+        indice_a = self.proceso_a.obtener()
+        self.proceso_b.obtener()
+        Producto.objects.filter(pk=self.producto.pk).update(nombre='Cable UTP')
+        self.proceso_b.registrar([self.producto.pk])
+
+        self.assertIs(self.proceso_a.obtener(), indice_a)
+        self.assertEqual(indice_a, {self.producto.pk: 'Cable UTP'})
+        self.assertEqual(self.construcciones, 2)
+
+    def test_invalidar_reconstruye_en_los_demas(self):
+        self.proceso_a.obtener()
+        self.proceso_b.invalidar()
+        self.proceso_a.obtener()
+        self.assertEqual(self.construcciones, 2)
+
+    def test_consultas_dentro_del_intervalo_no_leen_la_base(self):
+        proceso = self.indice(intervalo=60)
+        proceso.obtener()
+        with self.assertNumQueries(0):
+            proceso.obtener()
+
+    def test_solo_los_campos_indexados_registran_cambios(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock_minimo = 5
+        self.assertEqual(producto.indexados_cambiados(), set())
+        producto.nombre = 'Cable UTP'
+        self.assertEqual(producto.indexados_cambiados(), {'nombre'})
+        self.assertEqual(producto.indexados_cambiados(['stock_minimo']), set())
+
+class ImportacionProductosTests(TestCase):
+
+    def setUp(self):
+        Categoria.objects.create(nombre='Cables')
+        self.producto = Producto.objects.create(
+            codigo='P-001', nombre='Cable', precio_compra=100, precio_venta=150, stock_actual=10,
+        )
+
+    def fila(self, **valores):
+        fila = dict.fromkeys(['categoria', 'precio_compra', 'precio_venta'], '')
+        fila.update({'codigo': 'P-001', 'nombre': 'Cable', **valores})
+        return fila
+
+    def test_precio_vacio_conserva_el_guardado(self):
+        valor_anterior = ValoracionInventario.total()
+        resultado = importar_productos([self.fila(nombre='Cable UTP', precio_venta='180')])
+        self.assertEqual((resultado.actualizados, resultado.total_errores), (1, 0))
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.nombre, 'Cable UTP')
+        self.assertEqual(self.producto.precio_compra, Decimal('100'))
+        self.assertEqual(self.producto.precio_venta, Decimal('180'))
+        self.assertEqual(ValoracionInventario.total(), valor_anterior)
+
+    def test_precio_vacio_se_valida_con_el_guardado(self):
+        resultado = importar_productos([self.fila(precio_venta='90')])
+        self.assertEqual((resultado.actualizados, resultado.total_errores), (0, 1))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.precio_venta, Decimal('150'))
+
+    def test_numeros_invalidos_se_rechazan_por_fila(self):
+        filas = [
+            self.fila(codigo=f'N-{numero}', **valores)
+            for numero, valores in enumerate([
+                {'precio_compra': 'NaN'},
+                {'precio_compra': '1e30'},
+                {'precio_venta': '123456789'},
+                {'stock_actual': 'Infinity'},
+                {'stock_actual': 'nan'},
+                {'stock_minimo': '99999999999'},
+            ])
+        ]
+        filas.append(self.fila(codigo='N-ok', precio_compra='1', precio_venta='99999999.99'))
+        resultado = importar_productos(filas)
+        self.assertEqual((resultado.creados, resultado.total_errores), (1, 6))
+
+    def test_archivo_ilegible(self):
+        usuario = User.objects.create_user('bodega', password='clave')
+        self.client.force_login(usuario)
+        archivo = SimpleUploadedFile('productos.csv', 'codigo;nombre\nP-9;Cámara\n'.encode('latin-1'))
+        respuesta = self.client.post(reverse('productos:importar'), {'archivo': archivo}, follow=True)
+        self.assertEqual(respuesta.status_code, 200)
+        mensajes = [str(mensaje) for mensaje in respuesta.context['messages']]
+        self.assertTrue(any(mensaje.startswith('No se pudo leer el archivo') for mensaje in mensajes), mensajes)
+
+    def test_categoria_inexistente(self):
+        resultado = importar_productos([self.fila(categoria='Conectores')])
+        self.assertEqual(resultado.total_errores, 1)
+        self.assertFalse(Categoria.objects.filter(nombre='Conectores').exists())
+
+        resultado = importar_productos([self.fila(categoria='Conectores')], crear_categorias=True)
+        self.assertEqual(resultado.total_errores, 0)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.categoria.nombre, 'Conectores')
+
+
+class StockEnFechaTests(TestCase):
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='S-1', nombre='Cable', precio_compra=10, precio_venta=20)
+
+    def mover(self, tipo, cantidad):
+        registrar_movimientos([
+            MovimientoInventario(producto_id=self.producto.pk, tipo=tipo, cantidad=cantidad, motivo='Prueba')
+        ])
+
+    def test_movimiento_despues_de_consolidar_el_mismo_dia(self):
+        self.mover('entrada', 10)
+        consolidar_saldos(margen=timedelta(0))
+        # El saldo de hoy queda parcial: este movimiento no está consolidado
+        self.mover('salida', 3)
+
+        self.assertEqual(stock_en_fecha(self.producto.pk, timezone.localdate()), 7)
+        self.assertEqual(stock_en_fecha(self.producto.pk, timezone.now()), 7)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class HashImagenTests(TestCase):
+    """Al reemplazar la imagen no se siguen mostrando los derivados de la anterior."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            codigo='P-001', nombre='Cable', precio_compra=100, precio_venta=150,
+            imagen=SimpleUploadedFile('a.jpg', b'uno'),
+        )
+        Producto.objects.filter(pk=self.producto.pk).update(imagen_hash='viejo')
+        self.producto.refresh_from_db()
+
+    def test_guardar_sin_cambiar_imagen_conserva_hash(self):
+        self.producto.nombre = 'Cable UTP'
+        self.producto.save()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_hash, 'viejo')
+
+    def test_reemplazar_imagen_borra_hash(self):
+        self.producto.imagen = SimpleUploadedFile('b.jpg', b'dos')
+        self.producto.save(update_fields=['imagen'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_hash, '')
+
+    def test_quitar_imagen_borra_hash(self):
+        self.producto.imagen = None
+        self.producto.save()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.imagen_hash, '')
+
+
+class ActualizacionPreciosTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            codigo='P-001', nombre='Cable', precio_compra=100, precio_venta=150,
+        )
+
+    def test_historial_con_precios_anteriores_y_nuevos(self):
+        productos = precios.productos_a_actualizar()
+        self.assertEqual(precios.aplicar(productos, 'porcentaje', 'precio_venta', 10, motivo='Alza'), 1)
+        historial = HistorialPrecio.objects.get()
+        self.assertEqual(
+            (historial.producto_id, historial.precio_compra_anterior, historial.precio_venta_anterior,
+             historial.precio_compra_nuevo, historial.precio_venta_nuevo, historial.motivo),
+            (self.producto.pk, Decimal('100'), Decimal('150'), Decimal('100'), Decimal('165'), 'Alza'),
+        )
+
+    def test_precio_fuera_de_rango_no_se_aplica(self):
+        productos = precios.productos_a_actualizar()
+        for funcion in (precios.previsualizar, precios.aplicar):
+            with self.assertRaises(forms.ValidationError):
+                funcion(productos, 'porcentaje', 'precio_venta', 99999999)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.precio_venta, Decimal('150'))
+        self.assertFalse(HistorialPrecio.objects.exists())
+
+    def test_vista_muestra_el_error(self):
+        self.client.force_login(User.objects.create_user('bodega', password='clave'))
+        respuesta = self.client.post(reverse('productos:actualizar_precios'), {
+            'campo': 'precio_venta', 'operacion': 'monto', 'valor': '99999999', 'aplicar': '1',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['form'].errors['valor'])
+
+
+class PronosticarStockArgumentosTests(TestCase):
+    def test_rechaza_argumentos_fuera_de_rango(self):
+        for argumentos in (['--dias', '0'], ['--reposicion', '-1'], ['--nivel-servicio', '1']):
+            with self.subTest(argumentos=argumentos), self.assertRaises(CommandError):
+                call_command('pronosticar_stock', *argumentos)
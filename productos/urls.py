@@ -1,13 +1,21 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 app_name = 'productos'
 
 urlpatterns = [
     path('', views.producto_list, name='list'),
     path('nuevo/', views.producto_create, name='create'),
+    path('importar/', views.producto_importar, name='importar'),
+    path('precios/', views.producto_actualizar_precios, name='actualizar_precios'),
+    path('exportar/', views.producto_exportar, name='exportar'),
+    path('movimientos/exportar/', views.movimiento_exportar, name='exportar_movimientos'),
     path('<int:pk>/', views.producto_detail, name='detail'),
     path('<int:pk>/editar/', views.producto_edit, name='edit'),
     path('<int:pk>/eliminar/', views.producto_delete, name='delete'),
     path('<int:producto_id>/movimiento/', views.movimiento_create, name='movimiento_create'),
+    path('api/', api.producto_api_list, name='api_productos'),
+    path('api/autocompletar/', api.producto_autocompletar, name='api_autocompletar'),
+    path('api/categorias/', api.categoria_api_list, name='api_categorias'),
+    path('api/proveedores/', api.proveedor_api_list, name='api_proveedores'),
 ]
@@ -0,0 +1,57 @@
+"""
+Valorización del inventario calculada en la base de datos.
+
+valoracion_agrupada() suma stock_actual * precio_compra con GROUP BY, sin
+cargar los productos. El total general se lee de ValoracionInventario, que
+se mantiene con ajustes incrementales (ver ValoracionInventario.ajustar()).
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum, F
+
+from .models import Producto, ValoracionInventario, VALOR_INVENTARIO
+
+# Agrupación -> (columnas de GROUP BY, columna con la etiqueta)
+AGRUPACIONES = {
+    'categoria': (('categoria_id', 'categoria__nombre'), 'categoria__nombre'),
+    'proveedor': (('proveedor_id', 'proveedor__nombre'), 'proveedor__nombre'),
+    'tipo': (('tipo',), 'tipo'),
+}
+
+
+def valoracion_agrupada(agrupacion, queryset=None):
+    """
+    Lista de dicts {'clave', 'nombre', 'productos', 'unidades', 'valor'}
+    ordenada por valor descendente.
+    """
+    columnas, etiqueta = AGRUPACIONES[agrupacion]
+    if queryset is None:
+        queryset = Producto.objects.all()
+    filas = (
+        queryset.values(*columnas)
+        .annotate(
+            productos=Count('pk'),
+            unidades=Sum('stock_actual'),
+            valor=Sum(VALOR_INVENTARIO),
+        )
+        .order_by(F('valor').desc(nulls_last=True))
+    )
+    nombres_tipo = dict(Producto.TIPO_CHOICES)
+    resultado = []
+    for fila in filas:
+        nombre = fila[etiqueta]
+        if agrupacion == 'tipo':
+            nombre = nombres_tipo.get(nombre, nombre)
+        resultado.append({
+            'clave': fila[columnas[0]],
+            'nombre': nombre or 'Sin asignar',
+            'productos': fila['productos'],
+            'unidades': fila['unidades'] or 0,
+            'valor': fila['valor'] or Decimal('0'),
+        })
+    return resultado
+
+
+def valor_total():
+    """Valor total del inventario, sumando las franjas de ValoracionInventario."""
+    return ValoracionInventario.total()
@@ -1,9 +1,51 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django import forms
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, F
-from .models import Producto, Categoria, Proveedor, MovimientoInventario
-from .forms import ProductoForm, CategoriaForm, ProveedorForm, MovimientoInventarioForm
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
+from .models import Producto, Categoria, Proveedor, MovimientoInventario, PronosticoStock
+from .forms import (
+    ProductoForm, CategoriaForm, ProveedorForm, MovimientoInventarioForm, ImportarProductosForm,
+    ActualizarPreciosForm,
+)
+from .importacion import importar_productos, leer_filas
+from .busqueda import buscar_productos, BUSQUEDA_LIMITE
+from .inventario import registrar_movimiento
+from . import precios
+from .alertas import total_bajo_stock
+from .saldos import stock_en_fecha
+from .paginacion import iterar_keyset, paginar_keyset, paginar_ranking, total_aproximado, TotalAproximado
+from erp_system.exportacion import respuesta_exportacion
+
+PRODUCTOS_POR_PAGINA = 50
+
+# Columnas que muestra productos/list.html
+CAMPOS_LISTADO = (
+    'codigo', 'nombre', 'precio_venta', 'stock_actual', 'stock_minimo',
+    'categoria', 'categoria__nombre', 'imagen', 'imagen_hash',
+)
+
+# Campos que producto_edit guarda directamente; el stock va por inventario
+CAMPOS_EDITABLES_SIN_STOCK = [
+    campo.name for campo in Producto._meta.concrete_fields
+    if not campo.primary_key and campo.name not in ('stock_actual', 'bajo_stock', 'created_at', 'imagen_hash')
+]
+
+def _filtrar_productos(productos, parametros):
+    """Filtros de producto_list (categoría, proveedor, bajo stock) sobre productos activos."""
+    productos = productos.filter(activo=True)
+    if parametros.get('categoria'):
+        productos = productos.filter(categoria_id=parametros['categoria'])
+    if parametros.get('proveedor'):
+        productos = productos.filter(proveedor_id=parametros['proveedor'])
+    if parametros.get('bajo_stock'):
+        productos = productos.filter(bajo_stock=True)
+    return productos
 
 @login_required
 def producto_list(request):
@@ -13,41 +55,66 @@ def producto_list(request):
     proveedor = request.GET.get('proveedor', '')
     bajo_stock = request.GET.get('bajo_stock', '')
     
-    productos = Producto.objects.select_related('categoria', 'proveedor').filter(activo=True)
+    productos = _filtrar_productos(
+        Producto.objects.select_related('categoria').only(*CAMPOS_LISTADO), request.GET
+    )
     
     if search:
-        productos = productos.filter(
-            Q(nombre__icontains=search) | 
-            Q(codigo__icontains=search) |
-            Q(descripcion__icontains=search)
+        # Resultados por relevancia desde el índice de búsqueda
+        ranking = buscar_productos(search)
+        pagina, coincidencias = paginar_ranking(
+            productos,
+            ranking,
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+            por_pagina=PRODUCTOS_POR_PAGINA,
         )
+        total_productos = TotalAproximado(
+            coincidencias,
+            exacto=len(ranking) < BUSQUEDA_LIMITE,
+            acotado=True,
+        )
+    else:
+        # Paginación por cursor ordenada por (nombre, id)
+        pagina = paginar_keyset(
+            productos,
+            orden=('nombre', 'id'),
+            despues=request.GET.get('despues'),
+            antes=request.GET.get('antes'),
+            por_pagina=PRODUCTOS_POR_PAGINA,
+        )
+        total_productos = total_aproximado(productos)
     
-    if categoria:
-        productos = productos.filter(categoria_id=categoria)
-    
-    if proveedor:
-        productos = productos.filter(proveedor_id=proveedor)
-    
-    if bajo_stock:
-        productos = productos.filter(stock_actual__lte=F('stock_minimo'))
-    
-    productos = productos.order_by('nombre')
+    # Filtros activos para conservarlos en los enlaces de paginación
+    filtros_query = urlencode({
+        clave: valor for clave, valor in [
+            ('search', search),
+            ('categoria', categoria),
+            ('proveedor', proveedor),
+            ('bajo_stock', bajo_stock),
+        ] if valor
+    })
     
     # Para los filtros
     categorias = Categoria.objects.filter(activa=True)
+    productos_bajo_stock = total_bajo_stock(categoria if categoria.isdigit() else None)
     proveedores = Proveedor.objects.filter(activo=True)
     
     # Formulario vacío para el modal
     form = ProductoForm()
     
     context = {
-        'productos': productos,
+        'productos': pagina.objetos,
+        'pagina': pagina,
+        'total_productos': total_productos,
+        'filtros_query': filtros_query,
         'categorias': categorias,
         'proveedores': proveedores,
         'search': search,
         'categoria_selected': categoria,
         'proveedor_selected': proveedor,
         'bajo_stock': bajo_stock,
+        'productos_bajo_stock': productos_bajo_stock,
         'form': form,
     }
     
@@ -58,9 +125,19 @@ def producto_detail(request, pk):
     producto = get_object_or_404(Producto, pk=pk)
     movimientos = producto.movimientos.all()[:10]
     
+    # Stock a una fecha desde los saldos consolidados
+    try:
+        fecha_consulta = parse_date(request.GET.get('fecha', ''))
+    except ValueError:
+        fecha_consulta = None
+    stock_fecha = stock_en_fecha(producto.pk, fecha_consulta) if fecha_consulta else None
+    
     context = {
         'producto': producto,
         'movimientos': movimientos,
+        'fecha_consulta': fecha_consulta,
+        'stock_en_fecha': stock_fecha,
+        'pronostico': PronosticoStock.objects.filter(producto=producto).first(),
     }
     return render(request, 'productos/detail.html', context)
 
@@ -97,27 +174,14 @@ def producto_create(request):
 @login_required
 def producto_edit(request, pk):
     producto = get_object_or_404(Producto, pk=pk)
-    stock_anterior = producto.stock_actual
     
     if request.method == 'POST':
         form = ProductoForm(request.POST, request.FILES, instance=producto)
         if form.is_valid():
-            producto = form.save()
-            
-            # Si cambió el stock, crear movimiento
-            if producto.stock_actual != stock_anterior:
-                diferencia = producto.stock_actual - stock_anterior
-                tipo = 'entrada' if diferencia > 0 else 'salida'
-                
-                MovimientoInventario.objects.create(
-                    producto=producto,
-                    tipo='ajuste',
-                    cantidad=diferencia,
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=producto.stock_actual,
-                    motivo='Ajuste manual',
-                    usuario=request.user
-                )
+            producto = form.save(commit=False)
+            # El formulario no trae el stock (se cambia con movimientos); no se
+            # escribe para no pisar los movimientos registrados mientras tanto
+            producto.save(update_fields=CAMPOS_EDITABLES_SIN_STOCK)
             
             messages.success(request, f'Producto {producto.nombre} actualizado exitosamente.')
             return redirect('productos:detail', pk=producto.pk)
@@ -141,22 +205,7 @@ def movimiento_create(request, producto_id):
             movimiento = form.save(commit=False)
             movimiento.producto = producto
             movimiento.usuario = request.user
-            movimiento.stock_anterior = producto.stock_actual
-            
-            # Calcular nuevo stock
-            if movimiento.tipo == 'entrada':
-                nuevo_stock = producto.stock_actual + movimiento.cantidad
-            elif movimiento.tipo == 'salida':
-                nuevo_stock = max(0, producto.stock_actual - movimiento.cantidad)
-            else:  # ajuste
-                nuevo_stock = movimiento.cantidad
-            
-            movimiento.stock_nuevo = nuevo_stock
-            movimiento.save()
-            
-            # Actualizar stock del producto
-            producto.stock_actual = nuevo_stock
-            producto.save()
+            registrar_movimiento(movimiento)
             
             messages.success(request, 'Movimiento de inventario registrado exitosamente.')
             return redirect('productos:detail', pk=producto.pk)
@@ -184,3 +233,133 @@ def producto_delete(request, pk):
     }
 
     return render(request, 'productos/delete_confirm.html', context)
+
+@login_required
+def producto_importar(request):
+    resultado = None
+    
+    if request.method == 'POST':
+        form = ImportarProductosForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                filas = leer_filas(archivo.file, archivo.name)
+                resultado = importar_productos(
+                    filas, usuario=request.user, crear_categorias=form.cleaned_data['crear_categorias']
+                )
+            except forms.ValidationError as error:
+                messages.error(request, ' '.join(error.messages))
+            except (UnicodeDecodeError, csv.Error) as error:
+                # Los lotes anteriores a la fila ilegible ya quedaron guardados
+                messages.error(request, f'No se pudo leer el archivo: {error}')
+            else:
+                messages.success(
+                    request,
+                    f'Importación finalizada: {resultado.creados} productos creados y '
+                    f'{resultado.actualizados} actualizados.'
+                )
+    else:
+        form = ImportarProductosForm()
+    
+    return render(request, 'productos/importar.html', {
+        'form': form,
+        'resultado': resultado,
+    })
+
+@login_required
+def producto_actualizar_precios(request):
+    previa = None
+    
+    if request.method == 'POST':
+        form = ActualizarPreciosForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            productos = precios.productos_a_actualizar(datos['categoria'], datos['proveedor'])
+            valor = datos['valor'] or 0
+            
+            try:
+                if 'aplicar' in request.POST:
+                    cambiados = precios.aplicar(
+                        productos, datos['operacion'], datos['campo'], valor,
+                        usuario=request.user, motivo=datos['motivo'],
+                    )
+                    messages.success(request, f'Precios actualizados en {cambiados} productos.')
+                    return redirect('productos:list')
+                
+                previa = precios.previsualizar(productos, datos['operacion'], datos['campo'], valor)
+            except forms.ValidationError as error:
+                form.add_error('valor', error)
+    else:
+        form = ActualizarPreciosForm()
+    
+    return render(request, 'productos/actualizar_precios.html', {
+        'form': form,
+        'previa': previa,
+    })
+
+# Columnas de la exportación; los encabezados son los que acepta la importación
+COLUMNAS_EXPORTACION_PRODUCTOS = [
+    ('codigo', 'codigo'), ('nombre', 'nombre'), ('descripcion', 'descripcion'), ('tipo', 'tipo'),
+    ('categoria__nombre', 'categoria'), ('proveedor__nombre', 'proveedor'),
+    ('codigo_proveedor', 'codigo_proveedor'), ('precio_compra', 'precio_compra'),
+    ('precio_venta', 'precio_venta'), ('margen_ganancia', 'margen_ganancia'),
+    ('stock_actual', 'stock_actual'), ('stock_minimo', 'stock_minimo'),
+    ('stock_maximo', 'stock_maximo'), ('activo', 'activo'),
+]
+
+COLUMNAS_EXPORTACION_MOVIMIENTOS = [
+    ('id', 'ID'), ('fecha', 'Fecha'), ('producto__codigo', 'Código'), ('producto__nombre', 'Producto'),
+    ('tipo', 'Tipo'), ('cantidad', 'Cantidad'), ('stock_anterior', 'Stock anterior'),
+    ('stock_nuevo', 'Stock nuevo'), ('motivo', 'Motivo'), ('documento_referencia', 'Documento'),
+    ('observaciones', 'Observaciones'), ('usuario__username', 'Usuario'),
+]
+
+@login_required
+def producto_exportar(request):
+    """Exporta el listado con los filtros actuales (?formato=csv|xlsx)."""
+    productos = _filtrar_productos(Producto.objects.all(), request.GET)
+    search = request.GET.get('search', '')
+    if search:
+        productos = productos.filter(pk__in=buscar_productos(search))
+    
+    filas = iterar_keyset(
+        productos, ('nombre', 'id'), [columna for columna, _ in COLUMNAS_EXPORTACION_PRODUCTOS]
+    )
+    return respuesta_exportacion(
+        request.GET.get('formato'), 'productos',
+        [encabezado for _, encabezado in COLUMNAS_EXPORTACION_PRODUCTOS], filas, hoja='Productos',
+    )
+
+@login_required
+def movimiento_exportar(request):
+    """
+    Exporta movimientos de inventario en orden de registro.
+    
+    Filtros: producto (id), tipo, desde y hasta (AAAA-MM-DD, inclusive).
+    """
+    movimientos = MovimientoInventario.objects.all()
+    if request.GET.get('producto', '').isdigit():
+        movimientos = movimientos.filter(producto_id=request.GET['producto'])
+    if request.GET.get('tipo') in dict(MovimientoInventario.TIPO_MOVIMIENTO_CHOICES):
+        movimientos = movimientos.filter(tipo=request.GET['tipo'])
+    try:
+        desde = parse_date(request.GET.get('desde', ''))
+        hasta = parse_date(request.GET.get('hasta', ''))
+    except ValueError:
+        desde = hasta = None
+    if desde:
+        movimientos = movimientos.filter(
+            fecha__gte=timezone.make_aware(datetime.combine(desde, time.min))
+        )
+    if hasta:
+        movimientos = movimientos.filter(
+            fecha__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+        )
+    
+    filas = iterar_keyset(
+        movimientos, ('id',), [columna for columna, _ in COLUMNAS_EXPORTACION_MOVIMIENTOS]
+    )
+    return respuesta_exportacion(
+        request.GET.get('formato'), 'movimientos',
+        [encabezado for _, encabezado in COLUMNAS_EXPORTACION_MOVIMIENTOS], filas, hoja='Movimientos',
+    )
@@ -5,4 +5,5 @@ app_name = 'reportes'
 
 urlpatterns = [
     path('', views.reportes_index, name='index'),
+    path('valorizacion/', views.reporte_valorizacion, name='valorizacion'),
 ]
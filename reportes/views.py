@@ -1,6 +1,21 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from productos.valoracion import valoracion_agrupada, valor_total, AGRUPACIONES
 
 @login_required
 def reportes_index(request):
     return render(request, 'reportes/index.html')
+
+@login_required
+def reporte_valorizacion(request):
+    agrupacion = request.GET.get('agrupar', 'categoria')
+    if agrupacion not in AGRUPACIONES:
+        agrupacion = 'categoria'
+    
+    context = {
+        'agrupacion': agrupacion,
+        'agrupaciones': [('categoria', 'Categoría'), ('proveedor', 'Proveedor'), ('tipo', 'Tipo')],
+        'filas': valoracion_agrupada(agrupacion),
+        'valor_total': valor_total(),
+    }
+    return render(request, 'reportes/valorizacion.html', context)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tecnicos', '0002_tecnico_afp_tecnico_departamento_tecnico_linkedin_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tecnico',
+            name='foto_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
@@ -88,6 +88,7 @@ class Tecnico(models.Model):
     
     # Información adicional
     foto = models.ImageField(upload_to='tecnicos/fotos/', null=True, blank=True)
+    foto_hash = models.CharField(max_length=40, blank=True, editable=False)  # Miniaturas generadas
     postre_favorito = models.CharField(max_length=100, blank=True)
     observaciones = models.TextField(blank=True)
     
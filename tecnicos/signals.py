@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from erp_system import imagenes
+
+from .models import Tecnico
+
+
+@receiver(pre_save, sender=Tecnico)
+def tecnico_por_guardar(sender, instance, **kwargs):
+    imagenes.invalidar_hash(instance, 'foto', 'foto_hash')
+
+
+@receiver(post_save, sender=Tecnico)
+def tecnico_guardado(sender, instance, **kwargs):
+    imagenes.encolar(instance, 'foto', 'foto_hash')